@@ -1,5 +1,33 @@
 # Import sqlite3 package
+import abc
+import argparse
+import asyncio
+import bisect
+import csv
+import datetime
+import heapq
+import io
+import itertools
+import json
+import math
+import mmap
+import multiprocessing
+import os
+import queue
+import random
+import re
+import shlex
+import shutil
+import socket
 import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import zlib
+from array import array
+from concurrent.futures import Future, ThreadPoolExecutor
 
 
 # Define DBOperation class to manage all data into the database.
@@ -8,6 +36,10 @@ import sqlite3
 
 # Creates the Destination table to store airport details.
 class DBOperations:
+  # Path of the database file shared by every connection.
+  db_path = "AirlineManagement.db"
+  # The tables as in the shipped AirlineManagement.db (schema version 0). Every later shape is spelled out
+  # in the migration that introduced it, so editing a query here never changes what a migration does.
   sql_create_destination =  '''
     CREATE TABLE IF NOT EXISTS Destination (
         AirportCode VARCHAR(20) NOT NULL,
@@ -41,64 +73,166 @@ class DBOperations:
     FlightID INTEGER REFERENCES Flights(FlightID) ON DELETE CASCADE, 
     PilotID INTEGER REFERENCES Pilot(PilotID) ON DELETE CASCADE);
     '''
+  # Turn a status name or airport code parameter into its integer key when writing Flights. A name that
+  # is not found becomes -1, so it fails the CHECK or FOREIGN KEY constraint the way the text columns did.
+  sql_status_code = "(SELECT IFNULL(FlightStatus.StatusCode, -1) FROM (SELECT ? AS Given) LEFT JOIN FlightStatus ON FlightStatus.Name = Given WHERE Given IS NOT NULL)"
+  sql_airport_id = "(SELECT IFNULL(Destination.DestinationID, -1) FROM (SELECT ? AS Given) LEFT JOIN Destination ON Destination.AirportCode = Given WHERE Given IS NOT NULL)"
+  # Unique indexes enforce one row per flight number, license and assignment (also on older database files).
+  sql_create_unique_flight_number = "CREATE UNIQUE INDEX IF NOT EXISTS idx_flights_number ON Flights (FlightNumber COLLATE NOCASE)"
+  sql_create_unique_license = "CREATE UNIQUE INDEX IF NOT EXISTS idx_pilot_license ON Pilot (LicenseNumber COLLATE NOCASE)"
+  sql_create_unique_pilotFlight = "CREATE UNIQUE INDEX IF NOT EXISTS idx_flightpilot_pair ON FlightPilot (FlightID, PilotID)"
+  # Turns on enforcement of the REFERENCES and ON DELETE CASCADE clauses for a connection.
+  sql_enable_foreign_keys = "PRAGMA foreign_keys = ON"
   # --------------- Data Insertion Queries --------------- #
 
   # Inserts a new flight record.
-  sql_insert = "INSERT INTO Flights (FlightNumber, Status, OriginAirport, DestinationAirport) values (?,?,?,?);"
+  sql_insert = ("INSERT INTO Flights (FlightNumber, StatusCode, OriginAirportID, DestinationAirportID) values (?, "
+                + sql_status_code + ", " + sql_airport_id + ", " + sql_airport_id + ");")
   # Inserts a new destination (airport).
   sql_insert_des = "INSERT INTO Destination (AirportCode, DestinationName, Country) values (?,?,?); "
   # Inserts a new pilot record.
   sql_insert_pilot = "INSERT INTO Pilot (PilotName, LicenseNumber, ExperienceYears) values (?,?,?); "
   # Inserts a new flight-pilot assignment.
   sql_insert_pilotflight = "INSERT INTO FlightPilot (FlightID, PilotID) values (?,?); "
+  # --------------- Seeding Queries --------------- #
+
+  # Idempotent versions of the insert queries used to seed data and load fixtures.
+  sql_seed = ("INSERT OR IGNORE INTO Flights (FlightNumber, StatusCode, OriginAirportID, DestinationAirportID) values (?, "
+              + sql_status_code + ", " + sql_airport_id + ", " + sql_airport_id + ")")
+  sql_seed_des = "INSERT OR IGNORE INTO Destination (AirportCode, DestinationName, Country) values (?,?,?)"
+  sql_seed_pilot = "INSERT OR IGNORE INTO Pilot (PilotName, LicenseNumber, ExperienceYears) values (?,?,?)"
+  sql_seed_pilot_flights = "INSERT OR IGNORE INTO FlightPilot (FlightID,PilotID) SELECT FlightID,PilotID FROM Flights CROSS JOIN Pilot WHERE LicenseNumber=? COLLATE NOCASE AND FlightNumber=? COLLATE NOCASE"
+  sql_seed_fixture = "INSERT OR IGNORE INTO @table (@cols) values (@marks)"
+  # Detects whether the database has already been seeded.
+  sql_check_seeded = "SELECT 1 FROM Destination LIMIT 1"
+  # Tables that CSV fixtures may load directly.
+  fixture_tables = ("Destination", "Pilot")
+  # Pre-built database copied into place on first start instead of creating and seeding one.
+  template_path = "AirlineManagement.template.db"
   # Assigns a pilot to a flight using FlightNumber and LicenseNumber instead of IDs.
-  sql_add_pilot_flights = "INSERT INTO FlightPilot (FlightID,PilotID) SELECT FlightID,PilotID FROM Flights CROSS JOIN Pilot WHERE LicenseNumber=? AND FlightNumber=?"
+  sql_add_pilot_flights = "INSERT INTO FlightPilot (FlightID,PilotID) SELECT FlightID,PilotID FROM Flights CROSS JOIN Pilot WHERE LicenseNumber=? COLLATE NOCASE AND FlightNumber=? COLLATE NOCASE"
+  # --------------- Sample Data --------------- #
+
+  test_destinations = [
+    ("HRL", "London", "UK"), ("GTW", "London", "UK"), ("NYC", "NewYork", "US"),
+    ("CAL", "California", "US"), ("PEK", "Beijing", "China"), ("PVG", "ShangHai", "China"),
+    ("SHA", "ShangHai", "China"), ("CAN", "GuangZhou", "China"), ("PKX", "BeiJing", "China"),
+    ("MAD", "Madrid", "Spain"), ("MLA", "Malta", "Malta"), ("DXB", "Dubai", "UAE"),
+    ("DSS", "Dakar", "Senegal"), ("SAW", "Istanbul", "Turkey"), ("ATH", "Markopoulo", "Greece"),
+  ]
+  # Positions of the sample airports as (latitude, longitude, AirportCode).
+  test_positions = [
+    (51.470, -0.454, "HRL"), (51.148, -0.190, "GTW"), (40.640, -73.779, "NYC"), (33.942, -118.408, "CAL"),
+    (40.080, 116.585, "PEK"), (31.143, 121.805, "PVG"), (31.198, 121.336, "SHA"), (23.392, 113.299, "CAN"),
+    (39.509, 116.411, "PKX"), (40.472, -3.561, "MAD"), (35.857, 14.477, "MLA"), (25.253, 55.364, "DXB"),
+    (14.671, -17.073, "DSS"), (40.899, 29.309, "SAW"), (37.936, 23.947, "ATH"),
+  ]
+  test_pilots = [
+    ("John Smith", "LIC223", "12"), ("Harlan Flores", "LIC112", "2"), ("Emilia Freeman", "LIC512", "7"),
+    ("Brian Serrano", "LIC821", "1"), ("Alex Feng", "LIC6677", "10"), ("Amelia Brown", "LIC7898", "3"),
+    ("Om Johnson", "LIC123", "11"), ("Emma Johnson", "LIC456", "9"), ("Harrison Smith", "LIC789", "18"),
+    ("Christina Brown", "LIC012", "20"), ("Emily Wilson", "LIC555", "8"), ("Andy Moore", "LIC765", "2"),
+  ]
+  test_flights = [
+    ("BE123", "On Time", "PEK", "CAL"), ("CG556", "Landed", "HRL", "NYC"), ("LW212", "Boarding", "GTW", "NYC"),
+    ("BA001", "Cancelled", "PEK", "SHA"), ("BA002", "Delayed", "HRL", "DSS"), ("BA003", "Boarding", "GTW", "MLA"),
+    ("BA004", "On Time", "MLA", "PEK"), ("BA005", "Delayed", "PVG", "HRL"), ("CG001", "Boarding", "MAD", "NYC"),
+    ("BE002", "On Time", "DXB", "DSS"), ("CG003", "Landed", "SAW", "ATH"), ("LW004", "Boarding", "DXB", "GTW"),
+  ]
+  # Pilot assignments as (LicenseNumber, FlightNumber) pairs.
+  test_assignments = [
+    ("LIC223", "BE123"), ("LIC112", "BE123"), ("LIC512", "CG556"), ("LIC821", "CG556"),
+    ("LIC512", "LW212"), ("LIC223", "LW212"), ("LIC6677", "BA002"), ("LIC7898", "BA002"),
+    ("LIC123", "BA003"), ("LIC456", "BA003"), ("LIC789", "BA003"), ("LIC012", "BA004"),
+  ]
   # --------------- Search Queries --------------- #
 
   # Retrieves flight details by flight number.
-  sql_search_flight_number = "SELECT * FROM Flights WHERE FlightNumber = ?"
+  sql_search_flight_number = "SELECT FlightID, FlightNumber, Status, OriginAirport, DestinationAirport FROM FlightView WHERE FlightNumber = ?"
   # Retrieves all flights with a specific status.
-  sql_search_flight_status = "SELECT * FROM Flights WHERE Status = ?"
+  sql_search_flight_status = "SELECT FlightID, FlightNumber, Status, OriginAirport, DestinationAirport FROM FlightView WHERE Status = ?"
   # Retrieves flights departing from a specific airport.
-  sql_search_origin_airport = "SELECT * FROM Flights WHERE OriginAirport = ?"
+  sql_search_origin_airport = "SELECT FlightID, FlightNumber, Status, OriginAirport, DestinationAirport FROM FlightView WHERE OriginAirport = ?"
   # Retrieves flights arriving at a specific airport.
-  sql_search_destination_airport = "SELECT * FROM Flights WHERE DestinationAirport = ?"
+  sql_search_destination_airport = "SELECT FlightID, FlightNumber, Status, OriginAirport, DestinationAirport FROM FlightView WHERE DestinationAirport = ?"
   # Retrieves all flights.
-  sql_search_flight_all = "SELECT * FROM Flights"
+  sql_search_flight_all = "SELECT FlightID, FlightNumber, Status, OriginAirport, DestinationAirport FROM FlightView"
   # Dynamic query for searching pilots based on a specific field.
-  sql_search_pilot = "select * from Pilot where @=?"
+  sql_search_pilot = "select PilotID, PilotName, LicenseNumber, ExperienceYears from Pilot where @=?"
   # Searches for pilots whose names contain a given substring.
-  sql_search_pilot_name = "select * from Pilot where PilotName like %?%"
+  sql_search_pilot_name = "select PilotID, PilotName, LicenseNumber, ExperienceYears from Pilot where PilotName like %?%"
   # Retrieves pilots with experience greater than or equal to a specified number.
-  sql_search_pilot_years_more = "select * from Pilot where ExperienceYears>=?"
+  sql_search_pilot_years_more = "select PilotID, PilotName, LicenseNumber, ExperienceYears from Pilot where ExperienceYears>=?"
   # Retrieves pilots with experience less than a specified number.
-  sql_search_pilot_years_less = "select * from Pilot where ExperienceYears<?"
+  sql_search_pilot_years_less = "select PilotID, PilotName, LicenseNumber, ExperienceYears from Pilot where ExperienceYears<?"
   # Retrieves all pilots.
-  sql_search_pilot_all="SELECT * FROM Pilot"
+  sql_search_pilot_all="SELECT PilotID, PilotName, LicenseNumber, ExperienceYears FROM Pilot"
   # Retrieves destinations based on a dynamic field.
-  sql_search_destination = "select * from Destination where @=?"
+  sql_search_destination = "select AirportCode, DestinationName, Country from Destination where @=?"
   # Retrieves all destinations.
-  sql_search_destination_all="SELECT * FROM Destination"
+  sql_search_destination_all="SELECT AirportCode, DestinationName, Country FROM Destination"
   # Retrieves all flights assigned to a specific pilot using their LicenseNumber.
-  sql_search_pilot_flights = "SELECT FlightNumber,Status,OriginAirport,DestinationAirport FROM Pilot LEFT JOIN FlightPilot ON Pilot.PilotID=FlightPilot.PilotID LEFT JOIN Flights ON Flights.FlightID=FlightPilot.FlightID Where LicenseNumber=?"
+  # FlightView's joins are spelled out because SQLite materializes a view on the right of a LEFT JOIN.
+  sql_search_pilot_flights = """
+    SELECT FlightNumber, FlightStatus.Name AS Status, Origin.AirportCode AS OriginAirport, Arrival.AirportCode AS DestinationAirport
+    FROM Pilot LEFT JOIN FlightPilot ON Pilot.PilotID=FlightPilot.PilotID LEFT JOIN Flights ON Flights.FlightID=FlightPilot.FlightID
+    LEFT JOIN FlightStatus ON FlightStatus.StatusCode = Flights.StatusCode
+    LEFT JOIN Destination AS Origin ON Origin.DestinationID = Flights.OriginAirportID
+    LEFT JOIN Destination AS Arrival ON Arrival.DestinationID = Flights.DestinationAirportID
+    Where LicenseNumber=?
+    """
   # Retrieves all pilots assigned to flights along with flight details.
   sql_view_pilot_flight_all = """
     SELECT 
         FlightPilot.FlightPilotID, 
         Pilot.PilotID, Pilot.PilotName, Pilot.LicenseNumber, Pilot.ExperienceYears, 
-        Flights.FlightID, Flights.FlightNumber, Flights.Status, Flights.OriginAirport, Flights.DestinationAirport
+        FlightView.FlightID, FlightView.FlightNumber, FlightView.Status, FlightView.OriginAirport, FlightView.DestinationAirport
     FROM FlightPilot
     JOIN Pilot ON FlightPilot.PilotID = Pilot.PilotID
-    JOIN Flights ON FlightPilot.FlightID = Flights.FlightID;
+    JOIN FlightView ON FlightPilot.FlightID = FlightView.FlightID;
+    """
+  # Least-loaded pilots with at least the given experience, fewest active flights first.
+  sql_least_loaded_pilots = """
+    SELECT Pilot.PilotID, PilotName, LicenseNumber, ExperienceYears, ActiveFlights, TotalAssignments
+    FROM PilotWorkload JOIN Pilot ON Pilot.PilotID = PilotWorkload.PilotID
+    WHERE ExperienceYears >= ?
+    ORDER BY ActiveFlights, TotalAssignments
+    LIMIT ?
+    """
+  # Workload counters of every pilot, the input of plan_crews.
+  sql_pilot_workload = """
+    SELECT Pilot.PilotID, ExperienceYears, ActiveFlights, TotalAssignments
+    FROM PilotWorkload JOIN Pilot ON Pilot.PilotID = PilotWorkload.PilotID
+    """
+  # Flights still to be flown that have no pilot assigned.
+  sql_unstaffed_flights = """
+    SELECT FlightID, FlightNumber FROM FlightView
+    WHERE IFNULL(Status, '') NOT IN ('Landed', 'Closed', 'Cancelled')
+      AND NOT EXISTS (SELECT 1 FROM FlightPilot WHERE FlightPilot.FlightID = FlightView.FlightID)
     """
+  # Writes one planned assignment; the unique index makes re-running a plan harmless.
+  sql_insert_plan = "INSERT OR IGNORE INTO FlightPilot (FlightID, PilotID) values (?,?)"
   # --------------- Update Queries --------------- #
 
   # Updates a destination's name and country using its AirportCode.
   sql_update_destination = "UPDATE Destination SET DestinationName=?, Country=? WHERE AirportCode=?"
   # Updates a flight's status and airport details using its FlightNumber.
-  sql_update_flight = "UPDATE Flights SET Status=?, OriginAirport=?, DestinationAirport=? WHERE FlightNumber=?"
+  sql_update_flight = ("UPDATE Flights SET StatusCode=" + sql_status_code + ", OriginAirportID=" + sql_airport_id
+                       + ", DestinationAirportID=" + sql_airport_id + " WHERE FlightNumber=?")
+  # Read a row and its RowVersion before an edit; the edit is then written only if RowVersion is unchanged.
+  sql_get_flight = "SELECT Status, OriginAirport, DestinationAirport, RowVersion FROM FlightView WHERE FlightNumber = ?"
+  sql_get_pilot = "SELECT PilotName, ExperienceYears, RowVersion FROM Pilot WHERE LicenseNumber = ? COLLATE NOCASE"
+  sql_get_destination = "SELECT DestinationName, Country, RowVersion FROM Destination WHERE AirportCode = ?"
+  sql_update_flight_checked = ("UPDATE Flights SET StatusCode=" + sql_status_code + ", OriginAirportID=" + sql_airport_id
+                               + ", DestinationAirportID=" + sql_airport_id + ", RowVersion=RowVersion+1 WHERE FlightNumber=? AND RowVersion=?")
+  sql_update_pilot_checked = "UPDATE Pilot SET PilotName=?, ExperienceYears=?, RowVersion=RowVersion+1 WHERE LicenseNumber=? COLLATE NOCASE AND RowVersion=?"
+  # A NULL latitude and longitude keep the current position, so the whole edit is one version-guarded write.
+  sql_update_destination_checked = ("UPDATE Destination SET DestinationName=?, Country=?, Latitude=IFNULL(?, Latitude), "
+                                    "Longitude=IFNULL(?, Longitude), RowVersion=RowVersion+1 WHERE AirportCode=? AND RowVersion=?")
+  # Updates only a flight's status, leaving its airports alone.
+  sql_update_flight_status = "UPDATE Flights SET StatusCode=" + sql_status_code + " WHERE FlightNumber=?"
   # Updates a pilot's name and experience using their LicenseNumber.
-  sql_update_pilot="UPDATE Pilot SET PilotName=?, ExperienceYears=? WHERE LicenseNumber=?"
+  sql_update_pilot="UPDATE Pilot SET PilotName=?, ExperienceYears=? WHERE LicenseNumber=? COLLATE NOCASE"
   # --------------- Delete Queries --------------- #
 
   # Deletes a destination by AirportCode.
@@ -107,35 +241,338 @@ class DBOperations:
   sql_delete_flight = "DELETE FROM Flights WHERE FlightNumber = ?"
   # Deletes a pilot by LicenseNumber.
   sql_delete_pilot = "DELETE FROM Pilot WHERE LicenseNumber = ?"
-  # Removes a pilot from a flight by PilotID and FlightID.
-  sql_delete_flightpilot = "DELETE FROM FlightPilot WHERE PilotID = ? AND FlightID = ?"
-  # --------------- Data Integrity & Validation Queries --------------- #
-
-  # Retrieves the PilotID using LicenseNumber (case-insensitive check).
-  sql_get_pilot_id = "SELECT PilotID FROM Pilot WHERE LicenseNumber = ?"
-  # Retrieves the FlightID using FlightNumber.
-  sql_get_flight_id = "SELECT FlightID FROM Flights WHERE FlightNumber = ?"
-  # Retrieves the FlightID using a case-insensitive search.
-  sql_get_flight_id_2 = "SELECT FlightID FROM Flights WHERE UPPER(FlightNumber) = UPPER(?)"
-  # Checks if an airport code exists (case-insensitive).
-  sql_check_airport = "SELECT AirportCode FROM Destination WHERE UPPER(AirportCode) = UPPER(?)"
-  # Checks if a flight exists.
-  sql_check_flight = "SELECT FlightID FROM Flights WHERE FlightNumber = ?"
-  # Checks if an origin airport exists (case-insensitive).
-  sql_check_origin = "SELECT AirportCode FROM Destination WHERE UPPER(AirportCode) = UPPER(?)"
-
-  # Checks if a destination airport exists (case-insensitive).
-  sql_check_destination = "SELECT AirportCode FROM Destination WHERE UPPER(AirportCode) = UPPER(?)"
-
-  # Checks if a pilot exists based on LicenseNumber (case-insensitive).
-  sql_check_license = "SELECT PilotID FROM Pilot WHERE UPPER(LicenseNumber) = UPPER(?)"
-  # Checks if a pilot is already assigned to a flight.
-  sql_check_existing = "SELECT FlightPilotID FROM FlightPilot WHERE PilotID = ? AND FlightID = ?"
+  # Removes a pilot from a flight by LicenseNumber and FlightNumber.
+  sql_delete_flightpilot = """
+    DELETE FROM FlightPilot
+    WHERE PilotID = (SELECT PilotID FROM Pilot WHERE LicenseNumber = ? COLLATE NOCASE)
+      AND FlightID = (SELECT FlightID FROM Flights WHERE FlightNumber = ? COLLATE NOCASE)
+    """
+  # --------------- Schedule Queries --------------- #
+
+  # True when Flights' current row operates on date @date under one of its schedules.
+  sql_operates_on = """EXISTS (
+      SELECT 1 FROM FlightSchedule WHERE FlightSchedule.FlightID = Flights.FlightID
+      AND date(@date) BETWEEN ValidFrom AND ValidTo
+      AND instr(DaysOfWeek, (CAST(strftime('%w', @date) AS INTEGER) + 6) % 7 + 1) > 0)"""
+  # Attaches a recurrence rule to a flight number; dates are normalised, and an invalid one becomes NULL.
+  sql_insert_schedule = """
+    INSERT INTO FlightSchedule (FlightID, DaysOfWeek, ValidFrom, ValidTo)
+    SELECT FlightID, ?, date(?), date(?) FROM Flights WHERE FlightNumber = ? COLLATE NOCASE
+    """
+  # Sets the status of one operating day (?1 flight number, ?2 date, ?3 status), materialising the day if needed.
+  sql_set_occurrence_status = ("""
+    INSERT INTO FlightOccurrence (FlightID, FlightDate, StatusCode)
+    SELECT FlightID, date(?2), IFNULL((SELECT StatusCode FROM FlightStatus WHERE Name = ?3), -1) FROM Flights
+    WHERE FlightNumber = ?1 COLLATE NOCASE AND """ + sql_operates_on.replace("@date", "?2") + """
+    ON CONFLICT (FlightID, FlightDate) DO UPDATE SET StatusCode = excluded.StatusCode
+    """)
+  # Assigns a pilot to one operating day (?1 license number, ?2 flight number, ?3 date).
+  sql_add_occurrence_pilot = ("""
+    INSERT INTO OccurrencePilot (FlightID, FlightDate, PilotID)
+    SELECT FlightID, date(?3), PilotID FROM Flights CROSS JOIN Pilot
+    WHERE LicenseNumber = ?1 COLLATE NOCASE AND FlightNumber = ?2 COLLATE NOCASE AND """
+    + sql_operates_on.replace("@date", "?3"))
+  # Removes a pilot from one day of a flight by LicenseNumber, FlightNumber and date.
+  sql_delete_occurrence_pilot = """
+    DELETE FROM OccurrencePilot
+    WHERE PilotID = (SELECT PilotID FROM Pilot WHERE LicenseNumber = ? COLLATE NOCASE)
+      AND FlightID = (SELECT FlightID FROM Flights WHERE FlightNumber = ? COLLATE NOCASE)
+      AND FlightDate = date(?)
+    """
+  # Schedules overlapping a window (?1 start date, ?2 end date), optionally of one flight number (?3).
+  sql_schedules_in_window = """
+    SELECT FlightView.FlightID, FlightNumber, OriginAirport, DestinationAirport, DaysOfWeek, ValidFrom, ValidTo
+    FROM FlightSchedule JOIN FlightView ON FlightView.FlightID = FlightSchedule.FlightID
+    WHERE ValidFrom <= ?2 AND ValidTo >= ?1 AND (?3 IS NULL OR FlightNumber = ?3 COLLATE NOCASE)
+    """
+  # The materialised per-day statuses and pilots inside a window (start date, end date).
+  sql_occurrence_status_in_window = """
+    SELECT FlightID, FlightDate, Name FROM FlightOccurrence
+    JOIN FlightStatus ON FlightStatus.StatusCode = FlightOccurrence.StatusCode
+    WHERE FlightDate BETWEEN ? AND ?
+    """
+  sql_occurrence_pilots_in_window = """
+    SELECT FlightID, FlightDate, group_concat(LicenseNumber, ',') FROM OccurrencePilot
+    JOIN Pilot ON Pilot.PilotID = OccurrencePilot.PilotID
+    WHERE FlightDate BETWEEN ? AND ?
+    GROUP BY FlightID, FlightDate
+    """
+  # Columns of the rows produced by timetable().
+  timetable_columns = ("FlightDate", "FlightNumber", "Status", "OriginAirport", "DestinationAirport", "Pilots")
+  # --------------- Geospatial Queries --------------- #
+
+  # Mean Earth radius used for great-circle distances.
+  earth_radius_km = 6371.0088
+  # Haversine great-circle distance in km between (@lat1, @lon1) and (@lat2, @lon2), in degrees.
+  sql_haversine_km = ("(2 * " + str(earth_radius_km) + " * asin(min(1, sqrt(pow(sin(radians(@lat2 - @lat1) / 2), 2)"
+                      " + cos(radians(@lat1)) * cos(radians(@lat2)) * pow(sin(radians(@lon2 - @lon1) / 2), 2)))))")
+  # Sets the position of an airport by AirportCode.
+  sql_update_destination_position = "UPDATE Destination SET Latitude=?, Longitude=? WHERE AirportCode=?"
+  sql_get_destination_position = "SELECT Latitude, Longitude FROM Destination WHERE AirportCode = ?"
+  # Airports in a bounding box of the R*Tree (?3-?4 latitude, ?5-?6 longitude) and within ?7 km of
+  # (?1, ?2), nearest first; the airport ?8 itself is left out.
+  sql_airports_in_box = ("""
+    SELECT AirportCode, DestinationName, Country, Latitude, Longitude,
+           ROUND(""" + sql_haversine_km.replace("@lat1", "?1").replace("@lon1", "?2").replace("@lat2", "Latitude").replace("@lon2", "Longitude") + """, 1) AS DistanceKm
+    FROM DestinationGeo JOIN Destination ON Destination.DestinationID = DestinationGeo.DestinationID
+    WHERE MinLatitude <= ?4 AND MaxLatitude >= ?3 AND MinLongitude <= ?6 AND MaxLongitude >= ?5
+      AND DistanceKm <= ?7 AND AirportCode IS NOT ?8
+    ORDER BY DistanceKm, AirportCode
+    """)
+  # Great-circle length of every flight's route, worked out by SQLite for all rows in one pass.
+  sql_route_distances = ("""
+    SELECT FlightNumber, Origin.AirportCode AS OriginAirport, Arrival.AirportCode AS DestinationAirport,
+           ROUND(""" + sql_haversine_km.replace("@lat1", "Origin.Latitude").replace("@lon1", "Origin.Longitude")
+                                       .replace("@lat2", "Arrival.Latitude").replace("@lon2", "Arrival.Longitude") + """, 1) AS DistanceKm
+    FROM Flights
+    JOIN Destination AS Origin ON Origin.DestinationID = Flights.OriginAirportID
+    JOIN Destination AS Arrival ON Arrival.DestinationID = Flights.DestinationAirportID
+    """)
+  # Radius of the first search for nearest airports; it doubles until enough airports are found.
+  nearest_start_km = 250.0
+  # Columns of the rows returned by airports_within() and nearest_airports().
+  nearby_columns = ("AirportCode", "DestinationName", "Country", "Latitude", "Longitude", "DistanceKm")
+  # --------------- Data Integrity Messages --------------- #
+
+  # Friendly messages for the constraint errors raised by the schema, keyed on SQLite's error text.
+  constraint_messages = {
+    "UNIQUE constraint failed: Destination.AirportCode": "Airport Code already exists! Please enter a different Airport Code.",
+    "UNIQUE constraint failed: Flights.FlightNumber": "Flight Number already exists! Please enter a different Flight Number.",
+    "UNIQUE constraint failed: Pilot.LicenseNumber": "License Number already exists! Please enter a different License Number.",
+    "UNIQUE constraint failed: FlightPilot.FlightID, FlightPilot.PilotID": "This pilot is already assigned to this flight. Please choose another flight or pilot.",
+    "UNIQUE constraint failed: OccurrencePilot.FlightID": "This pilot is already assigned to this flight on that day.",
+    "NOT NULL constraint failed: FlightSchedule.Valid": "Invalid date! Please enter dates as YYYY-MM-DD.",
+    "CHECK constraint failed: valid_days": "Invalid days of operation! Use weekday numbers 1 (Monday) to 7 (Sunday), e.g. 135.",
+    "CHECK constraint failed: valid_latitude": "Invalid position! Latitude must be between -90 and 90 degrees.",
+    "CHECK constraint failed: valid_longitude": "Invalid position! Longitude must be between -180 and 180 degrees.",
+    "CHECK constraint failed: valid_period": "Invalid period! The schedule must end on or after its first day.",
+    "CHECK constraint failed": "Invalid status! Please choose from the allowed options.",
+    "Invalid status transition": "Invalid status transition! The flight cannot move to that status from its current one.",
+  }
+  # Optional WriteQueue that applies the menu's writes on a group-commit writer thread.
+  write_queue = None
+  # Optional ResultCache that answers repeated reads until the tables they read are written.
+  result_cache = None
+  # Optional DepartureBoard that this process's flight writes are pushed to straight away.
+  board = None
+  # Optional SingleFlight that lets identical concurrent reads share one execution.
+  single_flight = None
+  # --------------- Query Budgets --------------- #
+
+  # Budgets per view method or batch command as (seconds, rows fetched, output bytes); None turns a limit off.
+  query_budgets = {
+    "default": (30.0, 100000, 8 << 20),
+    "view_flight_all": (10.0, 10000, 2 << 20),
+    "view_pilot_flight_all": (10.0, 10000, 2 << 20),
+    "view-flights": (10.0, 100000, None),
+    "view-assignments": (10.0, 100000, None),
+    "view_timetable": (10.0, 10000, 2 << 20),
+    "view-timetable": (10.0, 100000, None),
+    "view-routes": (60.0, None, None),
+  }
+  # The QueryGuard of the command running now, if any.
+  guard = None
+  # --------------- Output --------------- #
+
+  # How view and search results are written: "text" keeps the labelled lines; see output_writers for the rest.
+  output_format = "text"
+  # File that machine-readable results are written to; None means standard output.
+  output_path = None
+  # --------------- Batch Commands --------------- #
+
+  # Write commands for batch scripts: query name, then the position of each SQL parameter among the
+  # command's arguments, and the message used when a foreign key rejects the write.
+  batch_commands = {
+    "add-destination": ("sql_insert_des", (0, 1, 2), None),
+    "update-destination": ("sql_update_destination", (1, 2, 0), None),
+    "delete-destination": ("sql_delete_destination", (0,), "This destination is still used by flights and cannot be deleted."),
+    "add-flight": ("sql_insert", (0, 1, 2, 3), "Origin or Destination Airport Code not found!"),
+    "update-flight": ("sql_update_flight", (1, 2, 3, 0), "Origin or Destination Airport Code not found!"),
+    "set-status": ("sql_update_flight_status", (1, 0), None),
+    "delete-flight": ("sql_delete_flight", (0,), None),
+    "add-pilot": ("sql_insert_pilot", (0, 1, 2), None),
+    "update-pilot": ("sql_update_pilot", (1, 2, 0), None),
+    "delete-pilot": ("sql_delete_pilot", (0,), None),
+    "assign": ("sql_add_pilot_flights", (0, 1), None),
+    "unassign": ("sql_delete_flightpilot", (0, 1), None),
+    "set-position": ("sql_update_destination_position", (1, 2, 0), None),
+    "add-schedule": ("sql_insert_schedule", (1, 2, 3, 0), None),
+    "set-day-status": ("sql_set_occurrence_status", (0, 1, 2), None),
+    "assign-day": ("sql_add_occurrence_pilot", (0, 1, 2), None),
+    "unassign-day": ("sql_delete_occurrence_pilot", (0, 1, 2), None),
+  }
+  # Read commands for batch scripts: query name per option (None when the command takes no option).
+  batch_views = {
+    "view-flights": {None: "sql_search_flight_all", "--number": "sql_search_flight_number",
+                     "--status": "sql_search_flight_status", "--origin": "sql_search_origin_airport",
+                     "--destination": "sql_search_destination_airport"},
+    "view-pilots": {None: "sql_search_pilot_all", "--min-years": "sql_search_pilot_years_more",
+                    "--max-years": "sql_search_pilot_years_less"},
+    "view-destinations": {None: "sql_search_destination_all"},
+    "view-schedule": {"--license": "sql_search_pilot_flights"},
+    "view-assignments": {None: "sql_view_pilot_flight_all"},
+    "view-routes": {None: "sql_route_distances"},
+  }
+  # --------------- Maintenance Queries --------------- #
+
+  # Reads the current auto_vacuum mode (0 = NONE, 1 = FULL, 2 = INCREMENTAL).
+  sql_get_auto_vacuum = "PRAGMA auto_vacuum"
+  # Switches the database to incremental auto-vacuum (takes effect after the next VACUUM).
+  sql_set_auto_vacuum = "PRAGMA auto_vacuum = INCREMENTAL"
+  # Rebuilds the database file, compacting it and applying the auto_vacuum mode.
+  sql_vacuum = "VACUUM"
+  # Returns up to ? free pages to the operating system.
+  sql_incremental_vacuum = "PRAGMA incremental_vacuum(@)"
+  # Counts the free pages left behind by deletes.
+  sql_freelist_count = "PRAGMA freelist_count"
+  # Counts all pages in the database file.
+  sql_page_count = "PRAGMA page_count"
+  # Gathers planner statistics for every table and index.
+  sql_analyze = "ANALYZE"
+  # Lets SQLite refresh only the statistics that are out of date.
+  sql_optimize = "PRAGMA optimize"
+  # Runs a fast structural health check of the database file.
+  sql_quick_check = "PRAGMA quick_check"
+  # --------------- Migration Queries --------------- #
+
+  # Reads and writes the schema version stored in the database header.
+  sql_get_user_version = "PRAGMA user_version"
+  sql_set_user_version = "PRAGMA user_version = @"
+  # Reads the CREATE statement of a table.
+  sql_get_table_sql = "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?"
+  # Reads the CREATE statements of the explicit indexes and the triggers on a table, except rebuild triggers.
+  sql_get_index_sql = "SELECT sql FROM sqlite_master WHERE type IN ('index', 'trigger') AND tbl_name = ? AND sql IS NOT NULL AND name NOT LIKE '%\\_rebuild\\_%' ESCAPE '\\'"
+  # Lists the columns of a table.
+  sql_table_info = "PRAGMA table_info(@)"
+  # Estimates a table's row count from the statistics gathered by ANALYZE.
+  sql_estimate_rows = "SELECT MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 WHERE tbl = ?"
+  # Counts a table's rows exactly when no statistics are available.
+  sql_count_rows = "SELECT COUNT(*) FROM @"
+  # Reads every table, index, trigger and view definition, for comparing two schemas.
+  sql_get_schema = "SELECT type, name, sql FROM sqlite_master WHERE name NOT LIKE 'sqlite\\_%' ESCAPE '\\' AND sql IS NOT NULL"
+  # Full structural check and the rows whose foreign keys point nowhere.
+  sql_integrity_check = "PRAGMA integrity_check"
+  sql_foreign_key_check = "PRAGMA foreign_key_check"
+  # Finds the last rowid of the next batch of rows to copy during a rebuild.
+  sql_batch_end = "SELECT MAX(rowid) FROM (SELECT rowid FROM @old WHERE rowid > ? ORDER BY rowid LIMIT ?)"
+  # Copies a range of rows into the rebuilt table; rows already mirrored by a trigger are overwritten with the same data.
+  sql_copy_batch = "INSERT OR REPLACE INTO @new (rowid, @cols) SELECT rowid, @exprs FROM @old WHERE rowid > ? AND rowid <= ?"
+  # Triggers that mirror writes from every connection into the new table while a rebuild runs.
+  sql_rebuild_triggers = [
+    "CREATE TRIGGER @old_rebuild_ins AFTER INSERT ON @old BEGIN "
+    "INSERT OR REPLACE INTO @new (rowid, @cols) VALUES (NEW.rowid, @newcols); END",
+    "CREATE TRIGGER @old_rebuild_upd AFTER UPDATE ON @old BEGIN "
+    "DELETE FROM @new WHERE rowid = OLD.rowid; "
+    "INSERT OR REPLACE INTO @new (rowid, @cols) VALUES (NEW.rowid, @newcols); END",
+    "CREATE TRIGGER @old_rebuild_del AFTER DELETE ON @old BEGIN "
+    "DELETE FROM @new WHERE rowid = OLD.rowid; END",
+  ]
+  # Names of the rebuild triggers, dropped once the tables are swapped.
+  rebuild_trigger_suffixes = ("_rebuild_ins", "_rebuild_upd", "_rebuild_del")
+  # Number of rows copied per transaction when a table is rebuilt.
+  rebuild_batch_size = 5000
 
   def get_connection(self):
     """Establish a connection to the SQLite database and create a cursor for executing queries."""
-    self.conn = sqlite3.connect("AirlineManagement.db")# Connect to the database
+    self.conn = sqlite3.connect(self.db_path)# Connect to the database
+    self.conn.execute(self.sql_enable_foreign_keys)# Enforce REFERENCES and ON DELETE CASCADE
     self.cur = self.conn.cursor()# Create a cursor for executing SQL statements
+    if self.single_flight is not None and self.single_flight.db_path == self.db_path:
+      self.cur = CoalescingCursor(self.single_flight, self.conn, self.cur)
+    if self.result_cache is not None and self.result_cache.db_path == self.db_path:
+      self.cur = CachingCursor(self.result_cache, self.conn, self.cur)
+    if self.guard is not None:
+      self.guard.attach(self)# Enforce the running command's budgets on this connection
+
+  def close_connection(self):
+    """Close the connection opened by get_connection and forget it; does nothing if none is open.
+
+    Menu commands prompt before they connect, so one that fails at a prompt must neither touch the
+    previous command's connection nor assume it has one.
+    """
+    if getattr(self, "conn", None) is not None:
+      self.conn.close()
+      self.conn = None
+
+  def execute_write(self, sql, params):
+    """Run and commit one write, directly or through write_queue; return its row count (-1 if only queued)."""
+    if self.write_queue is None:
+      self.cur.execute(sql, params)
+      self.conn.commit()
+      return self.cur.rowcount
+    if self.single_flight is not None:
+      self.single_flight.wrote()# Queued writes run on the writer thread; this thread's next read must still see them
+    return self.write_queue.submit(sql, params).result()
+
+  def notify_board(self):
+    """Push flight writes to the live boards now rather than at their next poll."""
+    if self.board is not None:
+      self.board.sync()
+
+  async def read_async(self, sql, params=()):
+    """Run a read for an asyncio caller on a connection of its own; returns (columns, rows).
+
+    With single_flight set, the read is shared with identical reads already running, from threads or tasks.
+    """
+    led = False
+    def read():
+      nonlocal led
+      led = True
+      conn = sqlite3.connect(self.db_path)
+      try:
+        cursor = conn.execute(sql, params)
+        return cursor.description, cursor.fetchall(), True
+      finally:
+        conn.close()
+    if self.single_flight is None:
+      columns, rows, complete = await asyncio.get_running_loop().run_in_executor(None, read)
+    else:
+      try:
+        columns, rows, complete = await self.single_flight.run_async(self.single_flight.key(sql, params), read)
+      except sqlite3.OperationalError:
+        if led:
+          raise
+        complete = False# The shared read was interrupted by its leader's budget or met a lock
+      if not complete:# Or joined a threaded read that was too large to share
+        columns, rows, complete = await asyncio.get_running_loop().run_in_executor(None, read)
+    return columns, rows
+
+  def ask(self, prompt):
+    """input() for guarded view methods: the prompt is not counted as output and waiting is not timed."""
+    if self.guard is None:
+      return input(prompt)
+    return self.guard.ask(prompt)
+
+  def run_guarded(self, method, *args):
+    """Call a view or search method under the budgets configured for it in query_budgets."""
+    with QueryGuard(self, method.__name__):
+      method(*args)
+
+  def read_row(self, sql, params):
+    """Fetch one row on a short-lived connection, so no connection is held while the user is prompted."""
+    self.get_connection()
+    try:
+      self.cur.execute(sql, params)
+      return self.cur.fetchone()
+    finally:
+      self.close_connection()
+
+  def report_conflict(self, sql, params, what):
+    """Explain why a version-checked write changed nothing: the row was deleted or edited by someone else."""
+    if self.read_row(sql, params) is None:
+      print(what + " was deleted by another user while you were editing it.")
+    else:
+      print(what + " was changed by another user while you were editing it. Please review it and try again.")
+
+  def constraint_message(self, error, foreign_key_message="Referenced record not found!"):
+    """Translate a sqlite3.IntegrityError into a message for the user."""
+    text = str(error)
+    if text.startswith("FOREIGN KEY constraint failed"):
+      return foreign_key_message
+    for prefix, message in self.constraint_messages.items():
+      if text.startswith(prefix):
+        return message
+    return text
 
   def create_table(self):
     """Create necessary tables in the database if they do not exist."""
@@ -145,211 +582,157 @@ class DBOperations:
       self.cur.execute(self.sql_create_flights)# Create Flights table
       self.cur.execute(self.sql_create_pilot)# Create Pilot table
       self.cur.execute(self.sql_create_pilotFlight)# Create FlightPilot table
+      self.cur.execute(self.sql_create_unique_flight_number)# One row per Flight Number
+      self.cur.execute(self.sql_create_unique_license)# One row per License Number
+      self.cur.execute(self.sql_create_unique_pilotFlight)# One row per pilot-flight assignment
       self.conn.commit()# Save changes
-      print("Table created successfully")
+      print("Table created successfully", file=sys.stderr)
     except Exception as e:
       print(e)
     finally:
-      self.conn.close()
+      self.close_connection()
+    self.migrate()# Apply any pending schema migrations
+
+  def has_data(self):
+    """Return True if the database already holds destinations, i.e. it has been seeded."""
+    self.cur.execute(self.sql_check_seeded)
+    return self.cur.fetchone() is not None
 
   def insert_test_data(self):
-    """Insert sample data into the database for testing."""
+    """Insert sample data into the database for testing, once; later runs detect it and return."""
     try:
       self.get_connection()# Establish database connection
-      # Insert sample destinations
-      self.cur.execute(self.sql_insert_des, ("HRL", "London", "UK"))
-      self.cur.execute(self.sql_insert_des, ("GTW", "London", "UK"))
-      self.cur.execute(self.sql_insert_des, ("NYC", "NewYork", "US"))
-      self.cur.execute(self.sql_insert_des, ("CAL", "California", "US"))
-      self.cur.execute(self.sql_insert_des, ("PEK", "Beijing", "China"))
-      self.cur.execute(self.sql_insert_des, ("PVG", "ShangHai", "China"))
-      self.cur.execute(self.sql_insert_des, ("SHA", "ShangHai", "China"))
-      self.cur.execute(self.sql_insert_des, ("CAN", "GuangZhou", "China"))
-      self.cur.execute(self.sql_insert_des, ("PKX", "BeiJing", "China"))
-      self.cur.execute(self.sql_insert_des, ("MAD", "Madrid", "Spain"))
-      self.cur.execute(self.sql_insert_des, ("MLA", "Malta", "Malta"))
-      self.cur.execute(self.sql_insert_des, ("DXB", "Dubai", "UAE"))
-      self.cur.execute(self.sql_insert_des, ("DSS", "Dakar", "Senegal"))
-      self.cur.execute(self.sql_insert_des, ("SAW", "Istanbul", "Turkey"))
-      self.cur.execute(self.sql_insert_des, ("ATH", "Markopoulo", "Greece"))
-
-      # Insert sample pilots
-      self.cur.execute(self.sql_insert_pilot, ("John Smith", "LIC223", "12"))
-      self.cur.execute(self.sql_insert_pilot, ("Harlan Flores", "LIC112", "2"))
-      self.cur.execute(self.sql_insert_pilot, ("Emilia Freeman", "LIC512", "7"))
-      self.cur.execute(self.sql_insert_pilot, ("Brian Serrano", "LIC821", "1"))
-      self.cur.execute(self.sql_insert_pilot, ("Alex Feng", "LIC6677", "10"))
-      self.cur.execute(self.sql_insert_pilot, ("Amelia Brown", "LIC7898", "3"))
-      self.cur.execute(self.sql_insert_pilot, ("Om Johnson", "LIC123", "11"))
-      self.cur.execute(self.sql_insert_pilot, ("Emma Johnson", "LIC456", "9"))
-      self.cur.execute(self.sql_insert_pilot, ("Harrison Smith", "LIC789", "18"))
-      self.cur.execute(self.sql_insert_pilot, ("Christina Brown", "LIC012", "20"))
-      self.cur.execute(self.sql_insert_pilot, ("Emily Wilson", "LIC555", "8"))
-      self.cur.execute(self.sql_insert_pilot, ("Andy Moore", "LIC765", "2"))
-      # Insert sample flights
-      self.cur.execute(self.sql_insert, ("BE123", "On Time", "PEK", "CAL"))
-      self.cur.execute(self.sql_insert, ("CG556", "Landed", "HRL", "NYC"))
-      self.cur.execute(self.sql_insert, ("LW212", "Boarding", "GTW", "NYC"))
-      self.cur.execute(self.sql_insert, ("BA001", "Cancelled", "PEK", "SHA"))
-      self.cur.execute(self.sql_insert, ("BA002", "Delayed", "HRL", "DSS"))
-      self.cur.execute(self.sql_insert, ("BA003", "Boarding", "GTW", "MLA"))
-      self.cur.execute(self.sql_insert, ("BA004", "On Time", "MLA", "PEK"))
-      self.cur.execute(self.sql_insert, ("BA005", "Delayed", "PVG", "HRL"))
-      self.cur.execute(self.sql_insert, ("CG001", "Boarding", "MAD", "NYC"))
-      self.cur.execute(self.sql_insert, ("BE002", "On Time", "DXB", "DSS"))
-      self.cur.execute(self.sql_insert, ("CG003", "Landed", "SAW", "ATH"))
-      self.cur.execute(self.sql_insert, ("LW004", "Boarding", "DXB", "GTW"))
-      # Assign pilots to flights
-      self.cur.execute(self.sql_insert_pilotflight, ("1", "1"))
-      self.cur.execute(self.sql_insert_pilotflight, ("1", "2"))
-      self.cur.execute(self.sql_insert_pilotflight, ("2", "3"))
-      self.cur.execute(self.sql_insert_pilotflight, ("2", "4"))
-      self.cur.execute(self.sql_insert_pilotflight, ("3", "3"))
-      self.cur.execute(self.sql_insert_pilotflight, ("3", "1"))
-      self.cur.execute(self.sql_insert_pilotflight, ("5", "5"))
-      self.cur.execute(self.sql_insert_pilotflight, ("5", "6"))
-      self.cur.execute(self.sql_insert_pilotflight, ("6", "7"))
-      self.cur.execute(self.sql_insert_pilotflight, ("6", "8"))
-      self.cur.execute(self.sql_insert_pilotflight, ("6", "9"))
-      self.cur.execute(self.sql_insert_pilotflight, ("7", "10"))
+      if self.has_data():
+        return# Already seeded
+      # One transaction; INSERT OR IGNORE skips rows left by an earlier partial run
+      self.cur.executemany(self.sql_seed_des, self.test_destinations)
+      self.cur.executemany(self.sql_update_destination_position, self.test_positions)
+      self.cur.executemany(self.sql_seed_pilot, self.test_pilots)
+      self.cur.executemany(self.sql_seed, self.test_flights)
+      self.cur.executemany(self.sql_seed_pilot_flights, self.test_assignments)
       self.conn.commit()# Commit all changes
     except Exception as e:
       print("Error inserting test data:", e)# Print error if insertion fails
     finally:
-      self.conn.close()# Close the database connection
+      self.close_connection()# Close the database connection
 
-  def insert_Destination(self):
-    """Insert a new destination into the database, ensuring a unique Airport Code."""
+  def load_fixture(self, path):
+    """Stream a CSV fixture into the table named by the file (e.g. Pilot.csv) in one transaction."""
     try:
       self.get_connection()# Establish database connection
+      table = os.path.splitext(os.path.basename(path))[0]
+      with open(path, newline="") as fixture:
+        reader = csv.reader(fixture)
+        columns = next(reader)
+        if table == "FlightPilot":
+          # Assignments are given by natural keys, because IDs differ between databases
+          if columns != ["LicenseNumber", "FlightNumber"]:
+            print("FlightPilot fixtures need the columns LicenseNumber,FlightNumber")
+            return
+          sqlExecute = self.sql_seed_pilot_flights
+        elif table == "Flights":
+          # Flights store airport and status keys, so rows are given by code and name like the menu takes them
+          if columns != ["FlightNumber", "Status", "OriginAirport", "DestinationAirport"]:
+            print("Flights fixtures need the columns FlightNumber,Status,OriginAirport,DestinationAirport")
+            return
+          sqlExecute = self.sql_seed
+        else:
+          if table not in self.fixture_tables:
+            print("Unknown fixture table: " + table)
+            return
+          self.cur.execute(self.sql_table_info.replace("@", table))
+          known = {row[1] for row in self.cur.fetchall()}
+          if not columns or not set(columns) <= known:
+            print("Unknown columns in fixture: " + ", ".join(sorted(set(columns) - known)))
+            return
+          sqlExecute = self.sql_seed_fixture.replace("@table", table).replace(
+            "@cols", ", ".join(columns)).replace("@marks", ", ".join("?" * len(columns)))
+        # The reader is consumed lazily, so fixtures of any size load in constant memory
+        self.cur.executemany(sqlExecute, reader)
+        self.conn.commit()# Save changes
+      print("Loaded " + table + " fixture from " + path)
+    except Exception as e:
+      print(e)# Print error if loading fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def create_template(self):
+    """Build a fully migrated and seeded database at template_path for install_template to copy."""
+    template = DBOperations()
+    template.db_path = self.template_path + ".tmp"
+    if os.path.exists(template.db_path):
+      os.remove(template.db_path)
+    template.create_table()
+    template.insert_test_data()
+    os.replace(template.db_path, self.template_path)# Publish the finished template atomically
+    print("Template database written to " + self.template_path)
+
+  def install_template(self):
+    """Copy the template into place when the database file does not exist yet."""
+    if os.path.exists(self.db_path) or not os.path.exists(self.template_path):
+      return False
+    shutil.copyfile(self.template_path, self.db_path + ".tmp")
+    os.replace(self.db_path + ".tmp", self.db_path)
+    return True
 
+  def insert_Destination(self):
+    """Insert a new destination into the database; the primary key rejects duplicate Airport Codes."""
+    try:
       des = DestinationInfo()
-      # Validate unique Airport Code
-      while True:
-        airport_code = input("Please Enter Airport Code: ").strip().upper()
-
-        # Check if Airport Code already exists (case-insensitive)
-
-        self.cur.execute(self.sql_check_airport, (airport_code,))
-        existing_airport = self.cur.fetchone()
-
-        if existing_airport:
-          print("Airport Code already exists! Please enter a different Airport Code.")
-        else:
-          des.set_airport_code(airport_code)
-          break  # Exit loop if Airport Code is unique
+      des.set_airport_code(input("Please Enter Airport Code: ").strip().upper())
       # Get additional destination details
       des.set_destination_name(input("Please Enter Destination Name:"))
       des.set_country(input("Please Enter Country of Destination: "))
       # Insert data into database
+      self.get_connection()# Establish database connection
       insertvals = tuple(str(des).split("\n"))
-      self.cur.execute(self.sql_insert_des, insertvals)
-
-      self.conn.commit()# Save changes
+      self.execute_write(self.sql_insert_des, insertvals)# Save changes
       print("Inserted destination data successfully")
+    except sqlite3.IntegrityError as e:
+      print(self.constraint_message(e))# Duplicate Airport Code
     except Exception as e:
       print(e)
     finally:
-      self.conn.close()
+      self.close_connection()# Close database connection
 
   def insert_data(self):
-    """Insert a new flight into the database, ensuring unique Flight Number and valid data."""
+    """Insert a new flight into the database; the schema rejects duplicate numbers and unknown airports."""
     try:
-      self.get_connection()# Establish database connection
-
       flight = FlightInfo()
-      # Validate unique Flight Number
-      while True:
-        flight_number = input("Please Enter Flight Number: ").strip()
-
-        # Check if Flight Number already exists in the database
-
-        self.cur.execute(self.sql_check_flight, (flight_number,))
-        existing_flight = self.cur.fetchone()
-
-        if existing_flight:
-          print("Flight Number already exists! Please enter a different Flight Number.")
-        else:
-          flight.set_flight_flightnumber(flight_number)
-          break  # Exit loop if Flight Number is unique
-
-      # Validate Flight Status
-      valid_statuses = {
-        "On Time", "Delayed", "Cancelled", "Boarding",
-        "in-Flight", "Landed", "No Show", "Closed"
-      }
+      flight.set_flight_flightnumber(input("Please Enter Flight Number: ").strip())
 
       #Ask user for valid status
       while True:
-        status_input = input(
-          "Please Enter Flight Status (On Time, Delayed, Cancelled, Boarding, in-Flight, Landed, No Show, Closed): "
-        ).strip()
+        status_input = input("Please Enter Flight Status (" + ", ".join(FlightStatus.names) + "): ").strip()
 
-        if status_input in valid_statuses:
+        if status_input in FlightStatus.codes:
           flight.set_status(status_input)
           break  # Exit loop if valid status is entered
         else:
           print("Invalid status! Please choose from the allowed options.")
 
-      # Validate Origin Airport
-      while True:
-        origin_airport = input("Please Enter Origin Airport Code: ").strip().upper()
-
-
-        self.cur.execute(self.sql_check_origin, (origin_airport,))
-        existing_origin = self.cur.fetchone()
-
-        if existing_origin:
-          flight.set_flight_origin(origin_airport)
-          break  # Exit loop if airport exists
-        else:
-          print("Origin Airport Code not found! Please enter a valid Airport Code.")
-
-      # Validate Destination Airport
-      while True:
-        destination_airport = input("Please Enter Destination Airport Code: ").strip().upper()
-
-
-        self.cur.execute(self.sql_check_destination, (destination_airport,))
-        existing_destination = self.cur.fetchone()
-
-        if existing_destination:
-          flight.set_flight_destination(destination_airport)
-          break  # Exit loop if airport exists
-        else:
-          print("Destination Airport Code not found! Please enter a valid Airport Code.")
+      # Airport Codes are checked by the foreign keys when the row is written
+      flight.set_flight_origin(input("Please Enter Origin Airport Code: ").strip().upper())
+      flight.set_flight_destination(input("Please Enter Destination Airport Code: ").strip().upper())
       # Insert flight data into the database
+      self.get_connection()# Establish database connection
       insertvals = tuple(str(flight).split("\n"))
-      self.cur.execute(self.sql_insert, insertvals)
-
-      self.conn.commit() #data save
+      self.execute_write(self.sql_insert, insertvals) #data save
+      self.notify_board()
       print("Inserted flight data successfully")
+    except sqlite3.IntegrityError as e:
+      print(self.constraint_message(e, "Origin or Destination Airport Code not found! Please enter a valid Airport Code."))
     except Exception as e:
       print(e)
     finally:
-      self.conn.close()
+      self.close_connection()# Close database connection
 
   def insert_Pilot(self):
-    """Insert a new pilot into the database, ensuring a unique License Number."""
+    """Insert a new pilot into the database; the unique index rejects duplicate License Numbers."""
     try:
-      self.get_connection()# Establish database connection
-
       pilot = PilotInfo()
       pilot.set_pilot_name(input("Please Enter Pilot's Name: "))
-      # Validate unique License Number
-      while True:
-        license_number = input("Please Enter License Number: ").strip().upper()  # Normalize case sensitivity
-
-        # Check if License Number already exists (case-insensitive)
-
-        self.cur.execute(self.sql_check_license, (license_number,))
-        existing_license = self.cur.fetchone()
-
-        if existing_license:
-          print("License Number already exists! Please enter a different License Number.")
-        else:
-          pilot.set_license_number(license_number)
-          break  # Exit loop if License Number is unique
+      pilot.set_license_number(input("Please Enter License Number: ").strip().upper())  # Normalize case sensitivity
       # Validate Years of Experience (numeric input only)
       while True:
         experience_years = input("Please Enter Years of Experience: ").strip()
@@ -359,394 +742,420 @@ class DBOperations:
         else:
           print("Invalid input! Please enter a valid number for experience years.")
       # Insert pilot data into the database
+      self.get_connection()# Establish database connection
       insertvals = tuple(str(pilot).split("\n"))
-      self.cur.execute(self.sql_insert_pilot, insertvals)
-
-      self.conn.commit()# Save changes
+      self.execute_write(self.sql_insert_pilot, insertvals)# Save changes
       print("Inserted pilot data successfully")
+    except sqlite3.IntegrityError as e:
+      print(self.constraint_message(e))# Duplicate License Number
     except Exception as e:
       print(e)# Print error if insertion fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
   def insert_Pilot_flight(self):
-    """Assign a pilot to a flight, ensuring valid and unique assignment."""
+    """Assign a pilot to a flight in one statement; the unique index rejects duplicate assignments."""
     try:
+      license_number = input("Please Enter Pilot License Number: ").strip().upper()
+      flight_number = input("Please Enter Flight Number: ").strip().upper()
       self.get_connection()
-      # Validate Pilot License Number
-      while True:
-        license_number = input("Please Enter Pilot License Number: ").strip().upper()
-
-
-        self.cur.execute(self.sql_get_pilot_id, (license_number,))
-        pilot_result = self.cur.fetchone()
-
-        if pilot_result:
-          pilot_id = pilot_result[0]
-          break  # Exit loop if a valid PilotID is found
-        else:
-          print("No pilot found with this License Number. Please enter a valid one.")
-      # Validate Flight Number
-      while True:
-        flight_number = input("Please Enter Flight Number: ").strip().upper()
-
-
-        self.cur.execute(self.sql_get_flight_id_2, (flight_number,))
-        flight_result = self.cur.fetchone()
-
-        if flight_result:
-          flight_id = flight_result[0]
-          break  # Exit loop if a valid FlightID is found
-        else:
-          print("No flight found with this Flight Number. Please enter a valid one.")
-
-        #Check if this PilotID and FlightID combination already exists
-
-      self.cur.execute(self.sql_check_existing, (pilot_id, flight_id))
-      existing_entry = self.cur.fetchone()
-
-      if existing_entry:
-        print("This pilot is already assigned to this flight. Please choose another flight or pilot.")
-        return  # Exit function without inserting duplicate data
-      # Assign pilot to flight
-      self.cur.execute(self.sql_add_pilot_flights, (pilot_id, flight_id))
-      self.conn.commit()# Save changes
+      # Assign pilot to flight, looking both IDs up inside the INSERT
+      if self.execute_write(self.sql_add_pilot_flights, (license_number, flight_number)) == 0:
+        print("No pilot or flight found with this License Number and Flight Number. Please enter valid ones.")
+        return
       print("Pilot successfully assigned to flight!")
 
+    except sqlite3.IntegrityError as e:
+      print(self.constraint_message(e))# Pilot already assigned to this flight
     except Exception as e:
       print(e)# Print error if assignment fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
+
+  def print_flights(self, result):
+    """Show flight rows as labelled lines."""
+    if not result:
+      print("No records found!")
+    else:
+      print("Records found:\n")
+      for row in result:
+        if type(row) == type(tuple()):
+          for index, detail in enumerate(row):
+            if index == 0:
+              print("Flight ID: " + str(detail))
+            elif index == 1:
+              print("Flight Number: " + detail)
+            elif index == 2:
+              print("Flight Status: " + detail)
+            elif index == 3:
+              print("Flight Origin: " + detail)
+            elif index == 4:
+              print("Flight Destination: " + detail+"\n")
+            else:
+              print("No Record")
 
   def view_flight_all(self):
     """Retrieve and display all flights from the database."""
     try:
       self.get_connection()# Establish database connection
-      self.cur.execute(self.sql_search_flight_all)# Execute query to get all flights
-
-      result = self.cur.fetchall()# Fetch all records
-      if not result:
-        print("No records found!")
-      else:
-        print("Records found:\n")
-        for row in result:
-          if type(row) == type(tuple()):
-            for index, detail in enumerate(row):
-              if index == 0:
-                print("Flight ID: " + str(detail))
-              elif index == 1:
-                print("Flight Number: " + detail)
-              elif index == 2:
-                print("Flight Status: " + detail)
-              elif index == 3:
-                print("Flight Origin: " + detail)
-              elif index == 4:
-                print("Flight Destination: " + detail+"\n")
-              else:
-                print("No Record")
+      self.show(self.print_flights, self.sql_search_flight_all)# Execute query to get all flights
 
     except Exception as e:
       print(e)# Print error if query fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
   def view_flight_origin(self):
     """Retrieve and display flights based on the origin airport code."""
     try:
       self.get_connection()# Establish database connection
-      flightOrigin = input("Please Enter Flight Origin Airport Code: ")
+      flightOrigin = self.ask("Please Enter Flight Origin Airport Code: ")
 
       interval=tuple(flightOrigin.split("\n"))# Convert input into a tuple
-      self.cur.execute(self.sql_search_origin_airport, interval)# Execute query
-
-      result = self.cur.fetchall() # Fetch all matching records
-      if not result:
-        print("No records found!")
-      else:
-        print("Records found:\n")
-        for row in result:
-          if type(row) == type(tuple()):
-            for index, detail in enumerate(row):
-              if index == 0:
-                print("Flight ID: " + str(detail))
-              elif index == 1:
-                print("Flight Number: " + detail)
-              elif index == 2:
-                print("Flight Status: " + detail)
-              elif index == 3:
-                print("Flight Origin: " + detail)
-              elif index == 4:
-                print("Flight Destination: " + detail+"\n")
-              else:
-                print("No Record")
+      self.show(self.print_flights, self.sql_search_origin_airport, interval)# Execute query
 
     except Exception as e:
       print(e)# Print error if query fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
   def view_flight_destination(self):
     """Retrieve and display flights based on the destination airport code."""
     try:
       self.get_connection()# Establish database connection
-      flightDestination = input("Please Enter Flight Destination Airport Code: ")
+      flightDestination = self.ask("Please Enter Flight Destination Airport Code: ")
 
       interval=tuple(flightDestination.split("\n"))# Convert input into a tuple
-      self.cur.execute(self.sql_search_destination_airport, interval)
-
-      result = self.cur.fetchall()# Fetch all matching records
-      if not result:
-        print("No records found!")
-      else:
-        print("Records found:\n")
-        for row in result:
-          if type(row) == type(tuple()):
-            for index, detail in enumerate(row):
-              if index == 0:
-                print("Flight ID: " + str(detail))
-              elif index == 1:
-                print("Flight Number: " + detail)
-              elif index == 2:
-                print("Flight Status: " + detail)
-              elif index == 3:
-                print("Flight Origin: " + detail)
-              elif index == 4:
-                print("Flight Destination: " + detail+"\n")
-              else:
-                print("No Record")
+      self.show(self.print_flights, self.sql_search_destination_airport, interval)
 
     except Exception as e:
       print(e)# Print error if query fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
   def view_flight_status(self):
     """Retrieve and display flights based on their status."""
     try:
       self.get_connection()# Establish database connection
-      flightStatus = input("Please Enter Flight Status: ")
+      flightStatus = self.ask("Please Enter Flight Status: ")
 
       interval=tuple(flightStatus.split("\n"))# Convert input into a tuple
-      self.cur.execute(self.sql_search_flight_status, interval)# Execute query
-
-      result = self.cur.fetchall()# Fetch all matching records
-      if not result:
-        print("No records found!")
-      else:
-        print("Records found:\n")
-        for row in result:
-          if type(row) == type(tuple()):
-            for index, detail in enumerate(row):
-              if index == 0:
-                print("Flight ID: " + str(detail))
-              elif index == 1:
-                print("Flight Number: " + detail)
-              elif index == 2:
-                print("Flight Status: " + detail)
-              elif index == 3:
-                print("Flight Origin: " + detail)
-              elif index == 4:
-                print("Flight Destination: " + detail+"\n")
-              else:
-                print("No Record")
+      self.show(self.print_flights, self.sql_search_flight_status, interval)# Execute query
 
     except Exception as e:
       print(e)# Print error if query fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
   def view_flight_number(self):
     """Retrieve and display flight details based on flight number."""
     try:
       self.get_connection()# Establish database connection
-      flightNumber = input("Please Enter Flight Number: ")
+      flightNumber = self.ask("Please Enter Flight Number: ")
 
       interval=tuple(flightNumber.split("\n"))# Convert input into a tuple
-      self.cur.execute(self.sql_search_flight_number, interval)# Execute query
-
-      result = self.cur.fetchall()# Fetch matching records
-      if not result:
-        print("No records found!")
-      else:
-        print("Records found:\n")
-        for row in result:
-          if type(row) == type(tuple()):
-            for index, detail in enumerate(row):
-              if index == 0:
-                print("Flight ID: " + str(detail))
-              elif index == 1:
-                print("Flight Number: " + detail)
-              elif index == 2:
-                print("Flight Status: " + detail)
-              elif index == 3:
-                print("Flight Origin: " + detail)
-              elif index == 4:
-                print("Flight Destination: " + detail+"\n")
-              else:
-                print("No Record")
+      self.show(self.print_flights, self.sql_search_flight_number, interval)# Execute query
 
     except Exception as e:
       print(e)# Print error if query fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
+
+  def print_pilots(self, result):
+    """Show pilot rows as labelled lines."""
+    if not result:
+      print("No records found!")
+    else:
+      print("Records found:\n")
+      for row in result:
+        if type(row) == type(tuple()):
+          for index, detail in enumerate(row):
+            if index == 0:
+              print("Pilot Name: " + str(detail))
+            elif index == 1:
+              print("License Number: " + str(detail))
+            elif index == 2:
+              print("Experience Years: " + str(detail)+"\n")
+        else:
+          print("No Record")
 
   def view_pilot_all(self):
     """Retrieve and display all pilots from the database."""
     try:
       self.get_connection()# Establish database connection
-      self.cur.execute(self.sql_search_pilot_all)# Execute query to fetch all pilots
-
-      result = self.cur.fetchall()# Fetch all records
-      if not result:
-        print("No records found!")
-      else:
-        print("Records found:\n")
-        for row in result:
-          if type(row) == type(tuple()):
-            for index, detail in enumerate(row):
-              if index == 0:
-                print("Pilot Name: " + str(detail))
-              elif index == 1:
-                print("License Number: " + str(detail))
-              elif index == 2:
-                print("Experience Years: " + str(detail)+"\n")
-          else:
-            print("No Record")
+      self.show(self.print_pilots, self.sql_search_pilot_all)# Execute query to fetch all pilots
 
     except Exception as e:
       print(e)
     finally:
-      self.conn.close()
+      self.close_connection()
+
+  def print_pilot_matches(self, results):
+    """Show the pilots found by a search as labelled lines."""
+    for result in results:
+      if type(result) == type(tuple()):
+        for index, detail in enumerate(result):
+          if index == 0:
+            print("");
+          elif index == 1:
+            print("Name: " + str(detail))
+          elif index == 2:
+            print("License: " + detail)
+          else:
+            print("Years Experience: " + str(detail)+"\n")
+    if len(results) == 0: print("No Record")
 
   def search_pilot_years(self, op):
     """Retrieve and display pilots based on experience years using comparison operators."""
     try:
       self.get_connection()# Establish database connection
-      searchId = int(input("Please Enter years: "))# Get experience years input
+      searchId = int(self.ask("Please Enter years: "))# Get experience years input
       searchParams = (searchId,)
       # Determine which query to use based on operator
       if op == ">":
         sqlExecute = self.sql_search_pilot_years_more
       else:
         sqlExecute = self.sql_search_pilot_years_less
-      self.cur.execute(sqlExecute, searchParams)
-      self.conn.commit()
-      results = self.cur.fetchall()# Fetch matching records
-      for result in results:
-        if type(result) == type(tuple()):
-          for index, detail in enumerate(result):
-            if index == 0:
-              print("");
-            elif index == 1:
-              print("Name: " + str(detail))
-            elif index == 2:
-              print("License: " + detail)
-            else:
-              print("Years Experience: " + str(detail)+"\n")
-      if len(results) == 0: print("No Record")
+      self.show(self.print_pilot_matches, sqlExecute, searchParams)
 
     except Exception as e:
       print(e) # Print error if query fails
     finally:
-      self.conn.close()
+      self.close_connection()
 
   def search_pilot(self, field):
     """Search and display pilot details based on a specified field."""
     try:
       self.get_connection()# Establish database connection
-      searchId = input("Please Enter " + field + ": ")# Get user input
+      searchId = self.ask("Please Enter " + field + ": ")# Get user input
       searchParams = (searchId,)
       # Replace placeholder in SQL query with the actual field name
       sqlExecute = self.sql_search_pilot.replace("@", field)
-      self.cur.execute(sqlExecute, searchParams)# Execute query
-      self.conn.commit()
-      results = self.cur.fetchall()# Fetch matching records
-      for result in results:
-        if type(result) == type(tuple()):
-          for index, detail in enumerate(result):
-            if index == 0:
-              print("")
-            elif index == 1:
-              print("Name: " + str(detail))
-            elif index == 2:
-              print("License: " + detail)
-            else:
-              print("Years Experience: " + str(detail))
-      if len(results) == 0: print("No Record")
+      self.show(self.print_pilot_matches, sqlExecute, searchParams)# Execute query
 
     except Exception as e:
       print(e)# Print error if query fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
+
+  def print_pilot_flights(self, result):
+    """Show pilot-flight assignment rows as labelled lines."""
+    if not result:
+      print("No records found!")
+    else:
+      print("Records found:\n")
+      for row in result:
+        if type(row) == type(tuple()):
+          for index, detail in enumerate(row):
+            if index == 0:
+              print("FlightPilot ID: " + str(detail))
+            elif index == 1:
+              print("Pilot ID: " + str(detail))
+            elif index == 2:
+              print("Pilot Name: " + detail)
+            elif index == 3:
+              print("License Number: " + detail)
+            elif index == 4:
+              print("Experience Years: " + str(detail))
+            elif index == 5:
+              print("Flight ID: " + str(detail))
+            elif index == 6:
+              print("Flight Number: " + detail)
+            elif index == 7:
+              print("Status: " + detail)
+            elif index == 8:
+              print("Origin Airport Code: " + str(detail))
+            elif index == 9:
+              print("Destination Airport Code: " + detail+"\n")
+            else:
+              print("No Record")
 
   def view_pilot_flight_all(self):
     """Retrieve and display all pilot-flight assignments."""
     try:
       self.get_connection()# Establish database connection
-      self.cur.execute(self.sql_view_pilot_flight_all)# Execute query to fetch all records
-
-      result = self.cur.fetchall()# Fetch matching records
-      if not result:
-        print("No records found!")
-      else:
-        print("Records found:\n")
-        for row in result:
-          if type(row) == type(tuple()):
-            for index, detail in enumerate(row):
-              if index == 0:
-                print("FlightPilot ID: " + str(detail))
-              elif index == 1:
-                print("Pilot ID: " + str(detail))
-              elif index == 2:
-                print("Pilot Name: " + detail)
-              elif index == 3:
-                print("License Number: " + detail)
-              elif index == 4:
-                print("Experience Years: " + str(detail))
-              elif index == 5:
-                print("Flight ID: " + str(detail))
-              elif index == 6:
-                print("Flight Number: " + detail)
-              elif index == 7:
-                print("Status: " + detail)
-              elif index == 8:
-                print("Origin Airport Code: " + str(detail))
-              elif index == 9:
-                print("Destination Airport Code: " + detail+"\n")
-              else:
-                print("No Record")
+      self.show(self.print_pilot_flights, self.sql_view_pilot_flight_all)# Execute query to fetch all records
 
     except Exception as e:
       print(e)# Print error if query fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
+
+  def print_pilot_flight_matches(self, results):
+    """Show a pilot's flights as labelled lines."""
+    for result in results:
+      if type(result) == type(tuple()):
+        for index, detail in enumerate(result):
+          if index == 0:
+            print("Flight Number: " + str(detail))
+          elif index == 1:
+            print("Status: " + detail)
+          elif index == 2:
+            print("Flight Origin: " + detail)
+          elif index == 3:
+            print("Flight Destination: " + detail+"\n")
+    if len(results) == 0: print("No Record")
 
   def search_pilot_flight(self):
     """Retrieve and display flights assigned to a specific pilot based on license number."""
     try:
       self.get_connection() # Establish database connection
-      flightID = input("Enter Pilot License: ")# Get and format user input
+      flightID = self.ask("Enter Pilot License: ")# Get and format user input
       searchParams = (flightID,)
-      self.cur.execute(self.sql_search_pilot_flights, searchParams)# Execute query
-      self.conn.commit()
-      results = self.cur.fetchall()# Fetch matching records
-      for result in results:
-        if type(result) == type(tuple()):
-          for index, detail in enumerate(result):
-            if index == 0:
-              print("Flight Number: " + str(detail))
-            elif index == 1:
-              print("Status: " + detail)
-            elif index == 2:
-              print("Flight Origin: " + detail)
-            elif index == 3:
-              print("Flight Destination: " + detail+"\n")
-      if len(results) == 0: print("No Record")
+      self.show(self.print_pilot_flight_matches, self.sql_search_pilot_flights, searchParams)# Execute query
 
     except Exception as e:
       print(e)
     finally:
-      self.conn.close()
+      self.close_connection()
+
+  def print_pilot_workload(self, results):
+    """Show pilot workload rows as labelled lines."""
+    for result in results:
+      print("Name: " + result[1])
+      print("License: " + result[2])
+      print("Years Experience: " + str(result[3]))
+      print("Active Flights: " + str(result[4]))
+      print("Total Assignments: " + str(result[5]) + "\n")
+    if len(results) == 0: print("No Record")
+
+  def view_pilot_workload(self):
+    """Display the least-loaded pilots with at least a given number of years of experience."""
+    try:
+      self.get_connection()# Establish database connection
+      min_years = int(self.ask("Please Enter Minimum Years of Experience: "))
+      limit = int(self.ask("Please Enter Number of Pilots to Show: "))
+      self.show(self.print_pilot_workload, self.sql_least_loaded_pilots, (min_years, limit))
+
+    except Exception as e:
+      print(e)# Print error if query fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def run_query(self, builder):
+    """Run one page of a QueryBuilder on the open cursor; return (rows, next cursor)."""
+    sql, params = builder.build()
+    self.cur.execute(sql, params)
+    rows = self.cur.fetchall()
+    return rows, builder.next_cursor(rows, self.cur.description)
+
+  def browse_flights(self):
+    """Combine flight filters, pick a sort order and page through the results."""
+    try:
+      builder = QueryBuilder("Flights")
+      statuses = self.ask("Please Enter Statuses (comma separated, blank for any): ").strip()
+      if statuses:
+        builder.where("Status", "IN", [status.strip() for status in statuses.split(",")])
+      origin = self.ask("Please Enter Origin Airport Code (blank for any): ").strip().upper()
+      if origin:
+        builder.where("OriginAirport", "=", origin)
+      destination = self.ask("Please Enter Destination Airport Code (blank for any): ").strip().upper()
+      if destination:
+        builder.where("DestinationAirport", "=", destination)
+      sort = self.ask("Please Enter Sort Column (FlightNumber, FlightID): ").strip()
+      builder.order_by(sort or "FlightNumber")
+      builder.limit(20)
+      self.get_connection()# Establish database connection
+      while True:
+        rows, cursor = self.run_query(builder)
+        for row in rows:
+          print(" | ".join("" if value is None else str(value) for value in row))
+        if not rows:
+          print("No records found!")
+        if cursor is None or self.ask("Press Enter for the next page, or q to stop: ").strip().lower() == "q":
+          break
+        builder.after(cursor)
+    except Exception as e:
+      print(e)# Print error if the query is invalid or fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def plan_crews(self, flights, pilots, min_experience=0, load_cap=3, requirements=None):
+    """Plan one pilot per flight, greedily giving each flight the least-loaded qualified pilot.
+
+    flights are (FlightID, FlightNumber) rows and pilots (PilotID, ExperienceYears, ActiveFlights, ...)
+    rows. requirements maps a FlightNumber to its minimum experience, overriding min_experience. A pilot
+    never exceeds load_cap active flights and never gets the same flight twice. Flights are handled
+    from the most to the least demanding, admitting pilots into a load-ordered heap as the requirement
+    drops, so the whole plan costs O((flights + pilots) log pilots). Returns (plan, unstaffed) where
+    plan holds (FlightID, PilotID) pairs.
+    """
+    requirements = requirements or {}
+    demanding = sorted(flights, key=lambda flight: requirements.get(flight[1], min_experience), reverse=True)
+    by_experience = sorted(pilots, key=lambda pilot: pilot[1], reverse=True)
+    loads = {pilot[0]: pilot[2] for pilot in pilots}
+    eligible = []# Heap of (load, PilotID) for pilots experienced enough for the current flight
+    admitted = 0
+    plan, unstaffed = [], []
+    for flight_id, flight_number in demanding:
+      needed = requirements.get(flight_number, min_experience)
+      while admitted < len(by_experience) and by_experience[admitted][1] >= needed:
+        pilot_id = by_experience[admitted][0]
+        if loads[pilot_id] < load_cap:
+          heapq.heappush(eligible, (loads[pilot_id], pilot_id))
+        admitted += 1
+      if not eligible:
+        unstaffed.append(flight_number)
+        continue
+      load, pilot_id = heapq.heappop(eligible)
+      plan.append((flight_id, pilot_id))
+      loads[pilot_id] = load + 1
+      if load + 1 < load_cap:
+        heapq.heappush(eligible, (load + 1, pilot_id))# Pilots at the cap drop out for good
+    return plan, unstaffed
+
+  def assign_crews(self, min_experience=0, load_cap=3, requirements=None, dry_run=False):
+    """Staff every unstaffed flight in one transaction and report solve time and plan quality."""
+    try:
+      self.get_connection()# Establish database connection
+      self.cur.execute(self.sql_unstaffed_flights)
+      flights = self.cur.fetchall()
+      self.cur.execute(self.sql_pilot_workload)
+      pilots = self.cur.fetchall()
+      started = time.perf_counter()
+      plan, unstaffed = self.plan_crews(flights, pilots, min_experience, load_cap, requirements)
+      solve_time = time.perf_counter() - started
+      if not dry_run:
+        self.cur.executemany(self.sql_insert_plan, plan)
+        self.conn.commit()# Save the whole plan at once
+      used = {}
+      for flight_id, pilot_id in plan:
+        used[pilot_id] = used.get(pilot_id, 0) + 1
+      print("Solved in " + format(solve_time, ".3f") + "s: " + str(len(plan)) + " of " + str(len(flights))
+            + " unstaffed flight(s) staffed using " + str(len(used)) + " pilot(s)")
+      if used:
+        print("Flights per pilot in plan: max " + str(max(used.values()))
+              + ", mean " + format(len(plan) / len(used), ".2f"))
+      if unstaffed:
+        print(str(len(unstaffed)) + " flight(s) left unstaffed (no qualified pilot under the load cap), e.g. "
+              + ", ".join(unstaffed[:5]))
+      return plan, unstaffed
+    except Exception as e:
+      print(e)# Print error if planning fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def auto_assign_pilots(self):
+    """Ask for the solver limits and staff every unstaffed flight."""
+    min_experience = input("Please Enter Minimum Years of Experience: ").strip()
+    load_cap = input("Please Enter Maximum Active Flights per Pilot: ").strip()
+    if not (min_experience.isdigit() and load_cap.isdigit()):
+      print("Invalid input! Please enter valid numbers.")
+      return
+    self.assign_crews(int(min_experience), int(load_cap))
+
+  def print_destination_matches(self, results):
+    """Show the destinations found by a search as labelled lines."""
+    for result in results:
+      if type(result) == type(tuple()):
+        for index, detail in enumerate(result):
+          if index == 0:
+            print("Airport Code: " +detail)
+          elif index == 1:
+            print("City of Destination: " + str(detail))
+          elif index == 2:
+            print("Country: " + detail+"\n")
+    if len(results) == 0: print("No Record Found!")
 
   def search_destination(self, field):
     """Search and display destination details based on a specified field."""
@@ -754,148 +1163,215 @@ class DBOperations:
       self.get_connection()# Establish database connection
       # Get user input with specific formatting for AirportCode
       if field=="AirportCode":
-        searchId = input("Please Enter " + field + " in Capital Letter: ")
+        searchId = self.ask("Please Enter " + field + " in Capital Letter: ")
       else:
-        searchId = input("Please Enter " + field + ": ")
+        searchId = self.ask("Please Enter " + field + ": ")
 
       searchParams = (searchId,)
       sqlExecute = self.sql_search_destination.replace("@", field)# Replace placeholder with field name
-      self.cur.execute(sqlExecute, searchParams)# Execute query
-      self.conn.commit()
-      results = self.cur.fetchall()# Fetch matching records
-      for result in results:
-        if type(result) == type(tuple()):
-          for index, detail in enumerate(result):
+      self.show(self.print_destination_matches, sqlExecute, searchParams)# Execute query
+
+    except Exception as e:
+      print(e)# Print error if query fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def print_destinations(self, result):
+    """Show destination rows as labelled lines."""
+    if not result:
+      print("No records found!")
+    else:
+      print("Records found:\n")
+      for row in result:
+        if type(row) == type(tuple()):
+          for index, detail in enumerate(row):
             if index == 0:
-              print("Airport Code: " +detail)
+              print("Airport Code: " + detail)
             elif index == 1:
-              print("City of Destination: " + str(detail))
+              print("City of Destination: " + detail)
             elif index == 2:
               print("Country: " + detail+"\n")
-      if len(results) == 0: print("No Record Found!")
+            else:
+              print("No Record")
+
+  def view_destination_all(self):
+    """Retrieve and display all destinations from the database."""
+    try:
+      self.get_connection()# Establish database connection
+      self.show(self.print_destinations, self.sql_search_destination_all)# Execute query to fetch all destinations
+
+    except Exception as e:
+      print(e)# Print error if query fails
+    finally:
+      self.close_connection()# Close database connection
+
+  @classmethod
+  def search_boxes(cls, latitude, longitude, radius_km):
+    """The (min latitude, max latitude, min longitude, max longitude) boxes, in degrees, that hold every
+    point within radius_km of a position; two boxes when the circle crosses the 180th meridian."""
+    angle = radius_km / cls.earth_radius_km
+    if angle >= math.pi:
+      return [(-90.0, 90.0, -180.0, 180.0)]
+    low, high = latitude - math.degrees(angle), latitude + math.degrees(angle)
+    if low <= -90 or high >= 90:
+      return [(max(low, -90.0), min(high, 90.0), -180.0, 180.0)]# The circle holds a pole: every longitude
+    spread = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(latitude))))
+    west, east = longitude - spread, longitude + spread
+    if west < -180:
+      return [(low, high, west + 360, 180.0), (low, high, -180.0, east)]
+    if east > 180:
+      return [(low, high, west, 180.0), (low, high, -180.0, east - 360)]
+    return [(low, high, west, east)]
+
+  def airports_within(self, latitude, longitude, radius_km, exclude=None):
+    """Airports within radius_km of a position as nearby_columns rows, nearest first, on the open connection."""
+    rows = []
+    for box in self.search_boxes(latitude, longitude, radius_km):
+      self.cur.execute(self.sql_airports_in_box, (latitude, longitude) + box + (radius_km, exclude))
+      rows += self.cur.fetchall()
+    rows.sort(key=lambda row: (row[5], row[0]))
+    return rows
+
+  def nearest_airports(self, latitude, longitude, count, exclude=None):
+    """The count airports nearest to a position, searching ever wider circles until enough are inside one."""
+    radius = self.nearest_start_km
+    while True:
+      rows = self.airports_within(latitude, longitude, radius, exclude)
+      if len(rows) >= count or radius >= math.pi * self.earth_radius_km:
+        return rows[:count]
+      radius *= 2
+
+  def airport_position(self, airport_code):
+    """(Latitude, Longitude) of an airport on the open connection; ValueError if it is unknown or has no position."""
+    self.cur.execute(self.sql_get_destination_position, (airport_code,))
+    position = self.cur.fetchone()
+    if position is None:
+      raise ValueError("Airport Code is not exists! Please enter a correct Airport Code.")
+    if None in position:
+      raise ValueError("Airport " + airport_code + " has no position yet.")
+    return position
+
+  def print_nearby(self, rows):
+    """Show nearby_columns rows as labelled lines."""
+    if not rows:
+      print("No records found!")
+      return
+    print("Records found:\n")
+    for row in rows:
+      print("Airport Code: " + row[0])
+      print("City of Destination: " + str(row[1]))
+      print("Country: " + str(row[2]))
+      print("Distance: " + format(row[5], ".1f") + " km\n")
+
+  def view_nearest_airports(self):
+    """Display the airports nearest to a given airport, e.g. alternates for a diversion."""
+    try:
+      airport_code = self.ask("Please Enter Airport Code in Capital Letter: ").strip().upper()
+      count = self.ask("Please Enter Number of Airports (blank for 5): ").strip()
+      count = int(count) if count else 5
+
+      self.get_connection()# Establish database connection
+      latitude, longitude = self.airport_position(airport_code)
+      self.show(self.print_nearby, rows=self.nearest_airports(latitude, longitude, count, airport_code),
+                columns=list(self.nearby_columns))
 
     except Exception as e:
       print(e)# Print error if query fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
-  def view_destination_all(self):
-    """Retrieve and display all destinations from the database."""
+  def view_airports_within(self):
+    """Display the airports within a distance of a given airport, nearest first."""
     try:
+      airport_code = self.ask("Please Enter Airport Code in Capital Letter: ").strip().upper()
+      radius = float(self.ask("Please Enter Distance in km: "))
+
       self.get_connection()# Establish database connection
-      self.cur.execute(self.sql_search_destination_all)# Execute query to fetch all destinations
+      latitude, longitude = self.airport_position(airport_code)
+      self.show(self.print_nearby, rows=self.airports_within(latitude, longitude, radius, airport_code),
+                columns=list(self.nearby_columns))
 
-      result = self.cur.fetchall()# Fetch all records
-      if not result:
-        print("No records found!")
-      else:
-        print("Records found:\n")
-        for row in result:
-          if type(row) == type(tuple()):
-            for index, detail in enumerate(row):
-              if index == 0:
-                print("Airport Code: " + detail)
-              elif index == 1:
-                print("City of Destination: " + detail)
-              elif index == 2:
-                print("Country: " + detail+"\n")
-              else:
-                print("No Record")
+    except Exception as e:
+      print(e)# Print error if query fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def print_route_distances(self, rows):
+    """Show route lengths as labelled lines."""
+    found = False
+    for row in rows:
+      found = True
+      print("Flight Number: " + row[0])
+      print("Flight Origin: " + str(row[1]))
+      print("Flight Destination: " + str(row[2]))
+      print("Distance: " + ("unknown" if row[3] is None else format(row[3], ".1f") + " km") + "\n")
+    if not found:
+      print("No records found!")
+
+  def view_route_distances(self):
+    """Display the great-circle length of every flight's route."""
+    try:
+      self.get_connection()# Establish database connection
+      self.show(self.print_route_distances, self.sql_route_distances)
 
     except Exception as e:
       print(e)# Print error if query fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
   def update_flight(self):
-    """Update flight details, ensuring valid input and existing flight records."""
+    """Update flight details; the write only lands if nobody changed the flight since it was read."""
     try:
       flight = FlightInfo()
-      self.get_connection() # Establish database connection
-      # Validate Flight Number
-      while True:
-        flight_number = input("Please Enter Flight Number: ").strip()
-
-        # Check if Flight Number already exists in the database
-
-        self.cur.execute(self.sql_check_flight, (flight_number,))
-        existing_flight = self.cur.fetchone()
-
-        if existing_flight:
-          flight.set_flight_flightnumber(flight_number)
-          break  # Exit loop if Flight Number is unique
-        else:
-          print("Flight Number is not exists! Please enter a correct Flight Number.")
-      # Validate Flight Status
-      valid_statuses = {
-        "On Time", "Delayed", "Cancelled", "Boarding",
-        "in-Flight", "Landed", "No Show", "Closed"
-      }
+      flight.set_flight_flightnumber(input("Please Enter Flight Number: ").strip())
+      current = self.read_row(self.sql_get_flight, (flight.flightNumber,))
+      if current is None:
+        print("Flight Number is not exists! Please enter a correct Flight Number.")
+        return
 
-      #Ask user for valid status
+      #Ask user for a status the flight may move to from its current one
+      current_status = current[0]
+      next_statuses = FlightStatus.next_statuses(current_status)
       while True:
-        status_input = input(
-          "Please Enter Flight Status (On Time, Delayed, Cancelled, Boarding, in-Flight, Landed, No Show, Closed): "
-        ).strip()
+        status_input = input("Please Enter Flight Status (currently " + str(current_status) + "; "
+                             + ", ".join(next_statuses) + "): ").strip()
 
-        if status_input in valid_statuses:
+        if FlightStatus.allows(current_status, status_input):
           flight.set_status(status_input)
           break  # Exit loop if valid status is entered
+        elif status_input in FlightStatus.codes:
+          print("Invalid status transition! A flight cannot go from " + str(current_status) + " to " + status_input + ".")
         else:
           print("Invalid status! Please choose from the allowed options.")
-      # Validate Origin Airport
-      while True:
-        origin_airport = input("Please Enter Origin Airport Code: ").strip().upper()
-
-        self.cur.execute(self.sql_check_origin, (origin_airport,))
-        existing_origin = self.cur.fetchone()
-
-        if existing_origin:
-          flight.set_flight_origin(origin_airport)
-          break  # Exit loop if airport exists
-        else:
-          print("Origin Airport Code not found! Please enter a valid Airport Code.")
-
-      # Validate Destination Airport
-      while True:
-        destination_airport = input("Please Enter Destination Airport Code: ").strip().upper()
-
-        self.cur.execute(self.sql_check_destination, (destination_airport,))
-        existing_destination = self.cur.fetchone()
-
-        if existing_destination:
-          flight.set_flight_destination(destination_airport)
-          break  # Exit loop if airport exists
-        else:
-          print("Destination Airport Code not found! Please enter a valid Airport Code.")
-      # Update flight details in the database
-      self.cur.execute(self.sql_update_flight,
-                       (flight.status, flight.flightOrigin, flight.flightDestination, flight.flightNumber))
-      self.conn.commit()# Save changes
-      print("Updated successful!")
+      # Airport Codes are checked by the foreign keys when the row is written
+      flight.set_flight_origin(input("Please Enter Origin Airport Code: ").strip().upper())
+      flight.set_flight_destination(input("Please Enter Destination Airport Code: ").strip().upper())
+      # Update flight details in the database, guarded by the version that was read
+      self.get_connection() # Establish database connection
+      rowcount = self.execute_write(self.sql_update_flight_checked,
+                                    (flight.status, flight.flightOrigin, flight.flightDestination, flight.flightNumber, current[3]))
+      if rowcount == 0:
+        self.report_conflict(self.sql_get_flight, (flight.flightNumber,), "Flight " + flight.flightNumber)
+        return
+      self.notify_board()
+      print("Update queued" if rowcount < 0 else "Updated successful!")
 
+    except sqlite3.IntegrityError as e:
+      print(self.constraint_message(e, "Origin or Destination Airport Code not found! Please enter a valid Airport Code."))
     except Exception as e:
       print(e)# Print error if update fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
   def update_pilot(self):
-    """Update pilot details, ensuring valid input and existing license records."""
+    """Update pilot details; the write only lands if nobody changed the pilot since it was read."""
     try:
       pilot = PilotInfo()
-      self.get_connection()# Establish database connection
-      # Validate License Number
-      while True:
-        license_number = input("Please Enter License Number: ").strip().upper()  # Normalize case sensitivity
-        # Check if License Number already exists (case-insensitive)
-        self.cur.execute(self.sql_check_license, (license_number,))
-        existing_license = self.cur.fetchone()
-
-        if existing_license:
-          pilot.set_license_number(license_number)
-          break
-        else:
-          print("Can not find this License Number, Please input again!")
+      pilot.set_license_number(input("Please Enter License Number: ").strip().upper())  # Normalize case sensitivity
+      current = self.read_row(self.sql_get_pilot, (pilot.licenseNumber,))
+      if current is None:
+        print("Can not find this License Number, Please input again!")
+        return
       # Get Pilot Name
       pilot.set_pilot_name(input("Please Enter Pilot's Name: "))
       # Validate Experience Years
@@ -907,52 +1383,56 @@ class DBOperations:
         else:
           print("Invalid input! Please enter a valid number for experience years.")
 
-      # Update pilot details in the database
-      self.cur.execute(self.sql_update_pilot,
-                       (pilot.pilotName, pilot.experienceYears, pilot.licenseNumber))
-
-      self.conn.commit()# Save changes
-      print("Updated successful!")
+      # Update pilot details in the database, guarded by the version that was read
+      self.get_connection()# Establish database connection
+      rowcount = self.execute_write(self.sql_update_pilot_checked,
+                                    (pilot.pilotName, pilot.experienceYears, pilot.licenseNumber, current[2]))
+      if rowcount == 0:
+        self.report_conflict(self.sql_get_pilot, (pilot.licenseNumber,), "Pilot " + pilot.licenseNumber)
+        return
+      print("Update queued" if rowcount < 0 else "Updated successful!")
 
     except Exception as e:
       print(e)# Print error if update fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
   def update_destination(self):
-    """Update destination details, ensuring valid input and existing airport records."""
+    """Update destination details; the write only lands if nobody changed the destination since it was read."""
     try:
       des = DestinationInfo()
-      self.get_connection() # Establish database connection
-      # Validate Airport Code
-      while True:
-        airport_code = input("Please Enter Airport Code: ").strip().upper()
-
-        # Check if Airport Code already exists (case-insensitive)
-
-        self.cur.execute(self.sql_check_airport, (airport_code,))
-        existing_airport = self.cur.fetchone()
-
-        if existing_airport:
-          des.set_airport_code(airport_code)
-          break  # Exit loop if Airport Code is unique
-        else:
-          print("Airport Code is not exists! Please enter a different Airport Code.")
+      des.set_airport_code(input("Please Enter Airport Code: ").strip().upper())
+      current = self.read_row(self.sql_get_destination, (des.airportCode,))
+      if current is None:
+        print("Airport Code is not exists! Please enter a different Airport Code.")
+        return
       # Get updated destination details
       des.set_destination_name(input("Please Enter Destination Name:"))
       des.set_country(input("Please Enter Country of Destination: "))
+      position = [float(value) for value in input("Please Enter Latitude and Longitude, e.g. 51.47 -0.45 (blank to keep): ").replace(",", " ").split()]
+      if len(position) not in (0, 2):
+        print("Invalid position! Please enter the latitude and the longitude, or leave it blank.")
+        return
+      if position and not (-90 <= position[0] <= 90 and -180 <= position[1] <= 180):
+        print("Invalid position! Latitude must be between -90 and 90 and longitude between -180 and 180 degrees.")
+        return
 
-      # Update destination details in the database
-      self.cur.execute(self.sql_update_destination,
-                       (des.destinationName, des.country, des.airportCode))
-
-      self.conn.commit()# Save changes
-      print("Updated successful!")
+      # Update destination details in the database, guarded by the version that was read
+      self.get_connection() # Establish database connection
+      rowcount = self.execute_write(self.sql_update_destination_checked,
+                                    (des.destinationName, des.country) + tuple(position or (None, None))
+                                    + (des.airportCode, current[2]))
+      if rowcount == 0:
+        self.report_conflict(self.sql_get_destination, (des.airportCode,), "Destination " + des.airportCode)
+        return
+      print("Update queued" if rowcount < 0 else "Updated successful!")
 
+    except sqlite3.IntegrityError as e:
+      print(self.constraint_message(e))
     except Exception as e:
       print(e)# Print error if update fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
   # Define Delete_data method to delete data from the table. The user will need to input the flight id to delete the corrosponding record.
   def delete_destination(self):
@@ -962,19 +1442,21 @@ class DBOperations:
       des.set_airport_code(input("Please Enter the Airport Code Which You Want to Delete: "))
 
       self.get_connection()# Establish database connection
-      self.cur.execute(self.sql_delete_destination,(des.airportCode,))# Execute delete query
-
-      self.conn.commit()# Save changes
-      if self.cur.rowcount != 0:
-        print(str(self.cur.rowcount) + " Row(s) deleted successful!")
+      rowcount = self.execute_write(self.sql_delete_destination,(des.airportCode,))# Execute delete query
+      if rowcount < 0:
+        print("Delete queued")
+      elif rowcount != 0:
+        print(str(rowcount) + " Row(s) deleted successful!")
       else:
         print("Cannot find this record in the database")
 
 
+    except sqlite3.IntegrityError as e:
+      print(self.constraint_message(e, "This destination is still used by flights and cannot be deleted."))
     except Exception as e:
       print(e)# Print error if deletion fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
   def delete_flight(self):
     """Delete a flight from the database based on Flight Number."""
@@ -983,11 +1465,12 @@ class DBOperations:
       flight.set_flight_flightnumber(input("Please Enter the FlightNumber Which You Want to Delete: "))
 
       self.get_connection()# Establish database connection
-      self.cur.execute(self.sql_delete_flight,(flight.flightNumber,))# Execute delete query
-
-      self.conn.commit()# Save changes
-      if self.cur.rowcount != 0:
-        print(str(self.cur.rowcount) + " Row(s) deleted successful!")
+      rowcount = self.execute_write(self.sql_delete_flight,(flight.flightNumber,))# Execute delete query
+      self.notify_board()
+      if rowcount < 0:
+        print("Delete queued")
+      elif rowcount != 0:
+        print(str(rowcount) + " Row(s) deleted successful!")
       else:
         print("Cannot find this record in the database")
 
@@ -995,7 +1478,7 @@ class DBOperations:
     except Exception as e:
       print(e)# Print error if deletion fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
 
   def delete_pilot(self):
     """Delete a pilot from the database based on License Number."""
@@ -1004,17 +1487,17 @@ class DBOperations:
       pilot.set_license_number(input("Please Enter the License Number of Pilot Which You Want to Delete: "))
 
       self.get_connection()# Establish database connection
-      self.cur.execute(self.sql_delete_pilot,(pilot.licenseNumber,))
-
-      self.conn.commit() # Save changes
-      if self.cur.rowcount != 0:
-        print(str(self.cur.rowcount) + " Row(s) deleted successful!")
+      rowcount = self.execute_write(self.sql_delete_pilot,(pilot.licenseNumber,))# Execute delete query
+      if rowcount < 0:
+        print("Delete queued")
+      elif rowcount != 0:
+        print(str(rowcount) + " Row(s) deleted successful!")
       else:
         print("Cannot find this record in the database")
     except Exception as e:
       print(e)# Print error if deletion fails
     finally:
-      self.conn.close() # Close database connection
+      self.close_connection()# Close database connection
 
   def delete_pilot_flight(self):
     """Remove a pilot from a specific flight in the FlightPilot table."""
@@ -1026,36 +1509,3675 @@ class DBOperations:
 
 
       self.get_connection()# Establish database connection
-      # Retrieve Pilot ID using License Number
-      self.cur.execute(self.sql_get_pilot_id,(pilot.licenseNumber,))
-      pilot_result = self.cur.fetchone()
+      # Delete the pilot-flight assignment, resolving both IDs inside the DELETE
+      rowcount = self.execute_write(self.sql_delete_flightpilot,(pilot.licenseNumber,flight.flightNumber))
+      if rowcount < 0:
+        print("Delete queued")
+      elif rowcount >0:
+        print(f"Deleted FlightPilot record for LicenseNumber: {pilot.licenseNumber} and FlightNumber: {flight.flightNumber}")
+      else:
+        print("Cannot find this record in the database")
+    except Exception as e:
+      print(e)# Print error if deletion fails
+    finally:
+      self.close_connection()# Close database connection
 
-      if not pilot_result:
-        print("No pilot found with this License Number.")
-        return
+  def timetable(self, start, end, flight_number=None):
+    """Yield the occurrences between two dates (inclusive) as timetable_columns rows, using the open connection.
+
+    Days without a FlightOccurrence row have the first status in FlightStatus.names.
+    """
+    window = (start.isoformat(), end.isoformat())
+    self.cur.execute(self.sql_occurrence_status_in_window, window)
+    statuses = {(row[0], row[1]): row[2] for row in self.cur.fetchall()}
+    self.cur.execute(self.sql_occurrence_pilots_in_window, window)
+    pilots = {(row[0], row[1]): row[2] for row in self.cur.fetchall()}
+    self.cur.execute(self.sql_schedules_in_window, window + (flight_number,))
+    schedules = self.cur.fetchall()
+    for day, schedule in FlightCalendar.occurrences(schedules, start, end):
+      key = (schedule[0], day.isoformat())
+      yield (key[1], schedule[1], statuses.get(key, FlightStatus.names[0]), schedule[2], schedule[3], pilots.get(key, ""))
+
+  def print_timetable(self, rows):
+    """Show timetable_columns rows as labelled lines; rows may be a generator."""
+    found = False
+    for row in rows:
+      if not found:
+        print("Records found:\n")
+        found = True
+      print("Date: " + row[0])
+      print("Flight Number: " + row[1])
+      print("Flight Status: " + row[2])
+      print("Flight Origin: " + str(row[3]))
+      print("Flight Destination: " + str(row[4]))
+      print("Pilots: " + (row[5] or "None") + "\n")
+    if not found:
+      print("No records found!")
+
+  def view_timetable(self):
+    """Display the dated occurrences of the scheduled flights in a window of days."""
+    try:
+      start = self.ask("Please Enter First Date (YYYY-MM-DD, blank for today): ").strip()
+      start = FlightCalendar.parse_date(start) if start else datetime.date.today()
+      end = self.ask("Please Enter Last Date (YYYY-MM-DD, blank for one week): ").strip()
+      end = FlightCalendar.parse_date(end) if end else start + datetime.timedelta(days=6)
+      flight_number = self.ask("Please Enter Flight Number (blank for all flights): ").strip() or None
 
-      pilot_id=pilot_result[0]
-      # Retrieve Flight ID using Flight Number
-      self.cur.execute(self.sql_get_flight_id, (flight.flightNumber,))
-      flight_result = self.cur.fetchone()
+      self.get_connection()# Establish database connection
+      rows = self.timetable(start, end, flight_number)
+      if self.guard is not None:
+        rows = self.guard.limit(rows)# Rows generated in Python are not fetched through the guarded cursor
+      self.show(self.print_timetable, rows=rows, columns=list(self.timetable_columns))
 
-      if not flight_result:
-          print("No flight found with this Flight Number.")
-          return
+    except ValueError:
+      print("Invalid date! Please enter dates as YYYY-MM-DD.")
+    except Exception as e:
+      print(e)# Print error if query fails
+    finally:
+      self.close_connection()# Close database connection
 
-      flight_id = flight_result[0]
-      # Delete the pilot-flight assignment
-      self.cur.execute(self.sql_delete_flightpilot,(pilot_id,flight_id))
+  def add_schedule(self):
+    """Attach a recurrence rule (days of the week and validity period) to a flight number."""
+    try:
+      flight = FlightInfo()
+      flight.set_flight_flightnumber(input("Please Enter Flight Number: ").strip())
+      days = FlightCalendar.parse_days(input("Please Enter Days of Operation (e.g. 135, Mon-Fri or daily): "))
+      valid_from = input("Please Enter First Day (YYYY-MM-DD): ").strip()
+      valid_to = input("Please Enter Last Day (YYYY-MM-DD): ").strip()
 
-      self.conn.commit()# Save changes
-      if self.cur.rowcount >0:
-        print(f"Deleted FlightPilot record for LicenseNumber: {pilot.licenseNumber} and FlightNumber: {flight.flightNumber}")
+      self.get_connection()# Establish database connection
+      rowcount = self.execute_write(self.sql_insert_schedule, (days, valid_from, valid_to, flight.flightNumber))
+      if rowcount == 0:
+        print("Flight Number is not exists! Please enter a correct Flight Number.")
+      else:
+        print("Schedule queued" if rowcount < 0 else "Schedule added successfully")
+
+    except sqlite3.IntegrityError as e:
+      print(self.constraint_message(e))
+    except Exception as e:
+      print(e)# Print error if insertion fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def set_day_status(self):
+    """Set the status of a scheduled flight on one day, leaving its other days as they are."""
+    try:
+      flight = FlightInfo()
+      flight.set_flight_flightnumber(input("Please Enter Flight Number: ").strip())
+      day = FlightCalendar.parse_date(input("Please Enter Date (YYYY-MM-DD): ")).isoformat()
+      status = input("Please Enter Flight Status (" + ", ".join(FlightStatus.names) + "): ").strip()
+      if status not in FlightStatus.codes:
+        print("Invalid status! Please choose from the allowed options.")
+        return
+
+      self.get_connection()# Establish database connection
+      rowcount = self.execute_write(self.sql_set_occurrence_status, (flight.flightNumber, day, status))
+      if rowcount == 0:
+        print("Flight " + flight.flightNumber + " is not scheduled on " + day + ".")
       else:
+        print("Update queued" if rowcount < 0 else "Updated successful!")
+
+    except sqlite3.IntegrityError as e:
+      print(self.constraint_message(e))
+    except ValueError:
+      print("Invalid date! Please enter dates as YYYY-MM-DD.")
+    except Exception as e:
+      print(e)# Print error if update fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def assign_day_pilot(self, remove=False):
+    """Assign a pilot to a scheduled flight on one day, or remove them from it."""
+    try:
+      pilot = PilotInfo()
+      pilot.set_license_number(input("Please Enter Pilot License Number: ").strip())
+      flight = FlightInfo()
+      flight.set_flight_flightnumber(input("Please Enter Flight Number: ").strip())
+      day = FlightCalendar.parse_date(input("Please Enter Date (YYYY-MM-DD): ")).isoformat()
+
+      self.get_connection()# Establish database connection
+      sql = self.sql_delete_occurrence_pilot if remove else self.sql_add_occurrence_pilot
+      rowcount = self.execute_write(sql, (pilot.licenseNumber, flight.flightNumber, day))
+      if rowcount < 0:
+        print("Change queued")
+      elif rowcount > 0:
+        print(("Removed " if remove else "Assigned ") + pilot.licenseNumber + " on " + flight.flightNumber + " for " + day)
+      elif remove:
         print("Cannot find this record in the database")
+      else:
+        print("Cannot find this pilot, or flight " + flight.flightNumber + " is not scheduled on " + day + ".")
+
+    except sqlite3.IntegrityError as e:
+      print(self.constraint_message(e))
+    except ValueError:
+      print("Invalid date! Please enter dates as YYYY-MM-DD.")
     except Exception as e:
-      print(e)# Print error if deletion fails
+      print(e)# Print error if the change fails
     finally:
-      self.conn.close()# Close database connection
+      self.close_connection()# Close database connection
+
+  def show(self, render, sql=None, params=(), rows=None, columns=None):
+    """Present a view's result: run sql once (or take the given rows and columns), then hand the rows to
+    render for text output, or stream them through write_result for machine-readable formats."""
+    if sql is not None:
+      self.cur.execute(sql, params)
+    if self.output_format != "text":
+      self.write_result(rows=rows, columns=columns)
+      return
+    render(self.cur.fetchall() if rows is None else rows)
+
+  def write_result(self, output_format=None, rows=None, columns=None):
+    """Stream the rows of the last query on self.cur (or the given rows) through a writer; return the row count.
+
+    rows may be any iterable, such as a generator; it is written in blocks of RowWriter.block_rows.
+    """
+    output_format = output_format or self.output_format
+    if output_format not in output_writers:
+      raise ValueError("Unknown output format: " + output_format)
+    if columns is None:
+      columns = [description[0] for description in self.cur.description]
+    if self.output_path:
+      stream = open(self.output_path, "ab", buffering=RowWriter.buffer_size)
+    else:
+      sys.stdout.flush()# Keep earlier prompts ahead of the binary output
+      stream = sys.stdout.buffer
+    writer = output_writers[output_format](stream, columns)
+    try:
+      if rows is not None:
+        rows = iter(rows)
+        for block in iter(lambda: list(itertools.islice(rows, RowWriter.block_rows)), []):
+          writer.write_rows(block)
+      else:
+        for block in iter(lambda: self.cur.fetchmany(RowWriter.block_rows), []):
+          writer.write_rows(block)
+      writer.close()
+    finally:
+      if self.output_path:
+        stream.close()
+      else:
+        stream.flush()
+    return writer.row_count
+
+  def run_batch_find(self, args):
+    """Run 'find TABLE [--where COLUMN OP VALUE]... [--order COLUMN [desc]] [--limit N] [--after CURSOR]'."""
+    builder = QueryBuilder(args[0] if args else None)
+    output_format = None if self.output_format == "text" else self.output_format
+    position = 1
+    while position < len(args):
+      option = args[position]
+      if option == "--where":
+        column, operator, value = args[position + 1:position + 4]
+        builder.where(column, operator, value.split(",") if operator.upper() == "IN" else value)
+        position += 4
+      elif option == "--order":
+        descending = args[position + 2:position + 3] == ["desc"]
+        builder.order_by(args[position + 1], descending)
+        position += 3 if descending else 2
+      elif option == "--limit":
+        builder.limit(args[position + 1])
+        position += 2
+      elif option == "--after":
+        builder.after(tuple(json.loads(args[position + 1])))
+        position += 2
+      elif option == "--format":
+        output_format = args[position + 1]
+        position += 2
+      else:
+        raise ValueError("Unknown find option: " + option)
+    rows, cursor = self.run_query(builder)# A page is at most QueryBuilder.max_limit rows
+    self.write_result(output_format or "tsv", rows)
+    if cursor is not None:
+      print("Next page: --after '" + json.dumps(cursor) + "'", file=sys.stderr)
+    return True, str(len(rows)) + " row(s)"
+
+  def run_batch_timetable(self, args):
+    """Run 'view-timetable FROM TO [--flight NUMBER] [--format FORMAT]'."""
+    output_format = None if self.output_format == "text" else self.output_format
+    if len(args) >= 2 and args[-2] == "--format":
+      output_format, args = args[-1], args[:-2]
+    flight_number = None
+    if len(args) == 4 and args[2] == "--flight":
+      flight_number, args = args[3], args[:2]
+    if len(args) != 2:
+      return False, "usage: view-timetable FROM TO [--flight NUMBER] [--format FORMAT]"
+    start, end = FlightCalendar.parse_date(args[0]), FlightCalendar.parse_date(args[1])
+    with QueryGuard(self, "view-timetable") as guard:
+      guard.attach(self)
+      self.write_result(output_format or "tsv", guard.limit(self.timetable(start, end, flight_number)),
+                        list(self.timetable_columns))
+    return True, str(guard.rows) + " row(s)"
+
+  def run_batch_nearby(self, command, args):
+    """Run 'view-nearest AIRPORT [COUNT]' or 'view-within AIRPORT KM', each with an optional [--format FORMAT]."""
+    output_format = None if self.output_format == "text" else self.output_format
+    if len(args) >= 2 and args[-2] == "--format":
+      output_format, args = args[-1], args[:-2]
+    if not (len(args) == 2 or command == "view-nearest" and len(args) == 1):
+      usage = "AIRPORT [COUNT]" if command == "view-nearest" else "AIRPORT KM"
+      return False, "usage: " + command + " " + usage + " [--format FORMAT]"
+    rows = []
+    with QueryGuard(self, command) as guard:
+      guard.attach(self)
+      latitude, longitude = self.airport_position(args[0])
+      if command == "view-nearest":
+        rows = self.nearest_airports(latitude, longitude, int(args[1]) if len(args) > 1 else 5, args[0])
+      else:
+        rows = self.airports_within(latitude, longitude, float(args[1]), args[0])
+      self.write_result(output_format or "tsv", rows, list(self.nearby_columns))
+    return True, str(len(rows)) + " row(s)"
+
+  def run_batch_command(self, words):
+    """Run one parsed batch command on the open connection; return (ok, message)."""
+    command, args = words[0], words[1:]
+    if command == "find":
+      return self.run_batch_find(args)
+    if command == "view-timetable":
+      return self.run_batch_timetable(args)
+    if command in ("view-nearest", "view-within"):
+      return self.run_batch_nearby(command, args)
+    if command in self.batch_views:
+      output_format = None if self.output_format == "text" else self.output_format
+      if len(args) >= 2 and args[-2] == "--format":
+        output_format, args = args[-1], args[:-2]
+      options = self.batch_views[command]
+      option = args[0] if args else None
+      if option not in options or len(args) != (0 if option is None else 2):
+        return False, "usage: " + command + " " + " | ".join(o + " VALUE" for o in options if o) + " [--format FORMAT]"
+      with QueryGuard(self, command) as guard:
+        guard.attach(self)
+        self.cur.execute(getattr(self, options[option]), tuple(args[1:]))
+        self.write_result(output_format or "tsv")
+      return True, str(guard.rows) + " row(s)"
+    if command not in self.batch_commands:
+      return False, "unknown command: " + command
+    query, positions, foreign_key_message = self.batch_commands[command]
+    if len(args) != len(positions):
+      return False, command + " takes " + str(len(positions)) + " argument(s)"
+    try:
+      self.cur.execute(getattr(self, query), tuple(args[i] for i in positions))
+    except sqlite3.IntegrityError as e:
+      return False, self.constraint_message(e, foreign_key_message or "Referenced record not found!")
+    if self.cur.rowcount == 0:
+      return False, "Cannot find this record in the database"
+    return True, None
+
+  def run_batch(self, lines, commit_every=500):
+    """Run script lines such as 'view-flights --status Delayed' on one connection, committing every commit_every writes."""
+    counts = {}
+    failed = writes = committed = commits = 0
+    started = time.perf_counter()
+    try:
+      self.get_connection()# Establish database connection
+      for number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line or line.startswith("#"):
+          continue# Skip blank lines and comments
+        try:
+          words = shlex.split(line)
+          ok, message = self.run_batch_command(words)
+        except Exception as e:
+          ok, message = False, str(e)# A bad line is reported, never fatal
+        if not ok:
+          failed += 1
+          print("Line " + str(number) + ": " + message, file=sys.stderr)
+          continue
+        counts[words[0]] = counts.get(words[0], 0) + 1
+        if words[0] in self.batch_commands:
+          writes += 1
+          if writes % commit_every == 0:
+            self.conn.commit()# Group commit
+            committed, commits = writes, commits + 1
+            self.notify_board()
+      self.conn.commit()
+      committed, commits = writes, commits + 1
+      self.notify_board()
+    except Exception as e:
+      print(e)# Print error if the batch cannot continue
+      failed += 1
+      if writes > committed:
+        print("Batch aborted: " + str(writes - committed) + " uncommitted write(s) rolled back", file=sys.stderr)
+    finally:
+      self.close_connection()# Close database connection
+    elapsed = time.perf_counter() - started
+    print("Batch summary: " + str(sum(counts.values())) + " succeeded, " + str(failed) + " failed, "
+          + str(commits) + " commit(s) in " + format(elapsed, ".3f") + "s")
+    for command in sorted(counts):
+      print("  " + command + ": " + str(counts[command]))
+    return failed == 0
+
+  def backup_database(self, target_path, pages=256, sleep=0.05):
+    """Copy the live database to target_path online, pages at a time, reporting progress."""
+    def progress(status, remaining, total):
+      done = total - remaining
+      print("Backup progress: " + str(done) + "/" + str(total) + " pages")
+    try:
+      self.get_connection()# Establish database connection
+      target = sqlite3.connect(target_path)
+      try:
+        # Writers can still commit between steps; sleep throttles the copy on a busy host.
+        self.conn.backup(target, pages=pages, progress=progress, sleep=sleep)
+      finally:
+        target.close()
+      print("Backup written to " + target_path)
+    except Exception as e:
+      print(e)# Print error if backup fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def enable_incremental_vacuum(self):
+    """Switch the database to auto_vacuum=INCREMENTAL, running the one-off VACUUM it needs."""
+    try:
+      self.get_connection()# Establish database connection
+      self.cur.execute(self.sql_get_auto_vacuum)
+      if self.cur.fetchone()[0] == 2:
+        print("Incremental vacuum is already enabled")
+        return
+      self.cur.execute(self.sql_set_auto_vacuum)
+      self.cur.execute(self.sql_vacuum)# Rebuild the file so the new mode is applied
+      print("Incremental vacuum enabled")
+    except Exception as e:
+      print(e)# Print error if the switch fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def incremental_vacuum(self, pages=0):
+    """Release free pages back to the file system; pages=0 releases all of them."""
+    try:
+      self.get_connection()# Establish database connection
+      self.cur.execute(self.sql_freelist_count)
+      before = self.cur.fetchone()[0]
+      # executescript steps the pragma to completion; execute() would free a single page.
+      self.cur.executescript(self.sql_incremental_vacuum.replace("@", str(int(pages))))
+      self.cur.execute(self.sql_freelist_count)
+      after = self.cur.fetchone()[0]
+      print(str(before - after) + " free page(s) released, " + str(after) + " remaining")
+    except Exception as e:
+      print(e)# Print error if vacuum fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def analyze_database(self, full=False):
+    """Refresh planner statistics with PRAGMA optimize, or a full ANALYZE when full is True."""
+    try:
+      self.get_connection()# Establish database connection
+      self.cur.execute(self.sql_analyze if full else self.sql_optimize)
+      self.conn.commit()
+      print("Statistics updated")
+    except Exception as e:
+      print(e)# Print error if analysis fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def health_report(self):
+    """Run quick_check and report file size and fragmentation."""
+    try:
+      self.get_connection()# Establish database connection
+      self.cur.execute(self.sql_quick_check)
+      problems = [row[0] for row in self.cur.fetchall()]
+      self.cur.execute(self.sql_page_count)
+      page_count = self.cur.fetchone()[0]
+      self.cur.execute(self.sql_freelist_count)
+      free_pages = self.cur.fetchone()[0]
+      print("Integrity: " + ", ".join(problems))
+      print("Pages: " + str(page_count) + " (" + str(free_pages) + " free)")
+      if self.result_cache is not None:
+        print("Result cache: " + self.result_cache.summary())
+      if self.single_flight is not None:
+        print("Coalesced reads: " + self.single_flight.summary())
+        for key, executions, shared, peak, wait in self.single_flight.top():
+          print("  " + " ".join(key[0].split())[:60] + " " + str(key[1]) + ": " + str(executions) + " executions, "
+                + str(shared) + " shared, up to " + str(peak) + " waiting, " + str(round(wait, 3)) + "s waited")
+      return problems == ["ok"]
+    except Exception as e:
+      print(e)# Print error if the check fails
+      return False
+    finally:
+      self.close_connection()# Close database connection
+
+  def schedule_maintenance(self, interval=3600, vacuum_pages=0):
+    """Run incremental vacuum and optimize every interval seconds on a background timer.
+
+    The timer thread works through DBOperations of its own, so it never replaces the connection
+    and cursor of a command running on this instance.
+    """
+    def tick():
+      ops = DBOperations()
+      ops.db_path = self.db_path
+      ops.incremental_vacuum(vacuum_pages)
+      ops.analyze_database()
+      self.schedule_maintenance(interval, vacuum_pages)
+    self.maintenance_timer = threading.Timer(interval, tick)
+    self.maintenance_timer.daemon = True
+    self.maintenance_timer.start()
+
+  def estimate_rows(self, table):
+    """Estimate a table's row count from sqlite_stat1, counting the rows if there are no statistics."""
+    try:
+      self.cur.execute(self.sql_estimate_rows, (table,))
+      estimate = self.cur.fetchone()[0]
+    except sqlite3.OperationalError:
+      estimate = None# ANALYZE has never run, so sqlite_stat1 does not exist
+    if estimate is None:
+      self.cur.execute(self.sql_count_rows.replace("@", table))
+      estimate = self.cur.fetchone()[0]
+    return estimate
+
+  def normalize_sql(self, sql):
+    """Reduce a CREATE TABLE statement to a canonical form for comparison."""
+    sql = sql.replace("IF NOT EXISTS", "").replace('"', "").strip().rstrip(";")
+    return " ".join(sql.split())
+
+  def rebuild_table(self, table, create_sql, expressions=None):
+    """Rebuild table into create_sql in small batches so writers are never locked out for long.
+
+    Columns of both shapes are copied as they are; expressions maps other new columns to the SQL that
+    fills them from the old row, written with @row standing for it.
+    """
+    expressions = expressions or {}
+    self.cur.execute(self.sql_get_table_sql, (table,))
+    if self.normalize_sql(self.cur.fetchone()[0]) == self.normalize_sql(create_sql):
+      return# Already in the target shape
+    new = table + "_rebuild"
+    # Clear anything left over from an interrupted run
+    for suffix in self.rebuild_trigger_suffixes:
+      self.cur.execute("DROP TRIGGER IF EXISTS " + table + suffix)
+    self.cur.execute("DROP TABLE IF EXISTS " + new)
+    self.cur.execute(self.sql_table_info.replace("@", table))
+    old_columns = [row[1] for row in self.cur.fetchall()]
+    self.cur.execute(re.sub(r"CREATE TABLE (IF NOT EXISTS )?" + table + r"\b", "CREATE TABLE " + new, create_sql, count=1))
+    self.cur.execute(self.sql_table_info.replace("@", new))
+    columns = [row[1] for row in self.cur.fetchall() if row[1] in old_columns or row[1] in expressions]
+    def values(row):
+      return ", ".join(expressions[c].replace("@row", row) if c in expressions else row + "." + c for c in columns)
+    names = {"@newcols": values("NEW"), "@cols": ", ".join(columns), "@exprs": values(table), "@new": new, "@old": table}
+    def fill(sql):
+      for key, value in names.items():
+        sql = sql.replace(key, value)
+      return sql
+    # Writes made while the copy runs are mirrored into the new table
+    for trigger in self.sql_rebuild_triggers:
+      self.cur.execute(fill(trigger))
+    last_rowid = -(1 << 63)
+    while True:
+      self.cur.execute("BEGIN IMMEDIATE")
+      self.cur.execute(fill(self.sql_batch_end), (last_rowid, self.rebuild_batch_size))
+      batch_end = self.cur.fetchone()[0]
+      if batch_end is not None:
+        self.cur.execute(fill(self.sql_copy_batch), (last_rowid, batch_end))
+      self.cur.execute("COMMIT")# Release the write lock between batches
+      if batch_end is None:
+        break
+      last_rowid = batch_end
+    # Swap the tables in one short transaction
+    self.cur.execute(self.sql_get_index_sql, (table,))
+    indexes = [row[0] for row in self.cur.fetchall()]
+    # Legacy rename leaves triggers on other tables that name this table untouched and valid
+    self.cur.execute("PRAGMA legacy_alter_table = ON")
+    self.cur.execute("BEGIN IMMEDIATE")
+    try:
+      for suffix in self.rebuild_trigger_suffixes:
+        self.cur.execute("DROP TRIGGER " + table + suffix)
+      self.cur.execute("DROP TABLE " + table)
+      self.cur.execute("ALTER TABLE " + new + " RENAME TO " + table)
+      for index in indexes:
+        self.cur.execute(index)
+      self.cur.execute("PRAGMA foreign_key_check(" + table + ")")
+      if self.cur.fetchall():
+        raise sqlite3.IntegrityError("Rebuilt " + table + " has rows with broken references")
+      self.cur.execute("COMMIT")
+    except Exception:
+      self.cur.execute("ROLLBACK")
+      raise
+    finally:
+      self.cur.execute("PRAGMA legacy_alter_table = OFF")
+
+  def migrate(self, dry_run=False):
+    """Bring the schema up to the latest migration, or report what that would touch when dry_run is True."""
+    try:
+      self.get_connection()# Establish database connection
+      self.conn.isolation_level = None# Migrations manage their own transactions
+      self.cur.execute(self.sql_get_user_version)
+      version = self.cur.fetchone()[0]
+      pending = [migration for migration in migrations if migration.version > version]
+      if not pending:
+        if dry_run:
+          print("Schema is up to date (version " + str(version) + ")")
+        return 0
+      total = 0
+      for migration in pending:
+        if dry_run:
+          rows = sum(self.estimate_rows(table) for kind, sql, table in migration.steps if table)
+          total += rows
+          print("Version " + str(migration.version) + ": " + migration.description + " (~" + str(rows) + " rows)")
+          continue
+        # Foreign keys are switched off so DROP TABLE during a rebuild cannot cascade
+        self.cur.execute("PRAGMA foreign_keys = OFF")
+        for kind, sql, table in migration.steps:
+          if kind == "rebuild":
+            self.rebuild_table(table, sql, migration.expressions.get(table))
+          else:
+            self.cur.execute(sql)
+        self.cur.execute(self.sql_set_user_version.replace("@", str(migration.version)))
+        self.cur.execute(self.sql_enable_foreign_keys)
+        print("Migrated to version " + str(migration.version) + ": " + migration.description, file=sys.stderr)
+      if dry_run:
+        print("Estimated rows touched: " + str(total))
+      return total
+    except Exception as e:
+      print(e)# Print error if a migration fails
+    finally:
+      self.close_connection()# Close database connection
+
+  def check_upgrade(self, baseline_path):
+    """Migrate a copy of baseline_path and compare it with a newly created database; return True if they match.
+
+    Both databases are made in a temporary directory, so baseline_path itself is not changed. The upgraded
+    copy must end with the same tables, indexes, triggers and views, pass integrity_check and
+    foreign_key_check, and keep as many rows in each table the baseline had.
+    """
+    problems = []
+    with tempfile.TemporaryDirectory() as directory:
+      upgraded, fresh = DBOperations(), DBOperations()
+      upgraded.db_path = os.path.join(directory, "upgraded.db")
+      fresh.db_path = os.path.join(directory, "fresh.db")
+      shutil.copyfile(baseline_path, upgraded.db_path)
+      conn = sqlite3.connect(upgraded.db_path)
+      try:
+        tables = [name for kind, name, sql in conn.execute(self.sql_get_schema) if kind == "table"]
+        counts = {table: conn.execute(self.sql_count_rows.replace("@", '"' + table + '"')).fetchone()[0] for table in tables}
+      finally:
+        conn.close()
+      upgraded.create_table()
+      fresh.create_table()
+      schemas = []
+      for ops in (upgraded, fresh):
+        conn = sqlite3.connect(ops.db_path)
+        try:
+          schemas.append({(kind, name): self.normalize_sql(sql) for kind, name, sql in conn.execute(self.sql_get_schema)})
+          version = conn.execute(self.sql_get_user_version).fetchone()[0]
+          if version != migrations[-1].version:
+            problems.append(os.path.basename(ops.db_path) + " is at version " + str(version))
+        finally:
+          conn.close()
+      for kind, name in sorted(schemas[0].keys() | schemas[1].keys()):
+        if (kind, name) not in schemas[0]:
+          problems.append(kind + " " + name + " is missing after the upgrade")
+        elif (kind, name) not in schemas[1]:
+          problems.append(kind + " " + name + " is left over from the baseline")
+        elif schemas[0][kind, name] != schemas[1][kind, name]:
+          problems.append(kind + " " + name + " differs: " + schemas[0][kind, name] + " != " + schemas[1][kind, name])
+      conn = sqlite3.connect(upgraded.db_path)
+      try:
+        problems += ["integrity_check: " + row[0] for row in conn.execute(self.sql_integrity_check) if row[0] != "ok"]
+        problems += ["foreign_key_check: " + str(row) for row in conn.execute(self.sql_foreign_key_check)]
+        for table, count in counts.items():
+          after = conn.execute(self.sql_count_rows.replace("@", '"' + table + '"')).fetchone()[0]
+          if after != count:
+            problems.append(table + " had " + str(count) + " row(s) and has " + str(after) + " after the upgrade")
+      finally:
+        conn.close()
+    for problem in problems:
+      print(problem)
+    print("Upgrade check " + ("failed: " + str(len(problems)) + " problem(s)" if problems else "passed") + " for " + baseline_path)
+    return not problems
+
+
+class SnapshotConnection(sqlite3.Connection):
+  """Shared read-only snapshot connection, counting the readers that hold it through a SnapshotLease."""
+  readers = 0
+
+  def release(self):
+    """Really close the snapshot connection."""
+    sqlite3.Connection.close(self)
+
+
+class SnapshotLease:
+  """One reader's hold on a snapshot connection, standing in for it as DBOperations.conn.
+
+  Closing the lease lets go of the snapshot (only the first close counts), so the close() calls made by
+  DBOperations end the reader's hold without closing the shared connection.
+  """
+  def __init__(self, owner, snapshot):
+    self.owner = owner
+    self.snapshot = snapshot
+    self.handler = None
+
+  def __getattr__(self, name):
+    if self.snapshot is None:
+      raise sqlite3.ProgrammingError("Cannot operate on a closed database.")
+    return getattr(self.snapshot, name)
+
+  def set_progress_handler(self, handler, steps):
+    """Set the shared connection's progress handler; close() clears it, so it cannot outlive this reader."""
+    self.handler = handler
+    self.__getattr__("set_progress_handler")(handler, steps)
+
+  def close(self):
+    """Let go of the snapshot; it is released once it is replaced and no lease holds it."""
+    snapshot, self.snapshot = self.snapshot, None
+    if snapshot is not None:
+      if self.handler is not None:
+        snapshot.set_progress_handler(None, 0)
+      self.owner.let_go(snapshot)
+
+
+class SnapshotOperations(DBOperations):
+  """Read-only replica of DBOperations that serves every view and search from a database snapshot."""
+  # Memory-map up to 1 GiB of the database file so reads come straight from the page cache.
+  mmap_size = 1 << 30
+
+  def __init__(self, db_path=None, in_memory=False, refresh_interval=None):
+    """Open the first snapshot and optionally start refreshing it every refresh_interval seconds."""
+    self.db_path = db_path or self.db_path
+    self.in_memory = in_memory
+    self.refresh_interval = refresh_interval
+    self.snapshot = None
+    self.lock = threading.Lock()
+    self.timer = None
+    self.closed = False
+    self.refresh_snapshot()
+    if refresh_interval:
+      self.schedule_refresh()
+
+  def open_snapshot(self):
+    """Open the database read-only and immutable, copying it into memory if requested."""
+    uri = "file:" + self.db_path + "?mode=ro&immutable=1"
+    source = sqlite3.connect(uri, uri=True, check_same_thread=False, factory=SnapshotConnection)
+    source.execute("PRAGMA mmap_size = " + str(int(self.mmap_size)))
+    if not self.in_memory:
+      return source
+    snapshot = sqlite3.connect(":memory:", check_same_thread=False, factory=SnapshotConnection)
+    source.backup(snapshot)# Copy every page into the in-memory database
+    source.release()
+    return snapshot
+
+  def refresh_snapshot(self):
+    """Build a fresh snapshot and swap it in atomically; readers never see a half-built one."""
+    snapshot = self.open_snapshot()
+    with self.lock:
+      old, self.snapshot = self.snapshot, snapshot
+      # A reader still holding the previous snapshot releases it when it lets go (see let_go).
+      if old is not None and old.readers == 0:
+        old.release()
+
+  def acquire(self):
+    """Return a SnapshotLease on the current snapshot."""
+    with self.lock:
+      self.snapshot.readers += 1
+      return SnapshotLease(self, self.snapshot)
+
+  def let_go(self, snapshot):
+    """End one reader's hold on snapshot, releasing it if it has been replaced and was the last one."""
+    with self.lock:
+      snapshot.readers -= 1
+      if snapshot.readers == 0 and snapshot is not self.snapshot:
+        snapshot.release()
+
+  def schedule_refresh(self):
+    """Refresh the snapshot on a timer thread every refresh_interval seconds."""
+    def tick():
+      if self.closed:
+        return
+      try:
+        self.refresh_snapshot()
+      except Exception as e:
+        print("Snapshot refresh failed:", e)
+      self.schedule_refresh()
+    self.timer = threading.Timer(self.refresh_interval, tick)
+    self.timer.daemon = True
+    self.timer.start()
+
+  def get_connection(self):
+    """Point the cursor at the current snapshot instead of opening a read-write connection."""
+    previous = getattr(self, "conn", None)
+    self.conn = self.acquire()
+    if previous is not None:
+      previous.close()# Like a dropped connection, a lease left open by the previous command is let go
+    self.cur = self.conn.cursor()
+    if self.guard is not None:
+      self.guard.attach(self)
+
+  def close_snapshot(self):
+    """Stop the refresh timer and release the current snapshot once no reader holds it."""
+    self.closed = True
+    if self.timer is not None:
+      self.timer.cancel()
+    with self.lock:
+      snapshot, self.snapshot = self.snapshot, None
+      if snapshot is not None and snapshot.readers == 0:
+        snapshot.release()
+
+
+class BudgetExceeded(Exception):
+  """Raised inside a guarded command when its time or output budget runs out."""
+
+
+class QueryGuard:
+  """Holds one command to its budgets and prints a notice if it had to stop early.
+
+  Time is counted from the first statement, restarting after each prompt, and checked by a SQLite
+  progress handler every progress_steps VM instructions (which interrupts the statement) and on every
+  write to standard output; rows by a cursor wrapper that stops returning rows at
+  the limit; output bytes by a wrapper around standard output that drops the rest once the limit is hit.
+  """
+  progress_steps = 10000
+
+  def __init__(self, ops, command):
+    self.ops = ops
+    self.command = command
+    self.seconds, self.max_rows, self.max_bytes = ops.query_budgets.get(command, ops.query_budgets["default"])
+    self.exceeded = None
+    self.rows = 0
+    self.bytes = 0
+    self.line_open = False# Whether the output written so far ends part-way through a line
+    self.attached = []
+
+  def __enter__(self):
+    self.started = None# Set by start() when the command runs its first statement
+    self.previous = self.ops.guard
+    self.ops.guard = self
+    self.stdout = sys.stdout
+    self.stream = sys.stdout = BudgetedStream(self, sys.stdout)
+    return self
+
+  def __exit__(self, exc_type, exc, tb):
+    sys.stdout = self.stdout
+    self.ops.guard = self.previous
+    for ops, conn, cursor in self.attached:
+      try:
+        conn.set_progress_handler(None, 0)
+      except sqlite3.ProgrammingError:
+        pass# Already closed by the command
+      if ops.cur is not cursor and isinstance(ops.cur, GuardedCursor):
+        ops.cur = cursor
+    if self.exceeded and self.ops.output_format == "text":
+      print(self.note() if self.line_open else self.note().lstrip("\n"))
+    elif self.exceeded:
+      print(self.note().lstrip("\n"), file=sys.stderr)# Keep machine-readable output clean
+    # Stopping at a budget is a normal end; SQLite reports an interrupt from out_of_time as OperationalError
+    return exc_type is not None and (issubclass(exc_type, BudgetExceeded)
+                                     or issubclass(exc_type, sqlite3.OperationalError) and self.exceeded == "time")
+
+  def start(self):
+    """Start the time budget, unless it is already running."""
+    if self.started is None:
+      self.started = time.perf_counter()
+
+  def elapsed(self):
+    return 0.0 if self.started is None else time.perf_counter() - self.started
+
+  def ask(self, prompt):
+    """Prompt the user outside the budgets; the clock restarts with the next statement."""
+    sys.stdout = self.stdout
+    try:
+      return input(prompt)
+    finally:
+      sys.stdout = self.stream
+      self.started = None
+
+  def attach(self, ops):
+    """Apply the budgets to ops' open connection and cursor."""
+    self.attached.append((ops, ops.conn, ops.cur))
+    if self.seconds is not None:
+      ops.conn.set_progress_handler(self.out_of_time, self.progress_steps)
+    ops.cur = GuardedCursor(self, ops.cur)
+
+  def out_of_time(self):
+    """Progress handler: a non-zero return makes SQLite interrupt the statement."""
+    if self.elapsed() > self.seconds:
+      self.exceeded = self.exceeded or "time"
+      return 1
+    return 0
+
+  def limit(self, rows):
+    """Yield rows produced in Python rather than fetched through a cursor, within the row and time budgets."""
+    self.start()
+    for row in rows:
+      if self.max_rows is not None and self.rows >= self.max_rows:
+        self.exceeded = self.exceeded or "rows"
+        return
+      if self.seconds is not None and self.elapsed() > self.seconds:
+        self.exceeded = self.exceeded or "time"
+        return
+      self.rows += 1
+      yield row
+
+  def note(self):
+    """The partial-result notice, or an empty string when every budget held."""
+    limits = {"time": str(self.seconds) + "s", "rows": str(self.max_rows) + " rows", "bytes": str(self.max_bytes) + " bytes"}
+    if not self.exceeded:
+      return ""
+    return ("\n-- Partial result: " + self.command + " stopped at its " + self.exceeded + " budget ("
+            + limits[self.exceeded] + ") after fetching " + str(self.rows) + " row(s)")
+
+
+class BudgetedStream:
+  """Wraps standard output (or its binary buffer) to count bytes and stop a guarded command at its budgets."""
+  def __init__(self, guard, stream):
+    self.guard = guard
+    self.stream = stream
+
+  def __getattr__(self, name):
+    return getattr(self.stream, name)
+
+  @property
+  def buffer(self):
+    return BudgetedStream(self.guard, self.stream.buffer)
+
+  def write(self, data):
+    guard = self.guard
+    if guard.exceeded in ("time", "bytes"):
+      return len(data)# Stopped: the rest of the output is dropped
+    if guard.seconds is not None and guard.elapsed() > guard.seconds:
+      guard.exceeded = "time"
+      raise BudgetExceeded("time budget exceeded")
+    size = len(data.encode() if isinstance(data, str) else data)
+    if guard.max_bytes is not None and guard.bytes + size > guard.max_bytes:
+      room = guard.max_bytes - guard.bytes
+      if isinstance(data, str):
+        data = data.encode()[:room].decode(errors="ignore")
+      else:
+        data = data[:room]
+      self.stream.write(data)
+      guard.line_open = bool(data) and data[-1:] not in ("\n", b"\n")
+      guard.bytes = guard.max_bytes
+      guard.exceeded = "bytes"
+      raise BudgetExceeded("output budget exceeded")
+    guard.bytes += size
+    if data:
+      guard.line_open = data[-1:] not in ("\n", b"\n")
+    return self.stream.write(data)
+
+
+class GuardedCursor:
+  """Cursor wrapper that counts the rows returned and stops once the guard's row budget is used up."""
+  def __init__(self, guard, cursor):
+    self.guard = guard
+    self.cursor = cursor
+
+  def __getattr__(self, name):
+    return getattr(self.cursor, name)
+
+  def execute(self, sql, params=()):
+    self.guard.start()
+    self.cursor.execute(sql, params)
+    return self
+
+  def left(self):
+    """Rows that may still be returned."""
+    return sys.maxsize if self.guard.max_rows is None else self.guard.max_rows - self.guard.rows
+
+  def fetchone(self):
+    if self.left() <= 0:
+      if self.cursor.fetchone() is not None:
+        self.guard.exceeded = self.guard.exceeded or "rows"
+      return None
+    row = self.cursor.fetchone()
+    if row is not None:
+      self.guard.rows += 1
+    return row
+
+  def fetchmany(self, size=1):
+    left = self.left()
+    rows = self.cursor.fetchmany(min(size, left + 1))
+    if len(rows) > left:
+      rows = rows[:left]
+      self.guard.exceeded = self.guard.exceeded or "rows"
+    self.guard.rows += len(rows)
+    return rows
+
+  def fetchall(self):
+    if self.guard.max_rows is None:
+      rows = self.cursor.fetchall()
+      self.guard.rows += len(rows)
+      return rows
+    return self.fetchmany(self.left() + 1)
+
+  def __iter__(self):
+    return iter(self.fetchone, None)
+
+
+class ResultCache:
+  """Results of read statements keyed on (statement, parameters), dropped once a table they read is written.
+
+  A long-lived probe connection runs PRAGMA data_version, which changes only when another connection
+  commits, so while it is unchanged every entry is current and a hit is one dictionary lookup. When it
+  moves, the per-table counters in TableWrites (bumped by triggers, for any writer) are read and only
+  entries whose tables' counters moved are treated as stale. Entries are evicted least recently used
+  first once max_entries entries or max_rows cached rows are exceeded.
+  """
+  # Tables whose writes are counted in TableWrites.
+  tracked_tables = ("Destination", "Flights", "Pilot", "FlightPilot")
+  # Tables maintained by triggers, and views, mapped to the tracked tables they are derived from;
+  # FlightStatus is only written by migrations, so it depends on none.
+  derived_tables = {"PilotWorkload": ("Pilot", "FlightPilot", "Flights"), "FlightView": ("Flights", "Destination"),
+                    "FlightStatus": ()}
+  sql_data_version = "PRAGMA data_version"
+  sql_table_writes = "SELECT TableName, Writes FROM TableWrites"
+
+  def __init__(self, db_path, max_entries=256, max_rows=100000, max_result_rows=10000):
+    self.db_path = db_path
+    self.max_entries = max_entries
+    self.max_rows = max_rows
+    self.max_result_rows = max_result_rows# Larger results are streamed and not cached
+    self.lock = threading.Lock()
+    self.probe = sqlite3.connect(db_path, check_same_thread=False)
+    self.entries = {}# Insertion order doubles as recency order: a hit moves its entry to the end
+    self.cached_rows = 0
+    self.data_version = None
+    self.table_writes = {}
+    self.tables = {}
+    self.hits = self.misses = self.invalidations = self.evictions = 0
+
+  def tables_read(self, sql):
+    """The tracked tables a statement reads, or None when it reads something untracked."""
+    if sql not in self.tables:
+      tables = set()
+      for name in re.findall(r"\b(?:FROM|JOIN)\s+(\w+)", sql, re.I):
+        if name in self.derived_tables:
+          tables.update(self.derived_tables[name])
+        elif name in self.tracked_tables:
+          tables.add(name)
+        else:
+          tables = None
+          break
+      self.tables[sql] = None if tables is None else tuple(sorted(tables))
+    return self.tables[sql]
+
+  def current_writes(self):
+    """Return the per-table write counters, re-reading them only if another connection has committed."""
+    version = self.probe.execute(self.sql_data_version).fetchone()[0]
+    if version != self.data_version:
+      try:
+        self.table_writes = dict(self.probe.execute(self.sql_table_writes).fetchall())
+      except sqlite3.OperationalError:
+        self.table_writes = {}# Not migrated yet: nothing can be validated, so nothing is cached
+      self.data_version = version
+    return self.table_writes
+
+  def get(self, sql, params):
+    """Return (found, columns, rows, writes): the cached result if current, else the counters to store a new one under."""
+    key = (sql, tuple(params))
+    tables = self.tables_read(sql)
+    with self.lock:
+      writes = self.current_writes()
+      if tables is None or not writes:
+        return False, None, None, None
+      snapshot = tuple(writes.get(table) for table in tables)
+      entry = self.entries.pop(key, None)
+      if entry is not None:
+        if entry[0] == snapshot:
+          self.entries[key] = entry
+          self.hits += 1
+          return True, entry[1], entry[2], snapshot
+        self.cached_rows -= len(entry[2])
+        self.invalidations += 1
+      self.misses += 1
+      return False, None, None, snapshot
+
+  def put(self, sql, params, snapshot, columns, rows):
+    """Store a result read after snapshot was taken, evicting the least recently used entries to fit."""
+    if snapshot is None or len(rows) > self.max_result_rows:
+      return
+    key = (sql, tuple(params))
+    with self.lock:
+      old = self.entries.pop(key, None)
+      if old is not None:
+        self.cached_rows -= len(old[2])
+      self.entries[key] = (snapshot, columns, rows)
+      self.cached_rows += len(rows)
+      while len(self.entries) > self.max_entries or self.cached_rows > self.max_rows:
+        evicted = self.entries.pop(next(iter(self.entries)))
+        self.cached_rows -= len(evicted[2])
+        self.evictions += 1
+
+  def hit_rate(self):
+    lookups = self.hits + self.misses
+    return self.hits / lookups if lookups else 0.0
+
+  def summary(self):
+    return (str(len(self.entries)) + " entries, " + str(self.cached_rows) + " rows, " + str(self.hits) + " hits, "
+            + str(self.misses) + " misses (" + str(round(100 * self.hit_rate(), 1)) + "% hit rate), "
+            + str(self.invalidations) + " invalidated, " + str(self.evictions) + " evicted")
+
+
+class CachingCursor:
+  """Cursor wrapper that answers SELECTs from a ResultCache; everything else goes to the wrapped cursor."""
+  def __init__(self, cache, conn, cursor):
+    self.cache = cache
+    self.conn = conn
+    self.cursor = cursor
+    self.rows = None
+    self.columns = None
+
+  def __getattr__(self, name):
+    return getattr(self.cursor, name)
+
+  @property
+  def description(self):
+    return self.cursor.description if self.rows is None else self.columns
+
+  @property
+  def rowcount(self):
+    return self.cursor.rowcount if self.rows is None else -1
+
+  def execute(self, sql, params=()):
+    self.rows = None
+    # Inside a transaction this connection may see its own uncommitted writes, which the cache cannot
+    if self.conn.in_transaction or sql.lstrip()[:6].upper() != "SELECT":
+      self.cursor.execute(sql, params)
+      return self
+    found, columns, rows, snapshot = self.cache.get(sql, params)
+    if found:
+      self.columns = columns
+      self.rows = iter(rows)
+      return self
+    self.cursor.execute(sql, params)
+    self.columns = self.cursor.description
+    rows = self.cursor.fetchmany(self.cache.max_result_rows + 1)
+    if len(rows) <= self.cache.max_result_rows:
+      self.cache.put(sql, params, snapshot, self.description, rows)
+      self.rows = iter(rows)
+    else:
+      self.rows = itertools.chain(rows, self.cursor)# Too large to cache; stream the rest
+    return self
+
+  def executemany(self, sql, seq_of_params):
+    self.rows = None
+    self.cursor.executemany(sql, seq_of_params)
+    return self
+
+  def fetchone(self):
+    if self.rows is None:
+      return self.cursor.fetchone()
+    return next(self.rows, None)
+
+  def fetchmany(self, size=1):
+    if self.rows is None:
+      return self.cursor.fetchmany(size)
+    return list(itertools.islice(self.rows, size))
+
+  def fetchall(self):
+    if self.rows is None:
+      return self.cursor.fetchall()
+    return list(self.rows)
+
+  def __iter__(self):
+    return iter(self.fetchone, None)
+
+
+class SingleFlight:
+  """Lets identical concurrent reads share one execution, keyed on (statement, parameters).
+
+  The first caller for a key runs the read; callers asking for the same key while it runs wait for it and
+  get its result, or its exception (CoalescingCursor and read_async run the read again themselves when it
+  is an OperationalError, such as the leader's budget interrupt). Threads (run) and asyncio tasks (run_async) share one in-flight
+  table, since both wait on a concurrent.futures.Future. A thread that has written since its last read
+  always starts a fresh flight, so it sees its own writes; otherwise a shared result can be as old as
+  the start of the read it joined. Waiter counts and wait time are kept per key for up to max_keys keys.
+  """
+  def __init__(self, db_path, max_rows=10000, max_keys=1000):
+    self.db_path = db_path
+    self.max_rows = max_rows# Larger results are not shared; waiters run their own read
+    self.max_keys = max_keys
+    self.lock = threading.Lock()
+    self.flights = {}
+    self.local = threading.local()
+    self.metrics = {}# key -> [executions, shared, peak waiters, wait seconds]
+    self.executions = self.shared = 0
+    self.wait = 0.0
+
+  @staticmethod
+  def key(sql, params):
+    return sql, tuple(params)
+
+  def wrote(self):
+    """Note that this thread has written, so its next read does not join one already running."""
+    self.local.wrote = True
+
+  def join(self, key):
+    """Return (flight, leader): the flight in progress for key, or a new one this caller has to run."""
+    fresh = getattr(self.local, "wrote", False)
+    self.local.wrote = False
+    with self.lock:
+      flight = self.flights.get(key)
+      if flight is not None and not fresh:
+        flight[1] += 1
+        return flight, False
+      flight = [Future(), 0]# The future and how many callers are waiting on it
+      flight[0].set_running_or_notify_cancel()# A waiter giving up must not cancel it for the others
+      self.flights[key] = flight
+      self.executions += 1
+      stats = self.metrics.get(key)
+      if stats is None and len(self.metrics) < self.max_keys:
+        stats = self.metrics[key] = [0, 0, 0, 0.0]
+      if stats is not None:
+        stats[0] += 1
+      return flight, True
+
+  def lead(self, key, flight, function):
+    """Run function for everyone waiting on flight and hand them its outcome."""
+    try:
+      result = function()
+    except BaseException as e:
+      flight[0].set_exception(e)
+      raise
+    else:
+      flight[0].set_result(result)
+      return result
+    finally:
+      with self.lock:
+        if self.flights.get(key) is flight:
+          del self.flights[key]
+        stats = self.metrics.get(key)
+        if stats is not None:
+          stats[2] = max(stats[2], flight[1])
+
+  def waited(self, key, started):
+    seconds = time.perf_counter() - started
+    with self.lock:
+      self.shared += 1
+      self.wait += seconds
+      stats = self.metrics.get(key)
+      if stats is not None:
+        stats[1] += 1
+        stats[3] += seconds
+
+  def run(self, key, function):
+    """Return function(), or the result of the identical call already running on another thread or task."""
+    flight, leader = self.join(key)
+    if leader:
+      return self.lead(key, flight, function)
+    started = time.perf_counter()
+    try:
+      return flight[0].result()
+    finally:
+      self.waited(key, started)
+
+  async def run_async(self, key, function):
+    """Like run for asyncio callers: the read runs in the loop's executor and waiting does not block the loop."""
+    flight, leader = self.join(key)
+    if leader:
+      # Shielded: cancelling this task must not cancel the read before it starts, or its waiters would never wake
+      return await asyncio.shield(asyncio.get_running_loop().run_in_executor(None, self.lead, key, flight, function))
+    started = time.perf_counter()
+    try:
+      return await asyncio.wrap_future(flight[0])
+    finally:
+      self.waited(key, started)
+
+  def top(self, count=5):
+    """Return the count keys that saved the most executions, as (key, executions, shared, peak waiters, wait seconds)."""
+    with self.lock:
+      ranked = sorted(self.metrics.items(), key=lambda item: item[1][1], reverse=True)[:count]
+    return [(key,) + tuple(stats) for key, stats in ranked if stats[1]]
+
+  def summary(self):
+    calls = self.executions + self.shared
+    return (str(self.executions) + " executions, " + str(self.shared) + " shared ("
+            + str(round(100 * self.shared / calls, 1) if calls else 0.0) + "% of reads), "
+            + str(round(self.wait, 2)) + "s waited")
+
+
+class CoalescingCursor:
+  """Cursor wrapper that runs SELECTs through a SingleFlight; everything else goes to the wrapped cursor."""
+  def __init__(self, flights, conn, cursor):
+    self.flights = flights
+    self.conn = conn
+    self.cursor = cursor
+    self.rows = None
+    self.columns = None
+    self.led = False
+
+  def __getattr__(self, name):
+    return getattr(self.cursor, name)
+
+  @property
+  def description(self):
+    return self.cursor.description if self.rows is None else self.columns
+
+  @property
+  def rowcount(self):
+    return self.cursor.rowcount if self.rows is None else -1
+
+  def read(self, sql, params):
+    """Run the read on this cursor for every caller sharing it; returns (columns, rows, complete)."""
+    self.led = True
+    self.cursor.execute(sql, params)
+    rows = self.cursor.fetchmany(self.flights.max_rows + 1)
+    return self.cursor.description, rows, len(rows) <= self.flights.max_rows
+
+  def execute(self, sql, params=()):
+    self.rows = None
+    # Inside a transaction this connection may see its own uncommitted writes, which others must not share
+    select = sql.lstrip()[:6].upper() == "SELECT"
+    if self.conn.in_transaction or not select:
+      self.cursor.execute(sql, params)
+      if not select:
+        self.flights.wrote()
+      return self
+    self.led = False
+    try:
+      columns, rows, complete = self.flights.run(self.flights.key(sql, params), lambda: self.read(sql, params))
+    except sqlite3.OperationalError:
+      if self.led:
+        raise
+      # The shared read was interrupted (by its leader's budget) or met a lock; those are the leader's to report
+      self.cursor.execute(sql, params)
+      return self
+    if complete:
+      self.columns = columns
+      self.rows = iter(rows)
+    elif self.led:
+      self.columns = columns
+      self.rows = itertools.chain(rows, self.cursor)# Too large to share; stream the rest
+    else:
+      self.cursor.execute(sql, params)# The shared read was cut short; run this one in full
+    return self
+
+  def executemany(self, sql, seq_of_params):
+    self.rows = None
+    self.cursor.executemany(sql, seq_of_params)
+    self.flights.wrote()
+    return self
+
+  def fetchone(self):
+    if self.rows is None:
+      return self.cursor.fetchone()
+    return next(self.rows, None)
+
+  def fetchmany(self, size=1):
+    if self.rows is None:
+      return self.cursor.fetchmany(size)
+    return list(itertools.islice(self.rows, size))
+
+  def fetchall(self):
+    if self.rows is None:
+      return self.cursor.fetchall()
+    return list(self.rows)
+
+  def __iter__(self):
+    return iter(self.fetchone, None)
+
+
+class SnapshotTable:
+  """One table of a BinarySnapshot: its columns as zero-copy views of the mapped file."""
+  def __init__(self, snapshot, name, writes, row_count, columns):
+    self.snapshot = snapshot
+    self.name = name
+    self.writes = writes# TableWrites counter when the snapshot was taken, -1 if the table is not counted
+    self.row_count = row_count
+    self.columns = tuple(column[0] for column in columns)
+    self.parts = {column[0]: column[1:] for column in columns}
+
+  def column(self, name):
+    """The column's values without copying: int64 or float64 for numbers, int32 string numbers for text."""
+    return self.parts[name][1]
+
+  def values(self, name):
+    """The column as a list, with NULLs as None and text looked up in the string table."""
+    kind, data, valid = self.parts[name]
+    values = data.tolist()
+    if kind == b"s":
+      strings = self.snapshot.strings()
+      values = [strings[index] if index >= 0 else None for index in values]
+    if valid is not None:
+      values = [value if valid[i >> 3] >> (i & 7) & 1 else None for i, value in enumerate(values)]
+    return values
+
+  def rows(self):
+    """The table's rows as tuples, in rowid order."""
+    return list(zip(*[self.values(name) for name in self.columns]))
+
+
+class BinarySnapshot:
+  """Memory-mapped binary copy of Destination, Flights, Pilot, FlightPilot and FlightStatus for fast cold starts.
+
+  The file starts and ends with the magic bytes. Each column is a fixed-width array aligned to 8
+  bytes: type i holds int64 values, f float64 values and s int32 numbers into one string table shared
+  by all columns (each distinct string is stored once, as UTF-8 bytes with int64 offsets). Columns with
+  NULLs also have a validity bitmap, one bit per row, as ColumnarWriter uses. The directory follows
+  the data: the schema cookie (int64) and table count (uint32); per table its name (uint16 length +
+  UTF-8), TableWrites counter (int64), row and column counts (two uint32), and per column its name,
+  type byte and the offsets of its values and bitmap (two uint64, 0 for no bitmap); then the string
+  table's count (uint32) and the offsets of its offsets and bytes (two uint64). The last 16 bytes are
+  the directory offset (uint64) and the magic bytes.
+
+  PRAGMA data_version only tells one connection whether others have committed, so it cannot say
+  whether a file written by another process still matches. The snapshot therefore records the schema
+  cookie and the per-table TableWrites counters, which every writer bumps, and is current while both
+  are unchanged.
+  """
+  magic = b"ALMSNAP1"
+  tables = ("Destination", "Flights", "Pilot", "FlightPilot", "FlightStatus")
+  sql_schema_version = "PRAGMA schema_version"
+
+  @classmethod
+  def write(cls, db_path, path):
+    """Dump the tables of db_path, as of one read transaction, into a new snapshot at path."""
+    conn = sqlite3.connect(db_path)
+    try:
+      conn.execute("BEGIN")# Counters and rows come from the same state of the database
+      schema_version = conn.execute(cls.sql_schema_version).fetchone()[0]
+      writes = dict(conn.execute(ResultCache.sql_table_writes).fetchall())
+      contents = []
+      for table in cls.tables:
+        cursor = conn.execute("SELECT * FROM " + table + " ORDER BY rowid")
+        contents.append((table, [description[0] for description in cursor.description], cursor.fetchall()))
+      conn.rollback()
+    finally:
+      conn.close()
+    out = io.BytesIO()
+    out.write(cls.magic)
+    def section(data):
+      out.write(b"\0" * (-out.tell() % 8))
+      offset = out.tell()
+      out.write(data)
+      return offset
+    strings = {}
+    directory = [struct.pack("<qI", schema_version, len(contents))]
+    for table, columns, rows in contents:
+      name_bytes = table.encode("utf-8")
+      directory += [struct.pack("<H", len(name_bytes)), name_bytes,
+                    struct.pack("<qII", writes.get(table, -1), len(rows), len(columns))]
+      for index, name in enumerate(columns):
+        values = [row[index] for row in rows]
+        valid_offset = 0
+        if None in values:
+          valid = bytearray((len(values) + 7) // 8)
+          for position, value in enumerate(values):
+            if value is not None:
+              valid[position >> 3] |= 1 << (position & 7)
+          valid_offset = section(bytes(valid))
+        present = [value for value in values if value is not None]
+        if all(type(value) is int for value in present):
+          kind, data = b"i", array("q", [0 if value is None else value for value in values])
+        elif all(type(value) in (int, float) for value in present):
+          kind, data = b"f", array("d", [0.0 if value is None else value for value in values])
+        else:
+          kind, data = b"s", array("i", [-1 if value is None else strings.setdefault(str(value), len(strings))
+                                         for value in values])
+        name_bytes = name.encode("utf-8")
+        directory += [struct.pack("<H", len(name_bytes)), name_bytes, kind,
+                      struct.pack("<QQ", section(data.tobytes()), valid_offset)]
+    encoded = [text.encode("utf-8") for text in strings]
+    offsets = array("q", [0])
+    for item in encoded:
+      offsets.append(offsets[-1] + len(item))
+    directory.append(struct.pack("<IQQ", len(encoded), section(offsets.tobytes()), section(b"".join(encoded))))
+    directory_offset = section(b"".join(directory))
+    out.write(struct.pack("<Q", directory_offset) + cls.magic)
+    # Written aside and renamed, so a process mapping the old file keeps a complete one
+    with open(path + ".tmp", "wb") as file:
+      file.write(out.getbuffer())
+    os.replace(path + ".tmp", path)
+
+  def __init__(self, path):
+    self.path = path
+    with open(path, "rb") as file:
+      self.map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    if len(self.map) < 24 or self.map[:8] != self.magic or self.map[-8:] != self.magic:
+      self.map.close()
+      raise ValueError("Not a snapshot file: " + path)
+    self.view = memoryview(self.map)
+    self.views = [self.view]# Released by close(), which the mapping needs before it can be closed
+    self.position, = struct.unpack_from("<Q", self.map, len(self.map) - 16)
+    self.schema_version, table_count = self.unpack("<qI")
+    self.tables = {}
+    for _ in range(table_count):
+      table = self.unpack_name()
+      writes, row_count, column_count = self.unpack("<qII")
+      columns = []
+      for _ in range(column_count):
+        name = self.unpack_name()
+        kind = self.map[self.position:self.position + 1]
+        self.position += 1
+        data_offset, valid_offset = self.unpack("<QQ")
+        width = 4 if kind == b"s" else 8
+        data = self.slice(data_offset, width * row_count, {b"i": "q", b"f": "d", b"s": "i"}[kind])
+        valid = self.slice(valid_offset, (row_count + 7) // 8) if valid_offset else None
+        columns.append((name, kind, data, valid))
+      self.tables[table] = SnapshotTable(self, table, writes, row_count, columns)
+    string_count, offsets_offset, text_offset = self.unpack("<IQQ")
+    self.string_offsets = self.slice(offsets_offset, 8 * (string_count + 1), "q")
+    self.text = self.slice(text_offset, self.string_offsets[-1])
+    self.decoded = None
+
+  def unpack(self, fmt):
+    values = struct.unpack_from(fmt, self.map, self.position)
+    self.position += struct.calcsize(fmt)
+    return values
+
+  def unpack_name(self):
+    length, = self.unpack("<H")
+    self.position += length
+    return str(self.map[self.position - length:self.position], "utf-8")
+
+  def slice(self, offset, length, fmt="B"):
+    """A zero-copy view of part of the file, holding values of the struct format fmt."""
+    view = self.view[offset:offset + length].cast(fmt)
+    self.views.append(view)
+    return view
+
+  def string(self, index):
+    """One string of the string table."""
+    return str(self.text[self.string_offsets[index]:self.string_offsets[index + 1]], "utf-8")
+
+  def strings(self):
+    """The whole string table, decoded on first use."""
+    if self.decoded is None:
+      offsets = self.string_offsets.tolist()
+      text = bytes(self.text)
+      self.decoded = [text[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(len(offsets) - 1)]
+    return self.decoded
+
+  def is_current(self, conn):
+    """True if the database behind conn is in the state the snapshot was taken from."""
+    if conn.execute(self.sql_schema_version).fetchone()[0] != self.schema_version:
+      return False
+    try:
+      writes = dict(conn.execute(ResultCache.sql_table_writes).fetchall())
+    except sqlite3.OperationalError:
+      return False# Not migrated: writes are not counted, so nothing can be validated
+    return all(writes.get(name) == table.writes for name, table in self.tables.items() if table.writes >= 0)
+
+  def close(self):
+    """Release the views and unmap the file; values taken from column() must not be used afterwards."""
+    for view in reversed(self.views):
+      view.release()
+    self.map.close()
+
+
+class HotTier:
+  """In-memory copy of Destination, FlightView, Pilot and FlightPilot with hash indexes, kept current by write-through.
+
+  Each table is a dict of primary key to row tuple in rowid order, so full scans come back in the order
+  SQLite returns them; indexes maps (table, column) to a dict of value to the set of keys holding it.
+  """
+  # Primary key and secondary hash-indexed columns of each mirrored table.
+  tables = {
+    "Destination": ("AirportCode", ()),
+    "FlightView": ("FlightID", ("FlightNumber", "Status", "OriginAirport", "DestinationAirport")),
+    "Pilot": ("PilotID", ("LicenseNumber",)),
+    "FlightPilot": ("FlightPilotID", ("FlightID", "PilotID")),
+  }
+  # Writes refreshed by key: table, the WHERE clause that selects the rows they can touch, and its parameter.
+  write_keys = {
+    "sql_insert": ("FlightView", "FlightNumber = ? COLLATE NOCASE", 0),
+    "sql_seed": ("FlightView", "FlightNumber = ? COLLATE NOCASE", 0),
+    "sql_update_flight": ("FlightView", "FlightNumber = ? COLLATE NOCASE", 3),
+    "sql_update_flight_status": ("FlightView", "FlightNumber = ? COLLATE NOCASE", 1),
+    "sql_delete_flight": ("FlightView", "FlightNumber = ? COLLATE NOCASE", 0),
+    "sql_insert_des": ("Destination", "AirportCode = ? COLLATE NOCASE", 0),
+    "sql_seed_des": ("Destination", "AirportCode = ? COLLATE NOCASE", 0),
+    "sql_update_destination": ("Destination", "AirportCode = ? COLLATE NOCASE", 2),
+    "sql_delete_destination": ("Destination", "AirportCode = ? COLLATE NOCASE", 0),
+    "sql_insert_pilot": ("Pilot", "LicenseNumber = ? COLLATE NOCASE", 1),
+    "sql_update_pilot": ("Pilot", "LicenseNumber = ? COLLATE NOCASE", 2),
+    "sql_update_pilot_checked": ("Pilot", "LicenseNumber = ? COLLATE NOCASE", 2),
+    "sql_update_flight_checked": ("FlightView", "FlightNumber = ? COLLATE NOCASE", 3),
+    "sql_update_destination_checked": ("Destination", "AirportCode = ? COLLATE NOCASE", 4),
+    "sql_update_destination_position": ("Destination", "AirportCode = ? COLLATE NOCASE", 2),
+    "sql_delete_pilot": ("Pilot", "LicenseNumber = ? COLLATE NOCASE", 0),
+    "sql_insert_pilotflight": ("FlightPilot", "FlightID = ?", 0),
+    "sql_insert_plan": ("FlightPilot", "FlightID = ?", 0),
+    "sql_add_pilot_flights": ("FlightPilot", "FlightID IN (SELECT FlightID FROM Flights WHERE FlightNumber = ? COLLATE NOCASE)", 1),
+    "sql_delete_flightpilot": ("FlightPilot", "FlightID IN (SELECT FlightID FROM Flights WHERE FlightNumber = ? COLLATE NOCASE)", 1),
+  }
+  # Integer columns; text parameters compared with them are converted the way SQLite's column affinity would.
+  integer_columns = {"FlightID", "PilotID", "FlightPilotID", "ExperienceYears"}
+  # The tables that lose rows through ON DELETE CASCADE when a row of the key table goes.
+  cascades = {"FlightView": (("FlightPilot", "FlightID"),), "Pilot": (("FlightPilot", "PilotID"),)}
+  # Flights rows are mirrored as the FlightView rows that the reads see, so writes to Flights refresh those.
+  mirrors = {"Flights": "FlightView"}
+  # Tables that are not mirrored and whose writes change no mirrored row; reads of them go to SQLite.
+  unmirrored = ("FlightSchedule", "FlightOccurrence", "OccurrencePilot")
+
+  def __init__(self, db_path, snapshot_path=None):
+    self.db_path = db_path
+    self.snapshot_path = snapshot_path
+    self.lock = threading.RLock()
+    self.conn = sqlite3.connect(db_path, check_same_thread=False)
+    self.conn.execute(DBOperations.sql_enable_foreign_keys)
+    self.writes = {getattr(DBOperations, name).strip(): spec for name, spec in self.write_keys.items()}
+    self.plans = {}
+    # The reads with their own handlers, whitespace-normalised the way plan() normalises statements
+    self.statements = {name: " ".join(getattr(DBOperations, name).split()).rstrip(";").strip()
+                       for name in ("sql_search_pilot_years_more", "sql_search_pilot_years_less",
+                                    "sql_search_pilot_flights", "sql_view_pilot_flight_all")}
+    self.snapshot_used = False
+    snapshot = self.open_snapshot()
+    if snapshot is not None:
+      try:
+        self.load(snapshot=snapshot)
+        self.snapshot_used = True
+      finally:
+        snapshot.close()
+    else:
+      self.load()
+      self.save_snapshot()
+
+  def open_snapshot(self):
+    """The BinarySnapshot at snapshot_path if it matches the database, else None."""
+    if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+      return None
+    try:
+      snapshot = BinarySnapshot(self.snapshot_path)
+    except (OSError, ValueError, struct.error) as e:
+      print("Ignoring snapshot " + self.snapshot_path + ": " + str(e))
+      return None
+    if not snapshot.is_current(self.conn) or not set(BinarySnapshot.tables) <= set(snapshot.tables):
+      snapshot.close()
+      return None
+    return snapshot
+
+  def save_snapshot(self):
+    """Rewrite the snapshot file unless it still matches the database, so the next process starts from it."""
+    if not self.snapshot_path:
+      return
+    snapshot = self.open_snapshot()
+    if snapshot is not None:
+      snapshot.close()
+      return
+    with self.lock:
+      BinarySnapshot.write(self.db_path, self.snapshot_path)
+
+  def read_table(self, table):
+    """Return (columns, {key: row}) read from the database in rowid order."""
+    cursor = self.conn.execute("SELECT * FROM " + table)
+    columns = tuple(description[0] for description in cursor.description)
+    key = columns.index(self.tables[table][0])
+    return columns, {row[key]: row for row in cursor}
+
+  def snapshot_table(self, snapshot, table):
+    """Return (columns, {key: row}) for table from a BinarySnapshot, building FlightView rows as the view does."""
+    if table == "FlightView":
+      flights, destinations = snapshot.tables["Flights"], snapshot.tables["Destination"]
+      statuses = dict(snapshot.tables["FlightStatus"].rows())
+      airports = dict(zip(destinations.values("DestinationID"), destinations.values("AirportCode")))
+      columns = ("FlightID", "FlightNumber", "Status", "OriginAirport", "DestinationAirport", "RowVersion")
+      rows = zip(flights.values("FlightID"), flights.values("FlightNumber"),
+                 [statuses.get(code) for code in flights.values("StatusCode")],
+                 [airports.get(airport) for airport in flights.values("OriginAirportID")],
+                 [airports.get(airport) for airport in flights.values("DestinationAirportID")],
+                 flights.values("RowVersion"))
+    else:
+      columns, rows = snapshot.tables[table].columns, snapshot.tables[table].rows()
+    key = columns.index(self.tables[table][0])
+    return columns, {row[key]: row for row in rows}
+
+  def load(self, only=None, snapshot=None):
+    """(Re)load every table, or just the tables named in only, and rebuild their indexes.
+
+    With a current BinarySnapshot the rows come from the mapped file instead of the database.
+    """
+    with self.lock:
+      if only is None:
+        self.columns, self.rows, self.indexes = {}, {}, {}
+      for table in only or self.tables:
+        if snapshot is None:
+          self.columns[table], self.rows[table] = self.read_table(table)
+        else:
+          self.columns[table], self.rows[table] = self.snapshot_table(snapshot, table)
+        # Built a column at a time rather than through index_row, which looks the columns up per row
+        for column in self.tables[table][1]:
+          position = self.columns[table].index(column)
+          index = self.indexes[table, column] = {}
+          for key, row in self.rows[table].items():
+            index.setdefault(row[position], set()).add(key)
+
+  def index_row(self, table, key, row, remove=False):
+    """Add row to (or drop it from) its table's hash indexes."""
+    for column in self.tables[table][1]:
+      value = row[self.columns[table].index(column)]
+      keys = self.indexes[table, column].setdefault(value, set())
+      if remove:
+        keys.discard(key)
+        if not keys:
+          del self.indexes[table, column][value]
+      else:
+        keys.add(key)
+
+  def put(self, table, row):
+    """Insert or replace one row in memory."""
+    key = row[self.columns[table].index(self.tables[table][0])]
+    old = self.rows[table].get(key)
+    if old is not None:
+      self.index_row(table, key, old, remove=True)
+    self.rows[table][key] = row
+    self.index_row(table, key, row)
+
+  def drop(self, table, key):
+    """Remove one row from memory, following the schema's ON DELETE CASCADE."""
+    row = self.rows[table].pop(key, None)
+    if row is None:
+      return
+    self.index_row(table, key, row, remove=True)
+    for child, column in self.cascades.get(table, ()):
+      for child_key in list(self.indexes[child, column].get(key, ())):
+        self.drop(child, child_key)
+
+  def keys_where(self, table, where, value):
+    """Primary keys of the database rows of table matching where."""
+    sql = "SELECT " + self.tables[table][0] + " FROM " + table + " WHERE " + where
+    return [row[0] for row in self.conn.execute(sql, (value,))]
+
+  def refresh(self, table, keys):
+    """Copy the rows with the given keys from the database into memory, dropping those that are gone."""
+    key_column = self.tables[table][0]
+    keys = list(keys)
+    found = set()
+    for start in range(0, len(keys), 500):
+      chunk = keys[start:start + 500]
+      sql = "SELECT * FROM " + table + " WHERE " + key_column + " IN (" + ",".join("?" * len(chunk)) + ")"
+      for row in self.conn.execute(sql, chunk):
+        self.put(table, row)
+        found.add(row[self.columns[table].index(key_column)])
+    for key in keys:
+      if key not in found:
+        self.drop(table, key)
+
+  def write(self, cursor, sql, params):
+    """Run a write on the database connection and bring memory up to date with the rows it touched."""
+    spec = self.writes.get(sql.strip())
+    if spec is None:
+      cursor.execute(sql, params)
+      self.load(self.tables_written(sql))
+      return
+    table, where, position = spec
+    before = self.keys_where(table, where, params[position])
+    cursor.execute(sql, params)
+    self.refresh(table, set(before) | set(self.keys_where(table, where, params[position])))
+
+  def tables_written(self, sql):
+    """The mirrored tables a write statement names, or all of them when that is unclear."""
+    match = re.match(r"\s*(?:INSERT(?:\s+OR\s+\w+)?\s+INTO|UPDATE|DELETE\s+FROM|REPLACE\s+INTO)\s+(\w+)", sql, re.I)
+    table = match and self.mirrors.get(match.group(1), match.group(1))
+    if table in self.tables:
+      touched = [table]
+      if sql.lstrip()[:6].upper() == "DELETE":
+        touched += [child for child, column in self.cascades.get(table, ())]
+      return touched
+    if table in self.unmirrored:
+      return []
+    return list(self.tables)
+
+  def select(self, table, column=None, value=None):
+    """Rows of table, all of them or those whose column equals value, in rowid order."""
+    if column is None:
+      return list(self.rows[table].values())
+    if (table, column) in self.indexes:
+      keys = self.indexes[table, column].get(value, ())
+      return [self.rows[table][key] for key in sorted(keys)]
+    position = self.columns[table].index(column)
+    if column == self.tables[table][0]:
+      row = self.rows[table].get(value)
+      return [] if row is None else [row]
+    return [row for row in self.rows[table].values() if row[position] == value]
+
+  def pilot_flights(self, license_number):
+    """Rows of sql_search_pilot_flights: each pilot's flights, or one empty row for a pilot without any."""
+    flight_columns = self.columns["FlightView"]
+    picks = [flight_columns.index(column) for column in ("FlightNumber", "Status", "OriginAirport", "DestinationAirport")]
+    flight_id = self.columns["FlightPilot"].index("FlightID")
+    results = []
+    for pilot in self.select("Pilot", "LicenseNumber", license_number):
+      assignments = self.select("FlightPilot", "PilotID", pilot[0])
+      if not assignments:
+        results.append((None, None, None, None))
+      for assignment in assignments:
+        flight = self.rows["FlightView"].get(assignment[flight_id])
+        results.append(tuple(None if flight is None else flight[pick] for pick in picks))
+    return results
+
+  def pilot_flight_all(self):
+    """Rows of sql_view_pilot_flight_all."""
+    flight_id = self.columns["FlightPilot"].index("FlightID")
+    pilot_id = self.columns["FlightPilot"].index("PilotID")
+    results = []
+    for assignment in self.rows["FlightPilot"].values():
+      pilot = self.rows["Pilot"].get(assignment[pilot_id])
+      flight = self.rows["FlightView"].get(assignment[flight_id])
+      if pilot is not None and flight is not None:
+        results.append((assignment[0],) + pilot[:4] + flight[:5])
+    return results
+
+  def plan(self, sql):
+    """Parse a read statement once into how query() answers it; None means it is not mirrored."""
+    if sql in self.plans:
+      return self.plans[sql]
+    text = " ".join(sql.split()).rstrip(";").strip()
+    plan = None
+    for name, statement in self.statements.items():
+      if text == statement:
+        plan = (name,)
+    # Single-table reads: all rows, or those where one column equals the parameter
+    match = re.fullmatch(r"(?i:select) (\*|\w+(?:\s*,\s*\w+)*) (?i:from) (\w+)"
+                         r"(?: (?i:where) (\w+)\s*=\s*\?( (?i:collate nocase))?)?", text)
+    if plan is None and match and match.group(2) in self.tables:
+      table, column = match.group(2), match.group(3)
+      columns = self.columns[table] if match.group(1) == "*" else tuple(c.strip() for c in match.group(1).split(","))
+      if set(columns) <= set(self.columns[table]) and (column is None or column in self.columns[table]):
+        plan = ("select", table, columns, column, bool(match.group(4)))
+    self.plans[sql] = plan
+    return plan
+
+  def query(self, sql, params):
+    """Answer a read statement from memory as (columns, rows), or return None if it is not mirrored."""
+    plan = self.plan(sql)
+    if plan is None:
+      return None
+    value = params[0] if params else None
+    with self.lock:
+      if plan[0] in ("sql_search_pilot_years_more", "sql_search_pilot_years_less"):
+        position = self.columns["Pilot"].index("ExperienceYears")
+        more = plan[0] == "sql_search_pilot_years_more"
+        if isinstance(value, str):
+          try:
+            value = float(value)# ExperienceYears has INTEGER affinity, so numeric text compares as a number
+          except ValueError:
+            value = math.inf# Any other text sorts after every number
+        rows = [row for row in self.rows["Pilot"].values() if row[position] is not None and (row[position] >= value) == more]
+        rows.sort(key=lambda row: (row[position], row[0]))# idx_pilot_experience order
+        return self.project("Pilot", ("PilotID", "PilotName", "LicenseNumber", "ExperienceYears"), rows)
+      if plan[0] == "sql_search_pilot_flights":
+        return ("FlightNumber", "Status", "OriginAirport", "DestinationAirport"), self.pilot_flights(value)
+      if plan[0] == "sql_view_pilot_flight_all":
+        columns = ("FlightPilotID",) + self.columns["Pilot"][:4] + self.columns["FlightView"][:5]
+        return columns, self.pilot_flight_all()
+      kind, table, columns, column, nocase = plan
+      if column is None:
+        return self.project(table, columns, self.select(table))
+      if column in self.integer_columns and isinstance(value, str) and value.strip().lstrip("-").isdigit():
+        value = int(value)
+      rows = self.select(table, column, value)
+      if nocase and isinstance(value, str) and not rows:
+        position = self.columns[table].index(column)
+        rows = [row for row in self.rows[table].values() if isinstance(row[position], str) and row[position].lower() == value.lower()]
+      return self.project(table, columns, rows)
+
+  def project(self, table, columns, rows):
+    """Return (columns, rows) cut down to the given columns of table."""
+    if columns == self.columns[table]:
+      return columns, rows
+    positions = [self.columns[table].index(column) for column in columns]
+    return columns, [tuple(row[position] for position in positions) for row in rows]
+
+  def verify(self):
+    """Compare memory with the database; return a list of the differences found."""
+    problems = []
+    with self.lock:
+      for table in self.tables:
+        columns, rows = self.read_table(table)
+        if columns != self.columns[table]:
+          problems.append(table + ": columns differ")
+          continue
+        for key in rows.keys() - self.rows[table].keys():
+          problems.append(table + " " + str(key) + ": missing from memory")
+        for key in self.rows[table].keys() - rows.keys():
+          problems.append(table + " " + str(key) + ": deleted in the database")
+        for key in rows.keys() & self.rows[table].keys():
+          if rows[key] != self.rows[table][key]:
+            problems.append(table + " " + str(key) + ": " + repr(self.rows[table][key]) + " != " + repr(rows[key]))
+        for column in self.tables[table][1]:
+          position = columns.index(column)
+          expected = {}
+          for key, row in rows.items():
+            expected.setdefault(row[position], set()).add(key)
+          if expected != self.indexes[table, column]:
+            problems.append(table + "." + column + ": index out of date")
+    return problems
+
+
+class HotTierCursor:
+  """Cursor that serves mirrored reads from a HotTier and writes through to its database connection."""
+  def __init__(self, hot_tier):
+    self.hot_tier = hot_tier
+    self.cursor = hot_tier.conn.cursor()
+    self.rows = None
+    self.description = None
+    self.rowcount = -1
+
+  def execute(self, sql, params=()):
+    with self.hot_tier.lock:
+      answer = self.hot_tier.query(sql, params) if sql.lstrip()[:6].upper() == "SELECT" else None
+      if answer is not None:
+        columns, rows = answer
+        self.description = tuple((column, None, None, None, None, None, None) for column in columns)
+        self.rows = iter(rows)
+        self.rowcount = -1
+        return self
+      self.rows = None
+      if sql.lstrip()[:6].upper() in ("SELECT", "PRAGMA", "WITH"):
+        self.cursor.execute(sql, params)# Not mirrored, e.g. PilotWorkload; read it from the database
+      else:
+        self.hot_tier.write(self.cursor, sql, params)
+        self.hot_tier.dirty = True
+      self.description = self.cursor.description
+      self.rowcount = self.cursor.rowcount
+      return self
+
+  def executemany(self, sql, seq_of_params):
+    with self.hot_tier.lock:
+      self.rows = None
+      self.cursor.executemany(sql, seq_of_params)
+      self.hot_tier.load(self.hot_tier.tables_written(sql))
+      self.hot_tier.dirty = True
+      self.description = self.cursor.description
+      self.rowcount = self.cursor.rowcount
+      return self
+
+  def fetchone(self):
+    if self.rows is None:
+      return self.cursor.fetchone()
+    return next(self.rows, None)
+
+  def fetchmany(self, size=1):
+    if self.rows is None:
+      return self.cursor.fetchmany(size)
+    return [row for row, _ in zip(self.rows, range(size))]
+
+  def fetchall(self):
+    if self.rows is None:
+      return self.cursor.fetchall()
+    return list(self.rows)
+
+  def __iter__(self):
+    return iter(self.fetchone, None)
+
+
+class HotTierConnection:
+  """Stands in for the sqlite3 connection of HotTierOperations; close() keeps the shared connection open."""
+  def __init__(self, hot_tier):
+    self.hot_tier = hot_tier
+
+  def cursor(self):
+    return HotTierCursor(self.hot_tier)
+
+  def commit(self):
+    with self.hot_tier.lock:
+      self.hot_tier.conn.commit()
+      self.hot_tier.dirty = False
+
+  def set_progress_handler(self, handler, n):
+    self.hot_tier.conn.set_progress_handler(handler, n)
+
+  def rollback(self):
+    """Roll back and reload, since memory already holds the abandoned changes."""
+    with self.hot_tier.lock:
+      self.hot_tier.conn.rollback()
+      if self.hot_tier.dirty:
+        self.hot_tier.load()
+        self.hot_tier.dirty = False
+
+  def close(self):
+    pass
+
+
+class HotTierOperations(DBOperations):
+  """DBOperations that serves views and searches from a HotTier loaded once, writing through to SQLite."""
+  def __init__(self, db_path=None, snapshot_path=None):
+    started = time.perf_counter()
+    self.hot_tier = HotTier(db_path or self.db_path, snapshot_path)
+    self.hot_tier.dirty = False
+    total = sum(len(rows) for rows in self.hot_tier.rows.values())
+    print("Hot tier loaded " + str(total) + " rows in " + str(round(time.perf_counter() - started, 3)) + "s"
+          + (" from " + snapshot_path if self.hot_tier.snapshot_used else ""))
+
+  def get_connection(self):
+    """Use the hot tier instead of opening a connection."""
+    self.conn = HotTierConnection(self.hot_tier)
+    self.cur = self.conn.cursor()
+    if self.guard is not None:
+      self.guard.attach(self)
+
+  def check_hot_tier(self):
+    """Print whether memory still matches the database."""
+    problems = self.hot_tier.verify()
+    for problem in problems[:20]:
+      print(problem)
+    if problems:
+      print(str(len(problems)) + " difference(s) between the hot tier and the database")
+    else:
+      print("Hot tier matches the database")
+    return not problems
+
+
+class ShardOperations(DBOperations):
+  """DBOperations bound to one shard file, with the shared reference database attached as ref.
+
+  New destinations go to the reference database and are copied to this shard's replica at once and to
+  the other shards when the command ends; renaming or deleting a shared destination is refused here.
+  """
+  sql_attach_reference = "ATTACH DATABASE ? AS ref"
+  sql_insert_des = "INSERT INTO ref.Destination (AirportCode, DestinationName, Country) values (?,?,?)"
+  shared_destination_message = "Destinations are shared by every shard and can only be added here"
+
+  def __init__(self, db_path, reference_path, router=None):
+    self.db_path = db_path
+    self.reference_path = reference_path
+    self.router = router
+
+  def get_connection(self):
+    """Open the shard and attach the reference database."""
+    DBOperations.get_connection(self)
+    self.cur.execute(self.sql_attach_reference, (self.reference_path,))
+    self.conn.create_function("airline_prefix", 1, ShardRouter.airline_prefix, deterministic=True)
+
+  def insert_Destination(self):
+    """Add a destination to the reference database through the router, which copies it to every shard."""
+    try:
+      des = DestinationInfo()
+      des.set_airport_code(input("Please Enter Airport Code: ").strip().upper())
+      des.set_destination_name(input("Please Enter Destination Name:"))
+      des.set_country(input("Please Enter Country of Destination: "))
+      self.router.insert_destination(*str(des).split("\n"))
+      print("Inserted destination data successfully")
+    except sqlite3.IntegrityError as e:
+      print(self.constraint_message(e))# Duplicate Airport Code
+    except Exception as e:
+      print(e)
+
+  def update_destination(self):
+    """Refused: the next sync would put the reference database's values back."""
+    print(self.shared_destination_message)
+
+  def delete_destination(self):
+    """Refused: the next sync would restore the destination from the reference database."""
+    print(self.shared_destination_message)
+
+  def run_batch_command(self, words):
+    """Run a batch command; add-destination writes the reference database and refreshes this shard's replica."""
+    if words[0] in ("update-destination", "delete-destination"):
+      return False, self.shared_destination_message
+    ok, message = DBOperations.run_batch_command(self, words)
+    if ok and words[0] == "add-destination":
+      self.cur.execute(ShardRouter.sql_sync_destinations)
+    return ok, message
+
+  def run_batch(self, lines, commit_every=500):
+    """Run a batch script on this shard, then copy any destinations it added to the other shards."""
+    ok = DBOperations.run_batch(self, lines, commit_every)
+    self.router.sync_reference()
+    return ok
+
+
+class ShardRouter:
+  """Routes each airline (the letters that start a FlightNumber) or tenant to its own database file.
+
+  Destinations live once in the reference database, which every shard connection attaches; each shard
+  keeps a replica of the Destination table so its foreign keys still hold, refreshed by
+  sync_reference. The prefix-to-shard map is stored in the reference database so every process routes
+  alike, and is re-read whenever PRAGMA data_version shows another connection has committed to it;
+  prefixes without an entry are spread over the shards by a stable hash.
+  """
+  sql_create_shard_map = "CREATE TABLE IF NOT EXISTS ShardMap (Prefix VARCHAR(10) PRIMARY KEY, Shard VARCHAR(30) NOT NULL)"
+  sql_get_shard_map = "SELECT Prefix, Shard FROM ShardMap"
+  sql_get_shard = "SELECT Shard FROM ref.ShardMap WHERE Prefix = ?"
+  # Written through the attached reference database, inside the transaction that moves the rows.
+  sql_set_shard_map = "INSERT OR REPLACE INTO ref.ShardMap (Prefix, Shard) values (?,?)"
+  sql_data_version = "PRAGMA data_version"
+  # Refreshes a shard's Destination replica from the attached reference database.
+  # An upsert rather than INSERT OR REPLACE, so each replica airport keeps the DestinationID its flights refer to.
+  sql_sync_destinations = """
+    INSERT INTO main.Destination (AirportCode, DestinationName, Country)
+    SELECT AirportCode, DestinationName, Country FROM ref.Destination WHERE true
+    ON CONFLICT (AirportCode) DO UPDATE SET DestinationName = excluded.DestinationName, Country = excluded.Country
+    """
+  sql_prune_destinations = """
+    DELETE FROM main.Destination WHERE AirportCode NOT IN (SELECT AirportCode FROM ref.Destination)
+      AND DestinationID NOT IN (SELECT OriginAirportID FROM Flights WHERE OriginAirportID IS NOT NULL
+                                UNION SELECT DestinationAirportID FROM Flights WHERE DestinationAirportID IS NOT NULL)
+    """
+  # Statements that move one airline's flights, their pilots and assignments into the attached shard dest.
+  sql_move_pilots = """
+    INSERT OR IGNORE INTO dest.Pilot (PilotName, LicenseNumber, ExperienceYears)
+    SELECT PilotName, LicenseNumber, ExperienceYears
+    FROM Pilot WHERE PilotID IN (
+      SELECT PilotID FROM FlightPilot JOIN Flights ON Flights.FlightID = FlightPilot.FlightID
+      WHERE airline_prefix(Flights.FlightNumber) = ?1
+      UNION SELECT PilotID FROM OccurrencePilot JOIN Flights ON Flights.FlightID = OccurrencePilot.FlightID
+      WHERE airline_prefix(Flights.FlightNumber) = ?1)
+    """
+  # Airport ids differ between replicas, so airports are matched on their codes in the target shard.
+  sql_move_flights = """
+    INSERT INTO dest.Flights (FlightNumber, StatusCode, OriginAirportID, DestinationAirportID)
+    SELECT Flights.FlightNumber, Flights.StatusCode,
+           (SELECT DestinationID FROM dest.Destination WHERE AirportCode = FlightView.OriginAirport),
+           (SELECT DestinationID FROM dest.Destination WHERE AirportCode = FlightView.DestinationAirport)
+    FROM Flights JOIN FlightView ON FlightView.FlightID = Flights.FlightID
+    WHERE airline_prefix(Flights.FlightNumber) = ?
+    """
+  sql_move_assignments = """
+    INSERT OR IGNORE INTO dest.FlightPilot (FlightID, PilotID)
+    SELECT target_flight.FlightID, target_pilot.PilotID
+    FROM FlightPilot
+    JOIN Flights ON Flights.FlightID = FlightPilot.FlightID
+    JOIN Pilot ON Pilot.PilotID = FlightPilot.PilotID
+    JOIN dest.Flights AS target_flight ON target_flight.FlightNumber = Flights.FlightNumber
+    JOIN dest.Pilot AS target_pilot ON target_pilot.LicenseNumber = Pilot.LicenseNumber
+    WHERE airline_prefix(Flights.FlightNumber) = ?
+    """
+  # Schedules and the per-day state follow their flights; deleting the flights cascades them away at the source.
+  sql_move_schedules = """
+    INSERT INTO dest.FlightSchedule (FlightID, DaysOfWeek, ValidFrom, ValidTo)
+    SELECT target_flight.FlightID, DaysOfWeek, ValidFrom, ValidTo
+    FROM FlightSchedule
+    JOIN Flights ON Flights.FlightID = FlightSchedule.FlightID
+    JOIN dest.Flights AS target_flight ON target_flight.FlightNumber = Flights.FlightNumber
+    WHERE airline_prefix(Flights.FlightNumber) = ?
+    """
+  sql_move_occurrences = """
+    INSERT OR REPLACE INTO dest.FlightOccurrence (FlightID, FlightDate, StatusCode)
+    SELECT target_flight.FlightID, FlightDate, FlightOccurrence.StatusCode
+    FROM FlightOccurrence
+    JOIN Flights ON Flights.FlightID = FlightOccurrence.FlightID
+    JOIN dest.Flights AS target_flight ON target_flight.FlightNumber = Flights.FlightNumber
+    WHERE airline_prefix(Flights.FlightNumber) = ?
+    """
+  sql_move_occurrence_pilots = """
+    INSERT OR IGNORE INTO dest.OccurrencePilot (FlightID, FlightDate, PilotID)
+    SELECT target_flight.FlightID, FlightDate, target_pilot.PilotID
+    FROM OccurrencePilot
+    JOIN Flights ON Flights.FlightID = OccurrencePilot.FlightID
+    JOIN Pilot ON Pilot.PilotID = OccurrencePilot.PilotID
+    JOIN dest.Flights AS target_flight ON target_flight.FlightNumber = Flights.FlightNumber
+    JOIN dest.Pilot AS target_pilot ON target_pilot.LicenseNumber = Pilot.LicenseNumber
+    WHERE airline_prefix(Flights.FlightNumber) = ?
+    """
+  sql_delete_airline = "DELETE FROM Flights WHERE airline_prefix(FlightNumber) = ?"
+
+  def __init__(self, shard_paths, reference_path="AirlineReference.db"):
+    """shard_paths maps shard names to database files."""
+    self.shard_paths = dict(shard_paths)
+    if not self.shard_paths:
+      raise ValueError("At least one shard is needed")
+    self.shard_names = sorted(self.shard_paths)
+    self.reference_path = reference_path
+    conn = sqlite3.connect(reference_path)
+    try:
+      conn.execute(DBOperations.sql_create_destination)
+      conn.execute(self.sql_create_shard_map)
+      conn.commit()
+    finally:
+      conn.close()
+    self.lock = threading.Lock()
+    self.probe = sqlite3.connect(reference_path, check_same_thread=False)
+    self.data_version = None
+    self.prefixes = {}
+
+  def shard_map(self):
+    """Return the prefix-to-shard map, re-reading it only if another connection has committed to the reference database."""
+    with self.lock:
+      version = self.probe.execute(self.sql_data_version).fetchone()[0]
+      if version != self.data_version:
+        self.prefixes = dict(self.probe.execute(self.sql_get_shard_map).fetchall())
+        self.data_version = version
+      return self.prefixes
+
+  @staticmethod
+  def airline_prefix(flight_number):
+    """Return the airline part of a FlightNumber, e.g. 'BA' for 'BA001'."""
+    match = re.match(r"[A-Za-z]*", flight_number or "")
+    return match.group(0).upper()
+
+  def shard_name(self, key):
+    """Return the shard for an airline prefix or tenant name."""
+    if key in self.shard_paths:
+      return key# Tenants may name their shard directly
+    return self.shard_map().get(key) or self.hashed_shard(key)
+
+  def hashed_shard(self, key):
+    """Return the shard a key without a ShardMap entry belongs to."""
+    return self.shard_names[zlib.crc32(key.encode("utf-8")) % len(self.shard_names)]
+
+  def shard(self, name):
+    """Return DBOperations for the named shard."""
+    return ShardOperations(self.shard_paths[name], self.reference_path, self)
+
+  def for_flight(self, flight_number):
+    """Return DBOperations for the shard that owns a FlightNumber."""
+    return self.shard(self.shard_name(self.airline_prefix(flight_number)))
+
+  def for_tenant(self, tenant):
+    """Return DBOperations for a tenant's shard."""
+    return self.shard(self.shard_name(tenant))
+
+  def create_tables(self):
+    """Create the schema in every shard and copy the reference destinations into it."""
+    for name in self.shard_names:
+      self.shard(name).create_table()
+    self.sync_reference()
+
+  def insert_destination(self, airport_code, name, country):
+    """Add a destination to the reference database, then copy it to every shard's replica."""
+    conn = sqlite3.connect(self.reference_path)
+    try:
+      conn.execute(DBOperations.sql_insert_des, (airport_code, name, country))
+      conn.commit()
+    finally:
+      conn.close()
+    self.sync_reference()
+
+  def sync_reference(self):
+    """Refresh every shard's Destination replica from the reference database."""
+    for name in self.shard_names:
+      ops = self.shard(name)
+      try:
+        ops.get_connection()
+        ops.cur.execute(self.sql_sync_destinations)
+        ops.cur.execute(self.sql_prune_destinations)
+        ops.conn.commit()
+      finally:
+        ops.conn.close()
+
+  def run_on_shard(self, name, sql, params):
+    """Run a read query on one shard and return its rows."""
+    ops = self.shard(name)
+    try:
+      ops.get_connection()
+      ops.cur.execute(sql, params)
+      return ops.cur.fetchall()
+    finally:
+      ops.conn.close()
+
+  def fan_out(self, sql, params=(), sort_key=None):
+    """Run a read query on every shard in parallel and return (shard, row) pairs.
+
+    Each shard's rows keep their own order; with sort_key (a function of a row) the per-shard results,
+    which must already be sorted by that key, are merged into one ordered list.
+    """
+    with ThreadPoolExecutor(max_workers=len(self.shard_names)) as pool:
+      results = list(pool.map(lambda name: self.run_on_shard(name, sql, params), self.shard_names))
+    tagged = [[(name, row) for row in rows] for name, rows in zip(self.shard_names, results)]
+    if sort_key is None:
+      return [pair for rows in tagged for pair in rows]
+    return list(heapq.merge(*tagged, key=lambda pair: sort_key(pair[1])))
+
+  def view_flights(self):
+    """Return every flight across all shards, ordered by FlightNumber."""
+    return self.fan_out(DBOperations.sql_search_flight_all + " ORDER BY FlightNumber", sort_key=lambda row: row[1])
+
+  def view_pilot_flights(self):
+    """Return the pilot-flight join from every shard."""
+    return self.fan_out(DBOperations.sql_view_pilot_flight_all)
+
+  def airline_counts(self):
+    """Return {shard: {prefix: flight count}}, the input for deciding what to rebalance."""
+    rows = self.fan_out("SELECT airline_prefix(FlightNumber), COUNT(*) FROM Flights GROUP BY 1")
+    counts = {name: {} for name in self.shard_names}
+    for name, (prefix, count) in rows:
+      counts[name][prefix] = count
+    return counts
+
+  def rebalance(self, prefix, target):
+    """Move one airline's flights, their pilots, assignments and schedules to the target shard and record the move.
+
+    The rows and the ShardMap entry are written in one transaction across the source shard, the target
+    shard and the reference database, so the map never points away from where the flights are.
+    """
+    source = self.shard_name(prefix)
+    if source == target:
+      return 0
+    ops = self.shard(source)
+    try:
+      ops.get_connection()
+      ops.conn.isolation_level = None
+      ops.cur.execute("ATTACH DATABASE ? AS dest", (self.shard_paths[target],))
+      ops.cur.execute("BEGIN IMMEDIATE")# One transaction across both shard files and the reference database
+      try:
+        entry = ops.cur.execute(self.sql_get_shard, (prefix,)).fetchone()
+        if (entry[0] if entry else self.hashed_shard(prefix)) != source:
+          raise ValueError("Airline " + prefix + " was moved by another process; please retry")
+        ops.cur.execute(self.sql_move_pilots, (prefix,))
+        ops.cur.execute(self.sql_move_flights, (prefix,))
+        moved = ops.cur.rowcount
+        ops.cur.execute(self.sql_move_assignments, (prefix,))
+        ops.cur.execute(self.sql_move_schedules, (prefix,))
+        ops.cur.execute(self.sql_move_occurrences, (prefix,))
+        ops.cur.execute(self.sql_move_occurrence_pilots, (prefix,))
+        ops.cur.execute(self.sql_delete_airline, (prefix,))
+        ops.cur.execute(self.sql_set_shard_map, (prefix, target))
+        ops.cur.execute("COMMIT")
+      except Exception:
+        ops.cur.execute("ROLLBACK")
+        raise
+    finally:
+      ops.conn.close()
+    return moved
+
+
+class WriteQueue:
+  """Bounded queue of writes applied by a single writer thread, many writes per transaction.
+
+  submit returns a Future. With ack_on_commit it resolves to the statement's row count (or raises its
+  error) once the transaction holding it has committed; otherwise it resolves to -1 as soon as the write
+  is queued and failures are only printed. When max_pending writes are waiting, submit blocks, which
+  slows producers down to the writer's pace.
+  """
+  def __init__(self, db_path=None, max_pending=10000, max_batch=1000, ack_on_commit=True):
+    self.db_path = db_path or DBOperations.db_path
+    self.queue = queue.Queue(max_pending)
+    self.max_batch = max_batch
+    self.ack_on_commit = ack_on_commit
+    self.closed = False
+    self.transactions = 0
+    self.writes = 0
+    self.failures = 0
+    self.thread = threading.Thread(target=self.run, name="write-queue", daemon=True)
+    self.thread.start()
+
+  def submit(self, sql, params=(), timeout=None):
+    """Queue one write; raises queue.Full if no slot frees up within timeout seconds."""
+    if self.closed:
+      raise RuntimeError("Write queue is closed")
+    future = Future()
+    self.queue.put((sql, params, future), timeout=timeout)
+    if not self.ack_on_commit:
+      future.set_result(-1)
+    return future
+
+  def run(self):
+    """Writer thread: take whatever is queued, up to max_batch writes, and apply it as one transaction."""
+    ops = DBOperations()
+    ops.db_path = self.db_path
+    ops.get_connection()
+    try:
+      stopping = False
+      while not stopping:
+        batch = [self.queue.get()]
+        while len(batch) < self.max_batch:
+          try:
+            batch.append(self.queue.get_nowait())
+          except queue.Empty:
+            break
+        if None in batch:
+          stopping = True# close() was called; apply what came before it and stop
+          batch = batch[:batch.index(None)]
+        self.apply(ops, batch)
+        for _ in range(len(batch) + stopping):
+          self.queue.task_done()
+    finally:
+      ops.conn.close()
+
+  def apply(self, ops, batch):
+    """Run a batch in one transaction; a failing write only undoes its own statement."""
+    results = []
+    for sql, params, future in batch:
+      try:
+        ops.cur.execute(sql, params)
+        results.append((future, ops.cur.rowcount, None))
+      except sqlite3.Error as e:
+        results.append((future, None, e))
+    try:
+      ops.conn.commit()# Group commit
+      self.transactions += 1
+    except sqlite3.Error as e:
+      ops.conn.rollback()
+      results = [(future, None, e) for future, rowcount, error in results]
+    for future, rowcount, error in results:
+      self.writes += 1
+      if error is not None:
+        self.failures += 1
+        if future.done():
+          print("Queued write failed:", error)# Already acknowledged on enqueue
+        else:
+          future.set_exception(error)
+      elif not future.done():
+        future.set_result(rowcount)
+
+  def flush(self):
+    """Wait until every queued write has been committed."""
+    self.queue.join()
+
+  def close(self):
+    """Apply the remaining writes and stop the writer thread."""
+    if not self.closed:
+      self.closed = True
+      self.queue.put(None)
+      self.thread.join()
+
+
+class FlightStatus:
+  """The flight status state machine, compiled once into integer codes and bitmask rows.
+
+  transitions lists the statuses each status may move to directly; staying put is always allowed.
+  compile() numbers the statuses in names order and builds, per code, a bitmask of the codes that may
+  follow directly (allowed), so each check is a dict lookup and a shift. Only direct moves are allowed,
+  everywhere: interactive edits, check_bulk and the status ingestor use allows(), and the database
+  trigger checks the same moves in FlightStatusTransition, so every other writer is held to them too.
+  There is no skip-allowed path; a feed that reports several moves per flight must send each of them.
+  A change to transitions needs a migration that rewrites FlightStatusTransition.
+  """
+  names = ("On Time", "Delayed", "Cancelled", "Boarding", "in-Flight", "Landed", "No Show", "Closed")
+  transitions = {
+    "On Time": ("Delayed", "Cancelled", "Boarding", "No Show"),
+    "Delayed": ("On Time", "Cancelled", "Boarding", "No Show"),
+    "Boarding": ("Delayed", "Cancelled", "in-Flight"),
+    "in-Flight": ("Landed",),
+    "Landed": ("Closed",),
+    "Cancelled": ("Closed",),
+    "No Show": ("Closed",),
+    "Closed": (),
+  }
+
+  @classmethod
+  def compile(cls):
+    """Build the code and bitmask tables from names and transitions."""
+    cls.codes = {name: code for code, name in enumerate(cls.names)}
+    cls.allowed = [1 << code for code in range(len(cls.names))]
+    for name, targets in cls.transitions.items():
+      for target in targets:
+        cls.allowed[cls.codes[name]] |= 1 << cls.codes[target]
+
+  @classmethod
+  def allows(cls, old, new):
+    """True if a flight in status old may be moved directly to new. A flight with no status may take any."""
+    if new not in cls.codes:
+      return False
+    if old not in cls.codes:
+      return True
+    return bool(cls.allowed[cls.codes[old]] >> cls.codes[new] & 1)
+
+  @classmethod
+  def next_statuses(cls, old):
+    """The statuses a flight in status old may move to directly, in names order."""
+    return [name for name in cls.names if cls.allows(old, name)]
+
+  @classmethod
+  def check_bulk(cls, changes):
+    """Split (key, old, new) changes into accepted and rejected lists, by the same rule as allows()."""
+    masks = cls.allowed
+    codes = cls.codes
+    accepted, rejected = [], []
+    for change in changes:
+      key, old, new = change
+      if new in codes and (old not in codes or masks[codes[old]] >> codes[new] & 1):
+        accepted.append(change)
+      else:
+        rejected.append(change)
+    return accepted, rejected
+
+  @classmethod
+  def lookup_rows(cls):
+    """(StatusCode, Name) rows for the FlightStatus table."""
+    return ", ".join("(" + str(code) + ", '" + name + "')" for name, code in cls.codes.items())
+
+
+FlightStatus.compile()
+
+
+class FlightCalendar:
+  """Expands FlightSchedule rules into dated occurrences for one window at a time, lazily.
+
+  Occurrences are not stored: each schedule yields the days it runs on inside the window, and the streams
+  of all schedules are merged in (date, flight number) order. Only days that carry their own state have
+  rows, in FlightOccurrence and OccurrencePilot, and they are laid over the generated days.
+  """
+  day_names = ("Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun")
+
+  @classmethod
+  def parse_days(cls, text):
+    """DaysOfWeek digits for '135', 'Mon,Wed,Fri', 'Mon-Fri' or 'daily'; raises ValueError for anything else."""
+    text = text.strip()
+    if text.isdigit():
+      return "".join(sorted(set(text)))# The CHECK constraint rejects digits outside 1-7
+    if text.lower() == "daily":
+      return "1234567"
+    names = [name.lower() for name in cls.day_names]
+    days = set()
+    for part in text.split(","):
+      first, _, last = part.strip().lower().partition("-")
+      if first[:3] not in names or last and last[:3] not in names:
+        raise ValueError("Unknown day of the week: " + part.strip())
+      start = names.index(first[:3])
+      end = names.index(last[:3]) if last else start
+      days.update(str((start + step) % 7 + 1) for step in range((end - start) % 7 + 1))
+    return "".join(sorted(days))
+
+  @staticmethod
+  def parse_date(text):
+    """A datetime.date from YYYY-MM-DD; raises ValueError for anything else."""
+    return datetime.date.fromisoformat(text.strip())
+
+  @staticmethod
+  def days(weekdays, valid_from, valid_to, start, end):
+    """Yield the dates between start and end (inclusive) on which a schedule runs."""
+    day = max(start, valid_from)
+    last = min(end, valid_to)
+    runs = [str(weekday) in weekdays for weekday in range(1, 8)]
+    if not any(runs):
+      return
+    # Days to step from each weekday to the next one the schedule runs on
+    steps = [next(step for step in range(1, 8) if runs[(weekday + step) % 7]) for weekday in range(7)]
+    while day <= last and not runs[day.weekday()]:
+      day += datetime.timedelta(days=1)
+    while day <= last:
+      yield day
+      day += datetime.timedelta(days=steps[day.weekday()])
+
+  @classmethod
+  def occurrences(cls, schedules, start, end):
+    """Yield (date, schedule row) for rows (FlightID, FlightNumber, ..., DaysOfWeek, ValidFrom, ValidTo), in date order.
+
+    A flight with overlapping schedules is yielded once per day.
+    """
+    streams = [cls.tag(schedule, start, end) for schedule in schedules]
+    previous = None
+    for day, schedule in heapq.merge(*streams, key=lambda occurrence: (occurrence[0], occurrence[1][1])):
+      if (day, schedule[0]) != previous:
+        previous = (day, schedule[0])
+        yield day, schedule
+
+  @classmethod
+  def tag(cls, schedule, start, end):
+    """The days of one schedule, each paired with the schedule row."""
+    valid_from, valid_to = cls.parse_date(schedule[-2]), cls.parse_date(schedule[-1])
+    for day in cls.days(schedule[-3], valid_from, valid_to, start, end):
+      yield day, schedule
+
+
+class StatusIngestor:
+  """Applies a stream of flight status events, batching each window's moves per flight.
+
+  Events are lines of "FlightNumber,Status" (CSV) or JSON objects with FlightNumber and Status keys.
+  Sources (a tailed file, a Unix socket, stdin) are read on their own threads into one queue. Each
+  flight's events in a window are kept as a chain of direct moves (a move back to a status already in
+  the chain drops the loop); every window seconds, or sooner once max_batch flights are pending, each
+  chain's first move is checked against the flight's current status with FlightStatus and the moves are
+  written in order with one executemany, both in one immediate transaction.
+  """
+  # Current statuses are read in chunks of this many flights when a batch is validated.
+  lookup_chunk = 500
+
+  def __init__(self, db_path=None, window=0.5, max_batch=5000):
+    self.db_path = db_path or DBOperations.db_path
+    self.window = window
+    self.max_batch = max_batch
+    self.lines = queue.Queue(100000)
+    self.pending = {}
+    self.sources = 0
+    self.received = self.invalid = self.coalesced = self.applied = self.unmatched = self.batches = 0
+    self.rejected = 0
+    self.board = None# DepartureBoard to push each applied batch to
+
+  def parse(self, line):
+    """Return (FlightNumber, Status) for an event line; raises ValueError if it is malformed."""
+    line = line.strip()
+    if line.startswith("{"):
+      event = json.loads(line)
+      flight_number, status = event["FlightNumber"], event["Status"]
+    else:
+      fields = next(csv.reader([line]))
+      if len(fields) != 2:
+        raise ValueError("expected FlightNumber,Status")
+      flight_number, status = fields
+    flight_number, status = str(flight_number).strip(), str(status).strip()
+    if status not in FlightStatus.codes:
+      raise ValueError("invalid status " + repr(status))
+    return flight_number, status
+
+  def feed(self, line):
+    """Validate one event and make it the pending status of its flight."""
+    if not line.strip():
+      return
+    self.received += 1
+    try:
+      flight_number, status = self.parse(line)
+    except (ValueError, KeyError, TypeError) as e:
+      self.invalid += 1
+      print("Rejected event " + repr(line.strip()) + ": " + str(e), file=sys.stderr)
+      return
+    chain = self.pending.get(flight_number)
+    if chain is None:
+      self.pending[flight_number] = [status]
+      return
+    if not FlightStatus.allows(chain[-1], status):
+      self.rejected += 1
+      print("Rejected transition for " + flight_number + ": " + chain[-1] + " -> " + status, file=sys.stderr)
+      return
+    self.coalesced += 1# Joins the flight's chain for this window
+    if status in chain:
+      del chain[chain.index(status) + 1:]# Back to an earlier status: the moves in between cancel out
+    else:
+      chain.append(status)
+
+  def check(self, ops, pending):
+    """Return (updates, rejected, unmatched) for pending chains, checked against the flights' current statuses.
+
+    updates holds (flights, rows): the number of flights that move and the (status, FlightNumber) rows
+    that make their moves in order.
+    """
+    numbers = list(pending)
+    current = {}
+    for start in range(0, len(numbers), self.lookup_chunk):
+      chunk = numbers[start:start + self.lookup_chunk]
+      ops.cur.execute("SELECT FlightNumber, Status FROM FlightView WHERE FlightNumber IN ("
+                      + ",".join("?" * len(chunk)) + ")", chunk)
+      current.update(ops.cur.fetchall())
+    chains = {}
+    for flight_number, chain in pending.items():
+      if flight_number in current:
+        old = current[flight_number]
+        chains[flight_number] = chain[chain.index(old) + 1:] if old in chain else chain
+    accepted, rejected = FlightStatus.check_bulk(
+      (flight_number, current[flight_number], chain[0]) for flight_number, chain in chains.items() if chain)
+    rows = [(status, flight_number) for flight_number, old, new in accepted for status in chains[flight_number]]
+    return (len(accepted), rows), rejected, len(numbers) - len(current)
+
+  def apply(self, ops, pending):
+    """Check and write pending statuses in one immediate transaction, so no other writer can move them in between."""
+    ops.cur.execute("BEGIN IMMEDIATE")
+    try:
+      (updates, rows), rejected, unmatched = self.check(ops, pending)
+      ops.cur.executemany(ops.sql_update_flight_status, rows)
+      ops.conn.commit()
+    except BaseException:
+      ops.conn.rollback()
+      raise
+    for flight_number, old, new in rejected:
+      print("Rejected transition for " + flight_number + ": " + str(old) + " -> " + new, file=sys.stderr)
+    self.rejected += len(rejected)
+    self.unmatched += unmatched
+    self.applied += updates
+
+  def requeue(self, pending):
+    """Return chains that could not be written to pending, unless newer events for the flight arrived meanwhile."""
+    for flight_number, chain in pending.items():
+      self.pending.setdefault(flight_number, chain)
+
+  def flush(self, ops):
+    """Write the pending statuses in one transaction, falling back to one flight at a time if it fails.
+
+    A batch that finds the database locked is kept for the next window; one that a flight fails (for
+    example because another writer moved it to a status this event cannot follow) is retried per flight,
+    and the flights that still fail are counted as rejected.
+    """
+    if not self.pending:
+      return
+    pending, self.pending = self.pending, {}
+    try:
+      self.apply(ops, pending)
+    except sqlite3.OperationalError as e:
+      print("Batch of " + str(len(pending)) + " event(s) deferred: " + str(e), file=sys.stderr)
+      self.requeue(pending)
+      return
+    except sqlite3.DatabaseError as e:
+      print("Batch of " + str(len(pending)) + " event(s) failed (" + str(e) + "); retrying one flight at a time",
+            file=sys.stderr)
+      deferred = {}
+      for flight_number, chain in pending.items():
+        try:
+          self.apply(ops, {flight_number: chain})
+        except sqlite3.OperationalError:
+          deferred[flight_number] = chain
+        except sqlite3.DatabaseError as e:
+          self.rejected += 1
+          print("Rejected event for " + flight_number + " -> " + " -> ".join(chain) + ": " + str(e), file=sys.stderr)
+      self.requeue(deferred)
+    ops.notify_board()
+    self.batches += 1
+
+  def add_source(self, lines):
+    """Read an iterable of lines on a background thread."""
+    def pump():
+      try:
+        for line in lines:
+          self.lines.put(line)
+      finally:
+        self.lines.put(None)# Tells run that this source has ended
+    self.sources += 1
+    threading.Thread(target=pump, daemon=True).start()
+
+  def run(self):
+    """Apply events until every source has ended or Ctrl-C is pressed; returns the number of flights updated."""
+    ops = DBOperations()
+    ops.db_path = self.db_path
+    ops.board = self.board
+    ops.get_connection()
+    try:
+      deadline = time.monotonic() + self.window
+      try:
+        while self.sources:
+          try:
+            line = self.lines.get(timeout=max(0, deadline - time.monotonic()))
+            if line is None:
+              self.sources -= 1
+            else:
+              self.feed(line)
+          except queue.Empty:
+            pass
+          if time.monotonic() >= deadline or len(self.pending) >= self.max_batch:
+            self.flush(ops)
+            deadline = time.monotonic() + self.window
+      except KeyboardInterrupt:
+        print("Interrupted; applying pending events", file=sys.stderr)# The usual way to stop a tailed source
+      for attempt in range(3):
+        self.flush(ops)
+        if not self.pending:
+          break
+      if self.pending:
+        print(str(len(self.pending)) + " event(s) not applied: the database stayed locked", file=sys.stderr)
+    finally:
+      ops.conn.close()
+    print("Ingested " + str(self.received) + " event(s): " + str(self.applied) + " update(s) in "
+          + str(self.batches) + " batch(es), " + str(self.coalesced) + " coalesced, "
+          + str(self.invalid) + " invalid, " + str(self.rejected) + " rejected transition(s), "
+          + str(self.unmatched) + " for unknown flights")
+    return self.applied
+
+
+def tail_file(path, poll=0.2):
+  """Yield lines appended to a file, like tail -f; only complete lines are yielded."""
+  with open(path) as events:
+    events.seek(0, os.SEEK_END)
+    partial = ""
+    while True:
+      chunk = events.readline()
+      if not chunk:
+        time.sleep(poll)
+        continue
+      partial += chunk
+      if partial.endswith("\n"):
+        yield partial
+        partial = ""
+
+
+def unix_socket_lines(path):
+  """Yield lines sent by any number of clients connecting to a Unix stream socket at path."""
+  if os.path.exists(path):
+    os.remove(path)
+  server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+  server.bind(path)
+  server.listen()
+  received = queue.Queue(100000)
+  def serve(connection):
+    with connection, connection.makefile("r") as client:
+      for line in client:
+        received.put(line)
+  def accept():
+    while True:
+      connection, address = server.accept()
+      threading.Thread(target=serve, args=(connection,), daemon=True).start()
+  threading.Thread(target=accept, daemon=True).start()
+  while True:
+    yield received.get()
+
+
+class BoardSubscription:
+  """One screen's queue of encoded board events and the boards it watches."""
+  def __init__(self, keys, max_pending):
+    self.keys = keys
+    self.events = queue.Queue(max_pending)
+    self.dropped = False
+
+
+class DepartureBoard:
+  """Live departure and arrival boards of every airport, pushed to subscribed screens as diffs.
+
+  Each board lists the flights leaving (departures) or reaching (arrivals) one airport, ordered by
+  status in FlightStatus.names order, then by flight number. sync() compares every flight's RowVersion
+  with the copy in memory and re-reads only the flights that changed; it runs right after this
+  process's own flight writes and, for writes by other processes, whenever the Flights write counter
+  moves. Every change becomes an add, change or remove event for the boards it touches, encoded once and
+  queued for each subscriber of those boards, so the database is read once per change however many
+  screens are watching.
+
+  Events are JSON objects with seq (numbered per board), airport, board and op. A new subscriber first
+  gets a snapshot event per board with all its rows; add and change events carry the flight's row and
+  its new position on the board, remove events only the FlightNumber.
+  """
+  kinds = ("departures", "arrivals")
+  sql_flight_versions = "SELECT FlightID, RowVersion FROM Flights"
+  sql_board_all = "SELECT FlightID, FlightNumber, Status, OriginAirport, DestinationAirport, RowVersion FROM FlightView"
+  sql_board_rows = sql_board_all + " WHERE FlightID IN (@ids)"
+  sql_flights_writes = "SELECT Writes FROM TableWrites WHERE TableName = 'Flights'"
+  # Columns sent for each flight on a board.
+  columns = ("FlightNumber", "Status", "OriginAirport", "DestinationAirport")
+  # Changed flights are re-read this many at a time.
+  lookup_chunk = 500
+  # Seconds between keep-alive lines, which also notice screens that went away.
+  heartbeat = 15.0
+
+  def __init__(self, db_path=None, poll_interval=0.5, max_pending=1000):
+    """max_pending is how far a screen may fall behind before it is dropped and has to reconnect."""
+    self.db_path = db_path or DBOperations.db_path
+    self.poll_interval = poll_interval
+    self.max_pending = max_pending
+    self.conn = sqlite3.connect(self.db_path, check_same_thread=False)
+    self.lock = threading.RLock()
+    self.flights = {}# FlightID -> (FlightID, FlightNumber, Status, OriginAirport, DestinationAirport, RowVersion)
+    self.boards = {}# (airport, kind) -> sorted list of sort keys of the flights on it
+    self.sequences = {}# (airport, kind) -> seq of the last event
+    self.subscribers = {}# (airport, kind) -> set of BoardSubscription
+    self.writes = None
+    self.stopped = threading.Event()
+    self.syncs = self.events = self.pushed = self.dropped = 0
+    self.sync()
+
+  @staticmethod
+  def sort_key(row):
+    """Board order: status in FlightStatus.names order (unknown statuses last), then flight number."""
+    return (FlightStatus.codes.get(row[2], len(FlightStatus.names)), row[1], row[0])
+
+  @staticmethod
+  def board_keys(row):
+    """The boards a flight row appears on."""
+    if row is None:
+      return []
+    return [(airport, kind) for airport, kind in ((row[3], "departures"), (row[4], "arrivals")) if airport is not None]
+
+  def sync(self):
+    """Re-read the flights whose RowVersion changed, or that were added or deleted, and push the diffs."""
+    with self.lock:
+      self.syncs += 1
+      if not self.flights:
+        self.load()
+        return
+      versions = dict(self.conn.execute(self.sql_flight_versions))
+      changed = [flight_id for flight_id, version in versions.items()
+                 if flight_id not in self.flights or self.flights[flight_id][5] != version]
+      changes = {flight_id: None for flight_id in self.flights if flight_id not in versions}
+      changes.update(dict.fromkeys(changed))# A flight deleted since the version scan stays None
+      for start in range(0, len(changed), self.lookup_chunk):
+        chunk = changed[start:start + self.lookup_chunk]
+        for row in self.conn.execute(self.sql_board_rows.replace("@ids", ",".join("?" * len(chunk))), chunk):
+          changes[row[0]] = row
+      self.publish(self.apply(changes))
+
+  def load(self):
+    """Fill empty boards with one scan, sorting each board once rather than inserting flight by flight."""
+    self.flights = {row[0]: row for row in self.conn.execute(self.sql_board_all)}
+    self.boards = {}
+    for row in self.flights.values():
+      for key in self.board_keys(row):
+        self.boards.setdefault(key, []).append(self.sort_key(row))
+    for order in self.boards.values():
+      order.sort()
+    events = []
+    for key, subscribers in self.subscribers.items():
+      if subscribers:# Watched boards start over from a new snapshot
+        self.sequences[key] = self.sequences.get(key, 0) + 1
+        events.append((key, self.snapshot(key)))
+    self.publish(events)
+
+  def apply(self, changes):
+    """Bring the boards up to date with {FlightID: row or None}; return the (board, event) pairs, None for unwatched boards."""
+    events = []
+    for flight_id, new in changes.items():
+      old = self.flights.get(flight_id)
+      if new is None:
+        self.flights.pop(flight_id, None)
+      else:
+        self.flights[flight_id] = new
+      if old is not None and new is not None and old[1:5] == new[1:5]:
+        continue# Written without a visible change
+      old_boards, new_boards = self.board_keys(old), self.board_keys(new)
+      for key in old_boards:
+        order = self.boards[key]
+        del order[bisect.bisect_left(order, self.sort_key(old))]
+        if key not in new_boards:
+          events.append(self.event(key, "remove", old))
+      for key in new_boards:
+        order = self.boards.setdefault(key, [])
+        position = bisect.bisect_left(order, self.sort_key(new))
+        order.insert(position, self.sort_key(new))
+        events.append(self.event(key, "change" if key in old_boards else "add", new, position))
+    return events
+
+  def event(self, key, op, row, position=None):
+    """One encoded event for a board, or None when nobody is watching it."""
+    self.sequences[key] = self.sequences.get(key, 0) + 1
+    if not self.subscribers.get(key):
+      return None# Only the seq moves; a later subscriber starts from a snapshot
+    event = {"seq": self.sequences[key], "airport": key[0], "board": key[1], "op": op, "FlightNumber": row[1]}
+    if op != "remove":
+      event.update(zip(self.columns[1:], row[2:5]), position=position)
+    return key, json.dumps(event).encode("utf-8")
+
+  def snapshot(self, key):
+    """The snapshot event of a board: every row on it, in board order."""
+    rows = [dict(zip(self.columns, self.flights[flight_id][1:5])) for rank, number, flight_id in self.boards.get(key, [])]
+    event = {"seq": self.sequences.get(key, 0), "airport": key[0], "board": key[1], "op": "snapshot", "rows": rows}
+    return json.dumps(event).encode("utf-8")
+
+  def publish(self, events):
+    """Queue each event for every subscriber of its board; a subscriber whose queue is full is dropped."""
+    events = [event for event in events if event is not None]
+    self.events += len(events)
+    for key, data in events:
+      for subscription in list(self.subscribers.get(key, ())):
+        try:
+          subscription.events.put_nowait(data)
+          self.pushed += 1
+        except queue.Full:
+          self.unsubscribe(subscription)
+          subscription.dropped = True
+          self.dropped += 1
+
+  def subscribe(self, airports, kinds=None):
+    """Watch the boards of some airports; the subscription starts with their snapshots."""
+    keys = [(airport.strip().upper(), kind) for airport in airports for kind in (kinds or self.kinds)]
+    subscription = BoardSubscription(keys, self.max_pending + len(keys))
+    with self.lock:
+      for key in keys:
+        subscription.events.put_nowait(self.snapshot(key))
+        self.subscribers.setdefault(key, set()).add(subscription)
+    return subscription
+
+  def unsubscribe(self, subscription):
+    """Stop sending events to a subscription."""
+    with self.lock:
+      for key in subscription.keys:
+        self.subscribers.get(key, set()).discard(subscription)
+
+  def poll(self):
+    """Sync whenever the Flights write counter moves, until stop() is called."""
+    while not self.stopped.wait(self.poll_interval):
+      with self.lock:
+        writes = self.conn.execute(self.sql_flights_writes).fetchone()
+        if writes != self.writes:
+          self.writes = writes
+          self.sync()
+
+  def serve(self, address):
+    """Accept screens on 'unix:PATH' or 'HOST:PORT' and start polling, on background threads.
+
+    A screen sends "SUBSCRIBE HRL GTW" and reads JSON lines, or requests GET /boards/HRL,GTW over HTTP
+    and reads them as server-sent events.
+    """
+    if address.startswith("unix:"):
+      path = address[len("unix:"):]
+      if os.path.exists(path):
+        os.remove(path)
+      server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+      server.bind(path)
+    else:
+      host, _, port = address.rpartition(":")
+      server = socket.create_server((host or "127.0.0.1", int(port)))
+    server.listen()
+    self.server = server
+    def accept():
+      while not self.stopped.is_set():
+        try:
+          connection, peer = server.accept()
+        except OSError:
+          return# Closed by stop()
+        threading.Thread(target=self.stream, args=(connection,), daemon=True).start()
+    threading.Thread(target=accept, daemon=True).start()
+    threading.Thread(target=self.poll, daemon=True).start()
+
+  def stream(self, connection):
+    """Send one screen its snapshots and then its events until it disconnects or falls too far behind."""
+    with connection, connection.makefile("rb") as reader:
+      request = reader.readline().decode("latin-1").split()
+      sse = request[:1] == ["GET"]
+      if sse:
+        while reader.readline().strip():
+          pass# Skip the request headers
+        path = request[1] if len(request) > 1 else ""
+        airports = path[len("/boards/"):].split(",") if path.startswith("/boards/") else []
+        if not any(airports):
+          connection.sendall(b"HTTP/1.1 404 Not Found\r\nContent-Length: 0\r\n\r\n")
+          return
+        connection.sendall(b"HTTP/1.1 200 OK\r\nContent-Type: text/event-stream\r\nCache-Control: no-cache\r\n\r\n")
+      else:
+        airports = request[1:] if request[:1] == ["SUBSCRIBE"] else []
+        if not airports:
+          connection.sendall(b'{"error": "usage: SUBSCRIBE AIRPORT..."}\n')
+          return
+      subscription = self.subscribe(airport for airport in airports if airport)
+      try:
+        while not subscription.dropped and not self.stopped.is_set():
+          try:
+            data = subscription.events.get(timeout=self.heartbeat)
+          except queue.Empty:
+            connection.sendall(b": ping\n\n" if sse else b"\n")
+            continue
+          connection.sendall(b"data: " + data + b"\n\n" if sse else data + b"\n")
+      except OSError:
+        pass# The screen went away
+      finally:
+        self.unsubscribe(subscription)
+
+  def stop(self):
+    """Stop accepting screens and polling; open streams end at their next event or keep-alive."""
+    self.stopped.set()
+    if getattr(self, "server", None) is not None:
+      self.server.close()
+
+  def summary(self):
+    """One line of board statistics."""
+    with self.lock:
+      screens = len({id(subscription) for subscribers in self.subscribers.values() for subscription in subscribers})
+      return (str(len(self.flights)) + " flights on " + str(len(self.boards)) + " boards, " + str(self.syncs) + " sync(s), "
+              + str(self.events) + " event(s), " + str(self.pushed) + " pushed, " + str(screens) + " screen(s), "
+              + str(self.dropped) + " dropped")
+
+
+class StressHarness:
+  """Runs reader and writer workers (threads or processes) against a generated database and reports contention.
+
+  Each worker has its own connection opened with timeout=0, so SQLITE_BUSY reaches Python instead of
+  SQLite's busy handler; the worker then backs off and retries the whole operation, counting each busy
+  error and the wall time of every failed attempt plus its backoff as waiting, and gives up (as "database
+  is locked") after busy_timeout seconds, like the default connection would. Latency is measured per
+  operation including that waiting.
+  """
+  # Operations: read or write, default weight, and a function of (random, row count) returning (query name, params).
+  operations = {
+    "flight-number": ("read", 40, lambda rng, n: ("sql_search_flight_number", ("S" + str(rng.randrange(n)),))),
+    "flight-status": ("read", 15, lambda rng, n: ("sql_search_flight_status", (rng.choice(("On Time", "Delayed")),))),
+    "flight-origin": ("read", 15, lambda rng, n: ("sql_search_origin_airport", ("A" + str(rng.randrange(StressHarness.airports)),))),
+    "pilot-flights": ("read", 20, lambda rng, n: ("sql_search_pilot_flights", ("L" + str(rng.randrange(n // 5 + 1)),))),
+    "least-loaded": ("read", 9, lambda rng, n: ("sql_least_loaded_pilots", (rng.randrange(30), 10))),
+    "pilot-flight-all": ("read", 1, lambda rng, n: ("sql_view_pilot_flight_all", ())),
+    "set-status": ("write", 60, lambda rng, n: ("sql_update_flight_status",
+                                                (rng.choice(("On Time", "Delayed")), "S" + str(rng.randrange(n))))),
+    "assign": ("write", 15, lambda rng, n: ("sql_insert_plan", (rng.randrange(1, n + 1), rng.randrange(1, n // 5 + 2)))),
+    "unassign": ("write", 15, lambda rng, n: ("sql_delete_flightpilot",
+                                              ("L" + str(rng.randrange(n // 5 + 1)), "S" + str(rng.randrange(n))))),
+    "update-pilot": ("write", 10, lambda rng, n: ("sql_update_pilot",
+                                                  ("Pilot", rng.randrange(40), "L" + str(rng.randrange(n // 5 + 1))))),
+  }
+  airports = 50
+
+  def __init__(self, db_path="stress.db", flights=10000, readers=4, writers=1, use_processes=False,
+               duration=10.0, mix=None, busy_timeout=5.0, journal_mode="wal", coalesce=False, async_readers=0):
+    self.db_path = db_path
+    self.flights = flights
+    self.readers = readers
+    self.writers = writers
+    self.use_processes = use_processes
+    self.duration = duration
+    self.mix = mix or {name: spec[1] for name, spec in self.operations.items()}
+    self.busy_timeout = busy_timeout
+    self.journal_mode = journal_mode
+    self.single_flight = SingleFlight(db_path) if coalesce else None# Shared by the reader threads and tasks
+    self.async_readers = async_readers
+    if not self.jobs():
+      raise ValueError("The stress test needs at least one reader or writer for the operations in its mix")
+
+  @staticmethod
+  def parse_mix(text):
+    """Parse 'name=weight,name=weight' into a dict, checking the names."""
+    mix = {}
+    for item in text.split(","):
+      name, _, weight = item.partition("=")
+      if name.strip() not in StressHarness.operations:
+        raise ValueError("Unknown stress operation: " + name.strip())
+      mix[name.strip()] = float(weight or 1)
+    return mix
+
+  def generate(self):
+    """Build a fresh, fully migrated database with flights flights, a pilot per five flights and two crew per flight."""
+    for suffix in ("", "-wal", "-shm"):
+      if os.path.exists(self.db_path + suffix):
+        os.remove(self.db_path + suffix)
+    ops = DBOperations()
+    ops.db_path = self.db_path
+    ops.create_table()
+    ops.get_connection()
+    try:
+      rng = random.Random(0)
+      pilots = self.flights // 5 + 1
+      ops.cur.executemany(ops.sql_seed_des, (("A" + str(i), "City " + str(i), "Country") for i in range(self.airports)))
+      ops.cur.executemany(ops.sql_seed_pilot, (("Pilot " + str(i), "L" + str(i), rng.randrange(40)) for i in range(pilots)))
+      ops.cur.executemany(ops.sql_seed, (("S" + str(i), rng.choice(("On Time", "Delayed")), "A" + str(rng.randrange(self.airports)),
+                                          "A" + str(rng.randrange(self.airports))) for i in range(self.flights)))
+      ops.cur.executemany(ops.sql_insert_plan, ((flight, rng.randrange(1, pilots + 1))
+                                                for flight in range(1, self.flights + 1) for crew in range(2)))
+      ops.conn.commit()
+      ops.cur.execute("PRAGMA journal_mode = " + self.journal_mode)
+      ops.cur.execute("ANALYZE")
+    finally:
+      ops.conn.close()
+
+  def jobs(self):
+    """Return the workers to start, as (function, args) pairs."""
+    names = {"read": [name for name in self.mix if self.operations[name][0] == "read"],
+             "write": [name for name in self.mix if self.operations[name][0] == "write"]}
+    roles = [("read", i) for i in range(self.readers if names["read"] else 0)]
+    roles += [("write", i) for i in range(self.writers if names["write"] else 0)]
+    jobs = [(stress_worker, (self.db_path, self.flights, {name: self.mix[name] for name in names[role]}, self.duration,
+                             self.busy_timeout, index * 2 + (role == "write"), self.single_flight)) for role, index in roles]
+    if self.async_readers and names["read"]:
+      jobs.append((stress_async_worker, (self.db_path, self.flights, {name: self.mix[name] for name in names["read"]},
+                                         self.duration, self.async_readers, 1 << 20, self.single_flight)))
+    return jobs
+
+  def run(self):
+    """Start the workers, wait for them and return the merged per-operation statistics."""
+    jobs = self.jobs()
+    started = time.perf_counter()
+    if self.use_processes:
+      with multiprocessing.get_context("fork").Pool(len(jobs)) as pool:
+        results = [result.get() for result in [pool.apply_async(function, args) for function, args in jobs]]
+    else:
+      with ThreadPoolExecutor(len(jobs)) as pool:
+        results = list(pool.map(lambda job: job[0](*job[1]), jobs))
+    elapsed = time.perf_counter() - started
+    merged = {}
+    for result in results:
+      for name, stats in result.items():
+        total = merged.setdefault(name, {"latencies": [], "busy": 0, "wait": 0.0, "errors": 0})
+        total["latencies"].extend(stats["latencies"])
+        total["busy"] += stats["busy"]
+        total["wait"] += stats["wait"]
+        total["errors"] += stats["errors"]
+    return merged, elapsed
+
+  def report(self, merged, elapsed):
+    """Print throughput, busy counts, lock wait and latency percentiles per operation."""
+    print("Stress test: " + str(self.readers) + " reader(s), " + str(self.writers) + " writer(s), "
+          + (str(self.async_readers) + " asyncio reader(s), " if self.async_readers else "")
+          + ("processes" if self.use_processes else "threads") + ", " + self.journal_mode + " journal, "
+          + str(self.flights) + " flights, " + str(round(elapsed, 2)) + "s")
+    print("%-17s %8s %9s %8s %8s %8s %8s %7s %8s %7s" % ("operation", "count", "ops/s", "p50 ms", "p95 ms", "p99 ms",
+                                                      "max ms", "busy", "wait s", "errors"))
+    for name in sorted(merged, key=lambda name: (self.operations[name][0], name)):
+      stats = merged[name]
+      latencies = sorted(stats["latencies"])
+      def percentile(fraction):
+        return latencies[min(len(latencies) - 1, int(fraction * len(latencies)))] * 1000 if latencies else 0.0
+      print("%-17s %8d %9.1f %8.2f %8.2f %8.2f %8.2f %7d %8.2f %7d" % (
+        name, len(latencies), len(latencies) / elapsed, percentile(0.5), percentile(0.95), percentile(0.99),
+        latencies[-1] * 1000 if latencies else 0.0, stats["busy"], stats["wait"], stats["errors"]))
+    if self.single_flight is not None:
+      print("Coalesced reads: " + self.single_flight.summary())
+
+
+def coalesced_read(cursor, sql, params):
+  """Run a read on cursor, returning the (columns, rows, complete) result a SingleFlight key shares."""
+  rows = cursor.execute(sql, params).fetchall()
+  return cursor.description, rows, True
+
+
+def stress_worker(db_path, flights, mix, duration, busy_timeout, seed, single_flight=None):
+  """Replay a weighted mix of operations for duration seconds; returns statistics per operation name."""
+  rng = random.Random(seed)
+  names, weights = list(mix), list(mix.values())
+  stats = {name: {"latencies": [], "busy": 0, "wait": 0.0, "errors": 0} for name in names}
+  conn = sqlite3.connect(db_path, timeout=0)# Busy errors come straight back, to be counted here
+  conn.execute(DBOperations.sql_enable_foreign_keys)
+  cur = conn.cursor()
+  deadline = time.perf_counter() + duration
+  try:
+    while time.perf_counter() < deadline:
+      name = rng.choices(names, weights)[0]
+      kind, weight, make = StressHarness.operations[name]
+      query, params = make(rng, flights)
+      sql = getattr(DBOperations, query)
+      started = time.perf_counter()
+      backoff = 0.001
+      while True:
+        attempt = time.perf_counter()
+        try:
+          if kind == "write":
+            cur.execute(sql, params)
+            conn.commit()
+          elif single_flight is None:
+            cur.execute(sql, params).fetchall()
+          else:
+            # The same (columns, rows, complete) result that CoalescingCursor and read_async share under this key
+            single_flight.run(single_flight.key(sql, params), lambda: coalesced_read(cur, sql, params))
+          break
+        except sqlite3.OperationalError as e:
+          if "locked" not in str(e) and "busy" not in str(e):
+            raise
+          if conn.in_transaction:
+            conn.rollback()
+          stats[name]["busy"] += 1
+          waited = time.perf_counter() - started
+          if waited > busy_timeout:
+            stats[name]["errors"] += 1# What a user would see as "database is locked"
+            break
+          time.sleep(backoff)
+          stats[name]["wait"] += time.perf_counter() - attempt# The failed attempt itself, then the backoff
+          backoff = min(backoff * 2, 0.05)
+        except sqlite3.IntegrityError:
+          conn.rollback()# A duplicate assignment: a normal outcome, not contention
+          break
+      stats[name]["latencies"].append(time.perf_counter() - started)
+  finally:
+    conn.close()
+  return stats
+
+
+def stress_async_worker(db_path, flights, mix, duration, tasks, seed, single_flight=None):
+  """Replay a weighted mix of reads from tasks asyncio tasks on one event loop, through DBOperations.read_async."""
+  ops = DBOperations()
+  ops.db_path = db_path
+  ops.single_flight = single_flight
+  names, weights = list(mix), list(mix.values())
+  stats = {name: {"latencies": [], "busy": 0, "wait": 0.0, "errors": 0} for name in names}
+
+  async def reader(rng, deadline):
+    while time.perf_counter() < deadline:
+      name = rng.choices(names, weights)[0]
+      query, params = StressHarness.operations[name][2](rng, flights)
+      started = time.perf_counter()
+      try:
+        await ops.read_async(getattr(DBOperations, query), params)
+      except sqlite3.OperationalError:
+        stats[name]["errors"] += 1
+      stats[name]["latencies"].append(time.perf_counter() - started)
+
+  async def run():
+    deadline = time.perf_counter() + duration
+    await asyncio.gather(*(reader(random.Random(seed + task), deadline) for task in range(tasks)))
+  asyncio.run(run())
+  return stats
+
+
+class Migration:
+  """A numbered schema upgrade made of idempotent statements and online table rebuilds."""
+  def __init__(self, version, description):
+    self.version = version
+    self.description = description
+    self.steps = []
+    self.expressions = {}
+
+  def execute(self, sql, table=None):
+    """Add a statement; table names the table whose rows it touches, for dry-run estimates."""
+    self.steps.append(("execute", sql, table))
+    return self
+
+  def rebuild(self, table, create_sql, expressions=None):
+    """Add a batched rebuild of table into the shape given by create_sql.
+
+    expressions maps new columns to the SQL that fills them, with @row standing for the old row.
+    """
+    self.steps.append(("rebuild", create_sql, table))
+    self.expressions[table] = expressions
+    return self
+
+
+def count_writes(migration, tables):
+  """Add to migration a trigger per table and event that bumps the table's counter in TableWrites."""
+  for table in tables:
+    for event in ("INSERT", "UPDATE", "DELETE"):
+      migration.execute("CREATE TRIGGER IF NOT EXISTS " + table + "_writes_" + event.lower() + " AFTER " + event + " ON " + table
+                        + " BEGIN UPDATE TableWrites SET Writes = Writes + 1 WHERE TableName = '" + table + "'; END")
+  return migration
+
+
+# Ordered schema migrations; the database's user_version records the last one applied.
+migrations = [
+  Migration(1, "Rebuild Flights with the Status CHECK constraint")
+    .rebuild("Flights", """
+      CREATE TABLE IF NOT EXISTS Flights (
+          FlightID INTEGER PRIMARY KEY AUTOINCREMENT,
+          FlightNumber VARCHAR(30) NOT NULL,
+          Status VARCHAR(15) CHECK (Status IN ('On Time', 'Delayed', 'Cancelled', 'Boarding',
+                                               'in-Flight', 'Landed', 'No Show', 'Closed')),
+          OriginAirport VARCHAR(20) REFERENCES Destination(AirportCode),
+          DestinationAirport VARCHAR(20) REFERENCES Destination(AirportCode)
+      );
+      """),
+  Migration(2, "Index flight status, airports and pilot assignments")
+    .execute("CREATE INDEX IF NOT EXISTS idx_flights_status ON Flights (Status)", "Flights")
+    .execute("CREATE INDEX IF NOT EXISTS idx_flights_origin ON Flights (OriginAirport)", "Flights")
+    .execute("CREATE INDEX IF NOT EXISTS idx_flights_destination ON Flights (DestinationAirport)", "Flights")
+    .execute("CREATE INDEX IF NOT EXISTS idx_flightpilot_pilot ON FlightPilot (PilotID)", "FlightPilot"),
+  # A flight is active until it has Landed or is Closed; the triggers keep both counters exact for every writer.
+  Migration(3, "Keep per-pilot assignment and active-flight counters")
+    .execute("""
+      CREATE TABLE IF NOT EXISTS PilotWorkload (
+      PilotID INTEGER PRIMARY KEY REFERENCES Pilot(PilotID) ON DELETE CASCADE,
+      TotalAssignments INTEGER NOT NULL DEFAULT 0,
+      ActiveFlights INTEGER NOT NULL DEFAULT 0)
+      """)
+    .execute("DELETE FROM PilotWorkload")
+    .execute("""
+      INSERT INTO PilotWorkload (PilotID, TotalAssignments, ActiveFlights)
+      SELECT Pilot.PilotID, COUNT(FlightPilot.FlightID),
+             COUNT(CASE WHEN Flights.FlightID IS NOT NULL AND IFNULL(Flights.Status, '') NOT IN ('Landed', 'Closed') THEN 1 END)
+      FROM Pilot
+      LEFT JOIN FlightPilot ON FlightPilot.PilotID = Pilot.PilotID
+      LEFT JOIN Flights ON Flights.FlightID = FlightPilot.FlightID
+      GROUP BY Pilot.PilotID
+      """, "FlightPilot")
+    .execute("CREATE INDEX IF NOT EXISTS idx_pilotworkload_load ON PilotWorkload (ActiveFlights, TotalAssignments)")
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS workload_pilot_insert AFTER INSERT ON Pilot BEGIN
+        INSERT OR IGNORE INTO PilotWorkload (PilotID) VALUES (NEW.PilotID);
+      END
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS workload_assign AFTER INSERT ON FlightPilot BEGIN
+        UPDATE PilotWorkload SET TotalAssignments = TotalAssignments + 1,
+          ActiveFlights = ActiveFlights + (SELECT COUNT(*) FROM Flights
+            WHERE FlightID = NEW.FlightID AND IFNULL(Status, '') NOT IN ('Landed', 'Closed'))
+        WHERE PilotID = NEW.PilotID;
+      END
+      """)
+    # When a flight is deleted its active assignments are released here, before the
+    # cascade removes the FlightPilot rows (the flight is already gone by then).
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS workload_unassign AFTER DELETE ON FlightPilot BEGIN
+        UPDATE PilotWorkload SET TotalAssignments = TotalAssignments - 1,
+          ActiveFlights = ActiveFlights - (SELECT COUNT(*) FROM Flights
+            WHERE FlightID = OLD.FlightID AND IFNULL(Status, '') NOT IN ('Landed', 'Closed'))
+        WHERE PilotID = OLD.PilotID;
+      END
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS workload_flight_delete BEFORE DELETE ON Flights
+      WHEN IFNULL(OLD.Status, '') NOT IN ('Landed', 'Closed') BEGIN
+        UPDATE PilotWorkload SET ActiveFlights = ActiveFlights - 1
+        WHERE PilotID IN (SELECT PilotID FROM FlightPilot WHERE FlightID = OLD.FlightID);
+      END
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS workload_status AFTER UPDATE OF Status ON Flights
+      WHEN (IFNULL(OLD.Status, '') NOT IN ('Landed', 'Closed')) IS NOT (IFNULL(NEW.Status, '') NOT IN ('Landed', 'Closed')) BEGIN
+        UPDATE PilotWorkload SET ActiveFlights = ActiveFlights
+          + CASE WHEN IFNULL(NEW.Status, '') NOT IN ('Landed', 'Closed') THEN 1 ELSE -1 END
+        WHERE PilotID IN (SELECT PilotID FROM FlightPilot WHERE FlightID = NEW.FlightID);
+      END
+      """),
+  Migration(4, "Index pilot experience for range filters and sorting")
+    .execute("CREATE INDEX IF NOT EXISTS idx_pilot_experience ON Pilot (ExperienceYears)", "Pilot"),
+  # The lookup tables are compiled from FlightStatus; the trigger rejects moves that can never follow the current status.
+  Migration(5, "Add status codes, the status transition table and its guard trigger")
+    .execute("CREATE TABLE IF NOT EXISTS FlightStatus (StatusCode INTEGER PRIMARY KEY, Name VARCHAR(15) NOT NULL UNIQUE)")
+    .execute("""
+      CREATE TABLE IF NOT EXISTS FlightStatusTransition (
+      FromCode INTEGER NOT NULL REFERENCES FlightStatus(StatusCode),
+      ToCode INTEGER NOT NULL REFERENCES FlightStatus(StatusCode),
+      PRIMARY KEY (FromCode, ToCode)) WITHOUT ROWID
+      """)
+    .execute("DELETE FROM FlightStatusTransition")
+    .execute("DELETE FROM FlightStatus")
+    .execute("INSERT INTO FlightStatus (StatusCode, Name) VALUES " + FlightStatus.lookup_rows())
+    .execute("""
+      INSERT INTO FlightStatusTransition (FromCode, ToCode) VALUES (0, 0), (0, 1), (0, 2), (0, 3), (0, 4), (0, 5),
+      (0, 6), (0, 7), (1, 0), (1, 1), (1, 2), (1, 3), (1, 4), (1, 5), (1, 6), (1, 7), (2, 2), (2, 7), (3, 0), (3, 1),
+      (3, 2), (3, 3), (3, 4), (3, 5), (3, 6), (3, 7), (4, 4), (4, 5), (4, 7), (5, 5), (5, 7), (6, 6), (6, 7), (7, 7)
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS flight_status_transition BEFORE UPDATE OF Status ON Flights
+      WHEN OLD.Status IS NOT NEW.Status AND NOT EXISTS (
+        SELECT 1 FROM FlightStatusTransition
+        JOIN FlightStatus AS Old ON Old.StatusCode = FromCode
+        JOIN FlightStatus AS New ON New.StatusCode = ToCode
+        WHERE Old.Name = OLD.Status AND New.Name = NEW.Status)
+      AND OLD.Status IN (SELECT Name FROM FlightStatus) AND NEW.Status IN (SELECT Name FROM FlightStatus) BEGIN
+        SELECT RAISE(ABORT, 'Invalid status transition');
+      END
+      """),
+  # Every update bumps RowVersion, so edits made through any path invalidate an optimistic read.
+  Migration(6, "Add row versions for optimistic concurrency")
+    .rebuild("Destination", """
+      CREATE TABLE IF NOT EXISTS Destination (
+          AirportCode VARCHAR(20) NOT NULL,
+          DestinationName VARCHAR(30) NOT NULL,
+          Country VARCHAR(30),
+          RowVersion INTEGER NOT NULL DEFAULT 0,
+          PRIMARY KEY (AirportCode)
+      );
+      """)
+    .rebuild("Flights", """
+      CREATE TABLE IF NOT EXISTS Flights (
+          FlightID INTEGER PRIMARY KEY AUTOINCREMENT,
+          FlightNumber VARCHAR(30) NOT NULL,
+          Status VARCHAR(15) CHECK (Status IN ('On Time', 'Delayed', 'Cancelled', 'Boarding',
+                                               'in-Flight', 'Landed', 'No Show', 'Closed')),
+          OriginAirport VARCHAR(20) REFERENCES Destination(AirportCode),
+          DestinationAirport VARCHAR(20) REFERENCES Destination(AirportCode),
+          RowVersion INTEGER NOT NULL DEFAULT 0
+      );
+      """)
+    .rebuild("Pilot", """
+      CREATE TABLE IF NOT EXISTS Pilot (
+      PilotID INTEGER PRIMARY KEY AUTOINCREMENT,
+      PilotName VARCHAR (30) NOT NULL,
+      LicenseNumber VARCHAR(30) NOT NULL,
+      ExperienceYears SMALLINT UNSIGNED NOT NULL,
+      RowVersion INTEGER NOT NULL DEFAULT 0);
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS destination_row_version AFTER UPDATE ON Destination
+      WHEN NEW.RowVersion = OLD.RowVersion BEGIN
+        UPDATE Destination SET RowVersion = OLD.RowVersion + 1 WHERE rowid = NEW.rowid;
+      END
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS flights_row_version AFTER UPDATE ON Flights
+      WHEN NEW.RowVersion = OLD.RowVersion BEGIN
+        UPDATE Flights SET RowVersion = OLD.RowVersion + 1 WHERE FlightID = NEW.FlightID;
+      END
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS pilot_row_version AFTER UPDATE ON Pilot
+      WHEN NEW.RowVersion = OLD.RowVersion BEGIN
+        UPDATE Pilot SET RowVersion = OLD.RowVersion + 1 WHERE PilotID = NEW.PilotID;
+      END
+      """),
+  # Per-table write counters let ResultCache drop only the results whose tables changed.
+  count_writes(
+    Migration(7, "Count writes per table for the result cache")
+      .execute("CREATE TABLE IF NOT EXISTS TableWrites (TableName VARCHAR(30) PRIMARY KEY, Writes INTEGER NOT NULL DEFAULT 0)")
+      .execute("INSERT OR IGNORE INTO TableWrites (TableName) VALUES ('Destination'), ('Flights'), ('Pilot'), ('FlightPilot')"),
+    ("Destination", "Flights", "Pilot", "FlightPilot")),
+  # The unique indexes compare without case, so plain "FlightNumber = ?" lookups could not use them and scanned the table.
+  Migration(8, "Index exact flight number and license lookups")
+    .execute("CREATE INDEX IF NOT EXISTS idx_flights_number_exact ON Flights (FlightNumber)", "Flights")
+    .execute("CREATE INDEX IF NOT EXISTS idx_pilot_license_exact ON Pilot (LicenseNumber)", "Pilot"),
+  # Indexes and triggers naming the text columns are dropped first, as the rebuild would recreate them as
+  # they are; they come back keyed on the integer columns, and the workload counters are recounted last.
+  Migration(9, "Key airports and statuses by integer in Flights, read through FlightView")
+    .execute("DROP INDEX IF EXISTS idx_flights_status")
+    .execute("DROP INDEX IF EXISTS idx_flights_origin")
+    .execute("DROP INDEX IF EXISTS idx_flights_destination")
+    .execute("DROP TRIGGER IF EXISTS flight_status_transition")
+    .execute("DROP TRIGGER IF EXISTS workload_assign")
+    .execute("DROP TRIGGER IF EXISTS workload_unassign")
+    .execute("DROP TRIGGER IF EXISTS workload_flight_delete")
+    .execute("DROP TRIGGER IF EXISTS workload_status")
+    .rebuild("Destination", """
+      CREATE TABLE IF NOT EXISTS Destination (
+          DestinationID INTEGER PRIMARY KEY,
+          AirportCode VARCHAR(20) NOT NULL UNIQUE,
+          DestinationName VARCHAR(30) NOT NULL,
+          Country VARCHAR(30),
+          RowVersion INTEGER NOT NULL DEFAULT 0
+      );
+      """)
+    .rebuild("Flights", """
+      CREATE TABLE IF NOT EXISTS Flights (
+          FlightID INTEGER PRIMARY KEY AUTOINCREMENT,
+          FlightNumber VARCHAR(30) NOT NULL,
+          StatusCode INTEGER CHECK (StatusCode >= 0) REFERENCES FlightStatus(StatusCode),
+          OriginAirportID INTEGER REFERENCES Destination(DestinationID),
+          DestinationAirportID INTEGER REFERENCES Destination(DestinationID),
+          RowVersion INTEGER NOT NULL DEFAULT 0
+      );
+      """, {
+      "StatusCode": "(SELECT StatusCode FROM FlightStatus WHERE Name = @row.Status)",
+      "OriginAirportID": "(SELECT DestinationID FROM Destination WHERE AirportCode = @row.OriginAirport)",
+      "DestinationAirportID": "(SELECT DestinationID FROM Destination WHERE AirportCode = @row.DestinationAirport)",
+    })
+    .execute("CREATE INDEX IF NOT EXISTS idx_flights_status_code ON Flights (StatusCode)", "Flights")
+    .execute("CREATE INDEX IF NOT EXISTS idx_flights_origin_id ON Flights (OriginAirportID)", "Flights")
+    .execute("CREATE INDEX IF NOT EXISTS idx_flights_destination_id ON Flights (DestinationAirportID)", "Flights")
+    .execute("""
+      CREATE VIEW IF NOT EXISTS FlightView AS
+      SELECT Flights.FlightID, Flights.FlightNumber, FlightStatus.Name AS Status,
+             Origin.AirportCode AS OriginAirport, Arrival.AirportCode AS DestinationAirport, Flights.RowVersion
+      FROM Flights
+      LEFT JOIN FlightStatus ON FlightStatus.StatusCode = Flights.StatusCode
+      LEFT JOIN Destination AS Origin ON Origin.DestinationID = Flights.OriginAirportID
+      LEFT JOIN Destination AS Arrival ON Arrival.DestinationID = Flights.DestinationAirportID
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS flight_status_transition BEFORE UPDATE OF StatusCode ON Flights
+      WHEN OLD.StatusCode IS NOT NEW.StatusCode AND NOT EXISTS (
+        SELECT 1 FROM FlightStatusTransition WHERE FromCode = OLD.StatusCode AND ToCode = NEW.StatusCode)
+      AND OLD.StatusCode IN (SELECT StatusCode FROM FlightStatus) AND NEW.StatusCode IN (SELECT StatusCode FROM FlightStatus) BEGIN
+        SELECT RAISE(ABORT, 'Invalid status transition');
+      END
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS workload_assign AFTER INSERT ON FlightPilot BEGIN
+        UPDATE PilotWorkload SET TotalAssignments = TotalAssignments + 1,
+          ActiveFlights = ActiveFlights + (SELECT COUNT(*) FROM Flights WHERE FlightID = NEW.FlightID
+            AND IFNULL(StatusCode, -1) NOT IN (SELECT StatusCode FROM FlightStatus WHERE Name IN ('Landed', 'Closed')))
+        WHERE PilotID = NEW.PilotID;
+      END
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS workload_unassign AFTER DELETE ON FlightPilot BEGIN
+        UPDATE PilotWorkload SET TotalAssignments = TotalAssignments - 1,
+          ActiveFlights = ActiveFlights - (SELECT COUNT(*) FROM Flights WHERE FlightID = OLD.FlightID
+            AND IFNULL(StatusCode, -1) NOT IN (SELECT StatusCode FROM FlightStatus WHERE Name IN ('Landed', 'Closed')))
+        WHERE PilotID = OLD.PilotID;
+      END
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS workload_flight_delete BEFORE DELETE ON Flights
+      WHEN IFNULL(OLD.StatusCode, -1) NOT IN (SELECT StatusCode FROM FlightStatus WHERE Name IN ('Landed', 'Closed')) BEGIN
+        UPDATE PilotWorkload SET ActiveFlights = ActiveFlights - 1
+        WHERE PilotID IN (SELECT PilotID FROM FlightPilot WHERE FlightID = OLD.FlightID);
+      END
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS workload_status AFTER UPDATE OF StatusCode ON Flights
+      WHEN (IFNULL(OLD.StatusCode, -1) NOT IN (SELECT StatusCode FROM FlightStatus WHERE Name IN ('Landed', 'Closed')))
+        IS NOT (IFNULL(NEW.StatusCode, -1) NOT IN (SELECT StatusCode FROM FlightStatus WHERE Name IN ('Landed', 'Closed'))) BEGIN
+        UPDATE PilotWorkload SET ActiveFlights = ActiveFlights
+          + CASE WHEN IFNULL(NEW.StatusCode, -1) NOT IN (SELECT StatusCode FROM FlightStatus WHERE Name IN ('Landed', 'Closed')) THEN 1 ELSE -1 END
+        WHERE PilotID IN (SELECT PilotID FROM FlightPilot WHERE FlightID = NEW.FlightID);
+      END
+      """)
+    .execute("""
+      UPDATE PilotWorkload SET
+        TotalAssignments = (SELECT COUNT(*) FROM FlightPilot WHERE FlightPilot.PilotID = PilotWorkload.PilotID),
+        ActiveFlights = (SELECT COUNT(*) FROM FlightPilot JOIN FlightView ON FlightView.FlightID = FlightPilot.FlightID
+                         WHERE FlightPilot.PilotID = PilotWorkload.PilotID AND IFNULL(FlightView.Status, '') NOT IN ('Landed', 'Closed'))
+      """, "PilotWorkload"),
+  # Occurrences of a schedule are generated on demand; only the days with their own status or pilots are stored.
+  # Every status can be reached from the implicit first status, so only later changes of a day are checked.
+  Migration(10, "Add recurring flight schedules and per-day occurrence state")
+    .execute("""
+      CREATE TABLE IF NOT EXISTS FlightSchedule (
+      ScheduleID INTEGER PRIMARY KEY,
+      FlightID INTEGER NOT NULL REFERENCES Flights(FlightID) ON DELETE CASCADE,
+      DaysOfWeek VARCHAR(7) NOT NULL CONSTRAINT valid_days CHECK (DaysOfWeek <> '' AND DaysOfWeek NOT GLOB '*[^1-7]*'),
+      ValidFrom DATE NOT NULL,
+      ValidTo DATE NOT NULL,
+      CONSTRAINT valid_period CHECK (ValidFrom <= ValidTo))
+      """)
+    .execute("""
+      CREATE TABLE IF NOT EXISTS FlightOccurrence (
+      FlightID INTEGER NOT NULL REFERENCES Flights(FlightID) ON DELETE CASCADE,
+      FlightDate DATE NOT NULL,
+      StatusCode INTEGER NOT NULL CHECK (StatusCode >= 0) REFERENCES FlightStatus(StatusCode),
+      PRIMARY KEY (FlightID, FlightDate)) WITHOUT ROWID
+      """)
+    .execute("""
+      CREATE TABLE IF NOT EXISTS OccurrencePilot (
+      FlightID INTEGER NOT NULL REFERENCES Flights(FlightID) ON DELETE CASCADE,
+      FlightDate DATE NOT NULL,
+      PilotID INTEGER NOT NULL REFERENCES Pilot(PilotID) ON DELETE CASCADE,
+      PRIMARY KEY (FlightID, FlightDate, PilotID)) WITHOUT ROWID
+      """)
+    .execute("CREATE INDEX IF NOT EXISTS idx_flightschedule_flight ON FlightSchedule (FlightID)", "FlightSchedule")
+    .execute("CREATE INDEX IF NOT EXISTS idx_flightoccurrence_date ON FlightOccurrence (FlightDate)", "FlightOccurrence")
+    .execute("CREATE INDEX IF NOT EXISTS idx_occurrencepilot_date ON OccurrencePilot (FlightDate)", "OccurrencePilot")
+    .execute("CREATE INDEX IF NOT EXISTS idx_occurrencepilot_pilot ON OccurrencePilot (PilotID, FlightDate)", "OccurrencePilot")
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS occurrence_status_transition BEFORE UPDATE OF StatusCode ON FlightOccurrence
+      WHEN OLD.StatusCode IS NOT NEW.StatusCode AND NOT EXISTS (
+        SELECT 1 FROM FlightStatusTransition WHERE FromCode = OLD.StatusCode AND ToCode = NEW.StatusCode)
+      AND NEW.StatusCode IN (SELECT StatusCode FROM FlightStatus) BEGIN
+        SELECT RAISE(ABORT, 'Invalid status transition');
+      END
+      """),
+  # Airports with a position are kept in an R*Tree of point boxes, so nearby searches visit only the
+  # index pages around the airport; the triggers follow every change of a position.
+  Migration(11, "Add airport positions and an R*Tree index over them")
+    .rebuild("Destination", """
+      CREATE TABLE IF NOT EXISTS Destination (
+          DestinationID INTEGER PRIMARY KEY,
+          AirportCode VARCHAR(20) NOT NULL UNIQUE,
+          DestinationName VARCHAR(30) NOT NULL,
+          Country VARCHAR(30),
+          RowVersion INTEGER NOT NULL DEFAULT 0,
+          Latitude REAL CONSTRAINT valid_latitude CHECK (Latitude BETWEEN -90 AND 90),
+          Longitude REAL CONSTRAINT valid_longitude CHECK (Longitude BETWEEN -180 AND 180)
+      );
+      """)
+    .execute("CREATE VIRTUAL TABLE IF NOT EXISTS DestinationGeo USING rtree(DestinationID, MinLatitude, MaxLatitude, MinLongitude, MaxLongitude)")
+    .execute("""
+      INSERT OR REPLACE INTO DestinationGeo SELECT DestinationID, Latitude, Latitude, Longitude, Longitude
+      FROM Destination WHERE Latitude IS NOT NULL AND Longitude IS NOT NULL
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS destination_geo_insert AFTER INSERT ON Destination
+      WHEN NEW.Latitude IS NOT NULL AND NEW.Longitude IS NOT NULL BEGIN
+        INSERT OR REPLACE INTO DestinationGeo VALUES (NEW.DestinationID, NEW.Latitude, NEW.Latitude, NEW.Longitude, NEW.Longitude);
+      END
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS destination_geo_update AFTER UPDATE OF Latitude, Longitude ON Destination BEGIN
+        DELETE FROM DestinationGeo WHERE DestinationID = OLD.DestinationID;
+        INSERT INTO DestinationGeo SELECT NEW.DestinationID, NEW.Latitude, NEW.Latitude, NEW.Longitude, NEW.Longitude
+        WHERE NEW.Latitude IS NOT NULL AND NEW.Longitude IS NOT NULL;
+      END
+      """)
+    .execute("""
+      CREATE TRIGGER IF NOT EXISTS destination_geo_delete AFTER DELETE ON Destination BEGIN
+        DELETE FROM DestinationGeo WHERE DestinationID = OLD.DestinationID;
+      END
+      """),
+  # Version 5 stored every move reachable through a chain, so writers other than the menu could skip steps
+  # (On Time straight to Landed); the table now holds the direct moves of FlightStatus.transitions only.
+  Migration(12, "Allow only direct status moves in FlightStatusTransition")
+    .execute("DELETE FROM FlightStatusTransition")
+    .execute("""
+      INSERT INTO FlightStatusTransition (FromCode, ToCode) VALUES (0, 0), (0, 1), (0, 2), (0, 3), (0, 6), (1, 0),
+      (1, 1), (1, 2), (1, 3), (1, 6), (2, 2), (2, 7), (3, 1), (3, 2), (3, 3), (3, 4), (4, 4), (4, 5), (5, 5), (5, 7),
+      (6, 6), (6, 7), (7, 7)
+      """),
+  # Version 11 added the columns but only newly seeded databases got positions; this fills them in for the
+  # sample airports of an upgraded database, leaving any position already set. The geo triggers index them.
+  Migration(13, "Fill in positions of the sample airports")
+    .execute("""
+      UPDATE Destination SET Latitude = Position.column1, Longitude = Position.column2
+      FROM (VALUES (51.470, -0.454, 'HRL'), (51.148, -0.190, 'GTW'), (40.640, -73.779, 'NYC'), (33.942, -118.408, 'CAL'),
+                   (40.080, 116.585, 'PEK'), (31.143, 121.805, 'PVG'), (31.198, 121.336, 'SHA'), (23.392, 113.299, 'CAN'),
+                   (39.509, 116.411, 'PKX'), (40.472, -3.561, 'MAD'), (35.857, 14.477, 'MLA'), (25.253, 55.364, 'DXB'),
+                   (14.671, -17.073, 'DSS'), (40.899, 29.309, 'SAW'), (37.936, 23.947, 'ATH')) AS Position
+      WHERE Destination.AirportCode = Position.column3 AND Destination.Latitude IS NULL AND Destination.Longitude IS NULL
+      """, "Destination"),
+]
+
+
+class QueryBuilder:
+  """Composable, parameterised SELECT over Flights, Pilot or Destination with keyset pagination.
+
+  Filters are AND-ed together; column names and operators are checked against whitelists, and every
+  value is passed as a parameter. Pages are fetched by seeking past the (sort column, key) of the last
+  row seen, so page 1000 costs the same as page 1.
+  """
+  # Columns per table: the unique key used to break ties, the filterable columns and the indexed ones for ORDER BY.
+  # Flights' Status and airport codes come through FlightView's joins, which no index orders, so they only filter.
+  tables = {
+    "Flights": ("FlightID", ("FlightID", "FlightNumber", "Status", "OriginAirport", "DestinationAirport"),
+                ("FlightID", "FlightNumber")),
+    "Pilot": ("PilotID", ("PilotID", "PilotName", "LicenseNumber", "ExperienceYears"),
+              ("PilotID", "LicenseNumber", "ExperienceYears")),
+    "Destination": ("AirportCode", ("AirportCode", "DestinationName", "Country"), ("AirportCode",)),
+  }
+  # Tables read through a view that exposes their columns by name.
+  sources = {"Flights": "FlightView"}
+  operators = ("=", "!=", "<", "<=", ">", ">=", "LIKE", "IN")
+  max_limit = 10000
+
+  def __init__(self, table):
+    if table not in self.tables:
+      raise ValueError("Unknown table: " + str(table))
+    self.table = table
+    self.key, self.columns, self.sortable = self.tables[table]
+    self.filters = []
+    self.sort_column = self.key
+    self.descending = False
+    self.page_size = 100
+    self.cursor = None
+
+  def where(self, column, operator, value):
+    """Add a filter; IN takes a list of values."""
+    operator = operator.upper()
+    if column not in self.columns:
+      raise ValueError("Cannot filter " + self.table + " on " + str(column))
+    if operator not in self.operators:
+      raise ValueError("Unknown operator: " + operator)
+    if operator == "IN" and (isinstance(value, str) or not value):
+      raise ValueError("IN needs a non-empty list of values")
+    self.filters.append((column, operator, value))
+    return self
+
+  def between(self, column, low=None, high=None):
+    """Add an inclusive range filter; either bound may be left open."""
+    if low is not None:
+      self.where(column, ">=", low)
+    if high is not None:
+      self.where(column, "<=", high)
+    return self
+
+  def order_by(self, column, descending=False):
+    """Sort by an indexed column; the table key breaks ties."""
+    if column not in self.sortable:
+      raise ValueError("Cannot sort " + self.table + " by " + str(column))
+    self.sort_column = column
+    self.descending = descending
+    return self
+
+  def limit(self, page_size):
+    """Set the number of rows per page."""
+    page_size = int(page_size)
+    if not 0 < page_size <= self.max_limit:
+      raise ValueError("Page size must be between 1 and " + str(self.max_limit))
+    self.page_size = page_size
+    return self
+
+  def after(self, cursor):
+    """Continue after the cursor returned with the previous page (None starts from the top)."""
+    self.cursor = cursor
+    return self
+
+  def build(self):
+    """Return (sql, params) for the current page."""
+    clauses, params = [], []
+    for column, operator, value in self.filters:
+      if operator == "IN":
+        clauses.append(column + " IN (" + ", ".join("?" * len(value)) + ")")
+        params.extend(value)
+      else:
+        clauses.append(column + " " + operator + " ?")
+        params.append(value)
+    if self.cursor is not None:
+      clauses.append(self.seek_clause(params))
+    direction = " DESC" if self.descending else ""
+    order = self.sort_column + direction
+    if self.sort_column != self.key:
+      order += ", " + self.key + direction
+    sql = "SELECT " + ", ".join(self.columns) + " FROM " + self.sources.get(self.table, self.table)
+    if clauses:
+      sql += " WHERE " + " AND ".join(clauses)
+    sql += " ORDER BY " + order + " LIMIT ?"
+    params.append(self.page_size)
+    return sql, params
+
+  def seek_clause(self, params):
+    """Return the predicate that skips every row up to and including the cursor."""
+    sort_value, key_value = self.cursor
+    compare = "<" if self.descending else ">"
+    if self.sort_column == self.key:
+      params.append(key_value)
+      return self.key + " " + compare + " ?"
+    column, key = self.sort_column, self.key
+    # NULLs sort first ascending and last descending, so they need their own branch
+    if sort_value is None:
+      params.append(key_value)
+      if self.descending:
+        return "(" + column + " IS NULL AND " + key + " < ?)"
+      return "((" + column + " IS NULL AND " + key + " > ?) OR " + column + " IS NOT NULL)"
+    params.extend((sort_value, key_value))
+    clause = "(" + column + ", " + key + ") " + compare + " (?, ?)"
+    if self.descending:
+      clause = "(" + clause + " OR " + column + " IS NULL)"
+    return clause
+
+  def next_cursor(self, rows, description):
+    """Return the cursor for the page after rows, or None if rows was the last page."""
+    if len(rows) < self.page_size:
+      return None
+    names = [column[0] for column in description]
+    last = rows[-1]
+    return (last[names.index(self.sort_column)], last[names.index(self.key)])
 
 
 class DestinationInfo:
@@ -1186,9 +5308,146 @@ class PilotInfo:
     return self.pilotName + "\n" + self.licenseNumber + "\n" + self.experienceYears
 
 
+class RowWriter(abc.ABC):
+  """Writes query rows to a binary stream in large blocks; subclasses choose the format."""
+  # Rows fetched and encoded per block, and the buffer size used for output files.
+  block_rows = 4096
+  buffer_size = 1 << 20
+
+  def __init__(self, stream, columns):
+    self.stream = stream
+    self.columns = columns
+    self.row_count = 0
+    self.start()
+
+  def start(self):
+    """Write anything that comes before the first row."""
+    pass
+
+  def write_rows(self, rows):
+    """Encode a block of rows and write it with a single call."""
+    self.stream.write(self.encode(rows))
+    self.row_count += len(rows)
+
+  @abc.abstractmethod
+  def encode(self, rows):
+    """Return the bytes for a block of rows."""
+
+  def close(self):
+    """Write anything that comes after the last row."""
+    pass
+
+
+class TsvWriter(RowWriter):
+  """Tab-separated values, one row per line, no header."""
+  def encode(self, rows):
+    return "".join("\t".join("" if value is None else str(value) for value in row) + "\n"
+                   for row in rows).encode("utf-8")
+
+
+class CsvWriter(RowWriter):
+  """Comma-separated values with a header row."""
+  def start(self):
+    self.stream.write(self.encode([self.columns]))
+
+  def encode(self, rows):
+    text = io.StringIO()
+    csv.writer(text, lineterminator="\n").writerows(rows)
+    return text.getvalue().encode("utf-8")
+
+
+class JsonLinesWriter(RowWriter):
+  """One JSON object per row, keyed by column name."""
+  def encode(self, rows):
+    columns = self.columns
+    return "".join(json.dumps(dict(zip(columns, row))) + "\n" for row in rows).encode("utf-8")
+
+
+class ColumnarWriter(RowWriter):
+  """Column-oriented binary record batches, in the spirit of Arrow IPC.
+
+  The stream starts with the magic bytes, then holds one batch per block: row and column counts
+  (two uint32), then per column its name (uint16 length + UTF-8), a type byte (i = int64,
+  f = float64, s = UTF-8 string), a validity bitmap with one bit per row, and the values, which for
+  strings are (rows + 1) uint32 offsets followed by the string bytes. A batch of zero rows ends the stream.
+  """
+  magic = b"ALMCOL1\n"
+
+  def start(self):
+    self.stream.write(self.magic)
+
+  def encode(self, rows):
+    parts = [struct.pack("<II", len(rows), len(self.columns))]
+    for index, name in enumerate(self.columns):
+      values = [row[index] for row in rows]
+      valid = bytearray((len(values) + 7) // 8)
+      for position, value in enumerate(values):
+        if value is not None:
+          valid[position >> 3] |= 1 << (position & 7)
+      present = [value for value in values if value is not None]
+      if all(type(value) is int for value in present):
+        kind, data = b"i", array("q", [0 if value is None else value for value in values]).tobytes()
+      elif all(type(value) in (int, float) for value in present):
+        kind, data = b"f", array("d", [0.0 if value is None else value for value in values]).tobytes()
+      else:
+        encoded = [b"" if value is None else str(value).encode("utf-8") for value in values]
+        offsets = array("I", [0])
+        for item in encoded:
+          offsets.append(offsets[-1] + len(item))
+        kind, data = b"s", offsets.tobytes() + b"".join(encoded)
+      name_bytes = name.encode("utf-8")
+      parts += [struct.pack("<H", len(name_bytes)), name_bytes, kind, bytes(valid), data]
+    return b"".join(parts)
+
+  def close(self):
+    self.stream.write(struct.pack("<II", 0, 0))
+
+
+def read_columnar(stream):
+  """Yield the rows of a stream written by ColumnarWriter as tuples."""
+  if stream.read(len(ColumnarWriter.magic)) != ColumnarWriter.magic:
+    raise ValueError("Not a columnar result stream")
+  while True:
+    row_count, column_count = struct.unpack("<II", stream.read(8))
+    if row_count == 0:
+      return
+    columns = []
+    for _ in range(column_count):
+      name_length, = struct.unpack("<H", stream.read(2))
+      stream.read(name_length)
+      kind = stream.read(1)
+      valid = stream.read((row_count + 7) // 8)
+      if kind == b"s":
+        offsets = array("I")
+        offsets.frombytes(stream.read(4 * (row_count + 1)))
+        data = stream.read(offsets[-1])
+        values = [data[offsets[i]:offsets[i + 1]].decode("utf-8") for i in range(row_count)]
+      else:
+        values = array("q" if kind == b"i" else "d")
+        values.frombytes(stream.read(8 * row_count))
+      columns.append([value if valid[i >> 3] >> (i & 7) & 1 else None for i, value in enumerate(values)])
+    yield from zip(*columns)
+
+
+# Writers selectable with --format, by name.
+output_writers = {
+  "tsv": TsvWriter,
+  "csv": CsvWriter,
+  "jsonl": JsonLinesWriter,
+  "columnar": ColumnarWriter,
+}
+
+
 # The main function will parse arguments.
 # These argument will be definded by the users on the console.
 # The user will select a choice from the menu to interact with the database.
+def read_choice(prompt="Enter your choice: "):
+  """Read a menu number, returning 0 (an invalid choice) for anything that is not a number."""
+  try:
+    return int(input(prompt))
+  except ValueError:
+    return 0
+
 def menu():
   """Display the main menu options for managing flights, pilots, and destinations."""
   print("\n Menu:")
@@ -1208,7 +5467,9 @@ def menu():
   print(" 13. View Destination by Criteria")
   print(" 14. Update Destination Information")
   print(" 15. Delete a Destination")
-  print(" 16.Exit\n")
+  print(" 16. Database Maintenance")
+  print(" 17. Flight Schedules")
+  print(" 18.Exit\n")
 
 def viewdestinations():
   """Display options to view destinations based on different criteria."""
@@ -1218,17 +5479,26 @@ def viewdestinations():
   print(" 2. City of Destination")
   print(" 3. Country")
   print(" 4. All Destination Info")
-  print(" 5. Back\n")
-  __choose_flights = int(input("Enter your choice: "))
+  print(" 5. Nearest Airports")
+  print(" 6. Airports Within a Distance")
+  print(" 7. Route Distances of All Flights")
+  print(" 8. Back\n")
+  __choose_flights = read_choice()
   if __choose_flights == 1:
-    db_ops.search_destination("AirportCode")# Search by Airport Code
+    db_ops.run_guarded(db_ops.search_destination, "AirportCode")# Search by Airport Code
   elif __choose_flights == 2:
-    db_ops.search_destination("DestinationName")# Search by Destination Name
+    db_ops.run_guarded(db_ops.search_destination, "DestinationName")# Search by Destination Name
   elif __choose_flights == 3:
-    db_ops.search_destination("Country")# Search by Country
+    db_ops.run_guarded(db_ops.search_destination, "Country")# Search by Country
   elif __choose_flights == 4:
-    db_ops.view_destination_all()# View all destinations
+    db_ops.run_guarded(db_ops.view_destination_all)# View all destinations
   elif __choose_flights == 5:
+    db_ops.run_guarded(db_ops.view_nearest_airports)# Alternates for a diversion
+  elif __choose_flights == 6:
+    db_ops.run_guarded(db_ops.view_airports_within)
+  elif __choose_flights == 7:
+    db_ops.run_guarded(db_ops.view_route_distances)
+  elif __choose_flights == 8:
     menu()# Return to main menu
   else:
     print("Invalid Choice")
@@ -1242,19 +5512,22 @@ def viewflights():
   print(" 3. Origin Airport")
   print(" 4. Destination Airport")
   print(" 5. All Flights Info")
-  print(" 6. Back\n")
-  __choose_flights = int(input("Enter your choice: "))
+  print(" 6. Filter, Sort and Page Flights")
+  print(" 7. Back\n")
+  __choose_flights = read_choice()
   if __choose_flights == 1:
-    db_ops.view_flight_number()
+    db_ops.run_guarded(db_ops.view_flight_number)
   elif __choose_flights == 2:
-    db_ops.view_flight_status()
+    db_ops.run_guarded(db_ops.view_flight_status)
   elif __choose_flights == 3:
-    db_ops.view_flight_origin()
+    db_ops.run_guarded(db_ops.view_flight_origin)
   elif __choose_flights == 4:
-    db_ops.view_flight_destination()
+    db_ops.run_guarded(db_ops.view_flight_destination)
   elif __choose_flights == 5:
-    db_ops.view_flight_all()
+    db_ops.run_guarded(db_ops.view_flight_all)
   elif __choose_flights == 6:
+    db_ops.run_guarded(db_ops.browse_flights)
+  elif __choose_flights == 7:
     menu()# Return to the main menu
   else:
     print("Invalid Choice")
@@ -1270,17 +5543,17 @@ def viewpilots():
   print(" 5. All Pilots Info")
   print(" 6. Back\n")
 
-  __choose = int(input("Enter your choice: "))
+  __choose = read_choice()
   if __choose == 1:
-    db_ops.search_pilot("PilotName")
+    db_ops.run_guarded(db_ops.search_pilot, "PilotName")
   elif __choose == 2:
-    db_ops.search_pilot("LicenseNumber")
+    db_ops.run_guarded(db_ops.search_pilot, "LicenseNumber")
   elif __choose == 3:
-    db_ops.search_pilot_years(">")
+    db_ops.run_guarded(db_ops.search_pilot_years, ">")
   elif __choose == 4:
-   db_ops.search_pilot_years("<>")
+   db_ops.run_guarded(db_ops.search_pilot_years, "<>")
   elif __choose == 5:
-    db_ops.view_pilot_all()
+    db_ops.run_guarded(db_ops.view_pilot_all)
   elif __choose == 6:
     menu()# Return to the main menu
   else:
@@ -1292,26 +5565,278 @@ def viewpilotflight():
   print("**********")
   print(" 1. View One Pilot Schedule")
   print(" 2. All Pilot to Flight")
-  print(" 3. Back\n")
+  print(" 3. Least Loaded Pilots")
+  print(" 4. Auto-assign Pilots to Unstaffed Flights")
+  print(" 5. Back\n")
 
-  __choose = int(input("Enter your choice: "))
+  __choose = read_choice()
   if __choose == 1:
-    db_ops.search_pilot_flight()
+    db_ops.run_guarded(db_ops.search_pilot_flight)
   elif __choose == 2:
-    db_ops.view_pilot_flight_all()
+    db_ops.run_guarded(db_ops.view_pilot_flight_all)
   elif __choose == 3:
+    db_ops.run_guarded(db_ops.view_pilot_workload)
+  elif __choose == 4:
+    db_ops.auto_assign_pilots()
+  elif __choose == 5:
+    menu()# Return to the main menu
+  else:
+    print("Invalid Choice")
+
+def maintenance():
+  """Display database maintenance commands."""
+  print("\n Database Maintenance:")
+  print("**********")
+  print(" 1. Health Check")
+  print(" 2. Online Backup")
+  print(" 3. Enable Incremental Vacuum")
+  print(" 4. Release Free Pages")
+  print(" 5. Update Statistics")
+  print(" 6. Schema Migration Dry Run")
+  print(" 7. Hot Tier Consistency Check")
+  print(" 8. Back\n")
+
+  __choose = read_choice()
+  if __choose == 1:
+    db_ops.health_report()
+  elif __choose == 2:
+    db_ops.backup_database(input("Please Enter Backup File Name: ").strip())
+  elif __choose == 3:
+    db_ops.enable_incremental_vacuum()
+  elif __choose == 4:
+    db_ops.incremental_vacuum()
+  elif __choose == 5:
+    db_ops.analyze_database(full=True)
+  elif __choose == 6:
+    db_ops.migrate(dry_run=True)
+  elif __choose == 7:
+    if isinstance(db_ops, HotTierOperations):
+      db_ops.check_hot_tier()
+    else:
+      print("The hot tier is not enabled; start with --hot-tier")
+  elif __choose == 8:
+    menu()# Return to the main menu
+  else:
+    print("Invalid Choice")
+
+def schedules():
+  """Display options for recurring flight schedules and their per-day state."""
+  print("\n Flight Schedules:")
+  print("**********")
+  print(" 1. Add a Schedule to a Flight")
+  print(" 2. View Timetable for Dates")
+  print(" 3. Set Flight Status for One Day")
+  print(" 4. Assign Pilot for One Day")
+  print(" 5. Remove Pilot from One Day")
+  print(" 6. Back\n")
+
+  __choose = read_choice()
+  if __choose == 1:
+    db_ops.add_schedule()
+  elif __choose == 2:
+    db_ops.run_guarded(db_ops.view_timetable)
+  elif __choose == 3:
+    db_ops.set_day_status()
+  elif __choose == 4:
+    db_ops.assign_day_pilot()
+  elif __choose == 5:
+    db_ops.assign_day_pilot(remove=True)
+  elif __choose == 6:
     menu()# Return to the main menu
   else:
     print("Invalid Choice")
 # Initialize database operations
 db_ops = DBOperations()
+db_ops.install_template()# Copy the pre-built database into place on first start
 db_ops.create_table()# Create necessary tables
 db_ops.insert_test_data()# Insert sample data
+# Run a command script instead of the menu when --batch is given
+def positive_int(text):
+  """argparse type for counts that must be at least 1."""
+  value = int(text)
+  if value < 1:
+    raise argparse.ArgumentTypeError("must be at least 1, not " + text)
+  return value
+
+
+def non_negative_int(text):
+  """argparse type for counts that may be 0 but not negative."""
+  value = int(text)
+  if value < 0:
+    raise argparse.ArgumentTypeError("must not be negative, not " + text)
+  return value
+
+
+parser = argparse.ArgumentParser(description="Flight and pilot management database")
+parser.add_argument("--batch", metavar="FILE", help="run commands from FILE ('-' reads standard input)")
+parser.add_argument("--commit-every", type=positive_int, default=500, help="writes per transaction in batch mode")
+parser.add_argument("--format", default="text", choices=["text"] + sorted(output_writers),
+                    help="output format for view commands")
+parser.add_argument("--output", metavar="FILE", help="append view results to FILE instead of standard output")
+parser.add_argument("--write-queue", choices=["commit", "enqueue"],
+                    help="apply writes on a group-commit writer thread, acknowledging on commit or on enqueue")
+parser.add_argument("--ingest", metavar="SOURCE",
+                    help="apply status events from SOURCE: '-' for stdin, unix:PATH for a socket, or a file to tail")
+parser.add_argument("--ingest-window", type=float, default=0.5, help="seconds of events coalesced per batch")
+parser.add_argument("--hot-tier", action="store_true",
+                    help="load every table into memory at startup and serve views from it, writing through to SQLite")
+parser.add_argument("--snapshot", metavar="FILE",
+                    help="start --hot-tier from this binary snapshot when it matches the database, rewriting it when it does not")
+parser.add_argument("--snapshot-replica", action="store_true",
+                    help="serve views and searches from a read-only, memory-mapped snapshot of the database")
+parser.add_argument("--replica-in-memory", action="store_true", help="copy the --snapshot-replica database into memory")
+parser.add_argument("--replica-refresh", type=float, default=0, metavar="SECONDS",
+                    help="swap in a fresh --snapshot-replica every SECONDS (0 keeps the first one)")
+shards = parser.add_argument_group("sharding")
+shards.add_argument("--shards", metavar="NAME=FILE,...",
+                    help="keep flights in these shard files, routed by airline prefix or tenant")
+shards.add_argument("--shard-reference", default="AirlineReference.db", metavar="FILE",
+                    help="reference database holding the destinations and the shard map shared by every shard")
+shards.add_argument("--tenant", metavar="KEY",
+                    help="run the menu or --batch on the shard of this tenant (shard name) or airline prefix")
+shards.add_argument("--rebalance", metavar="PREFIX=SHARD", help="move an airline's flights to another shard, then exit")
+shards.add_argument("--shard-report", action="store_true",
+                    help="print the flights of every shard, then their counts per airline, then exit")
+parser.add_argument("--board", metavar="ADDRESS",
+                    help="serve live departure/arrival boards on unix:PATH or HOST:PORT (SSE at /boards/AIRPORT,...)")
+parser.add_argument("--board-poll", type=float, default=0.5, help="seconds between checks for flight writes by other processes")
+parser.add_argument("--maintenance-interval", type=float, default=0, metavar="SECONDS",
+                    help="release free pages and refresh statistics every SECONDS in the background (0 disables)")
+parser.add_argument("--cache-entries", type=int, default=0, metavar="N",
+                    help="cache up to N read results until the tables they read change (0 disables)")
+parser.add_argument("--coalesce", action="store_true",
+                    help="let identical concurrent reads share one execution (also applies to --stress readers)")
+parser.add_argument("--load-fixture", action="append", default=[], metavar="CSV",
+                    help="load a CSV fixture named after its table (e.g. Pilot.csv) in one transaction, then exit; may be repeated")
+parser.add_argument("--create-template", action="store_true",
+                    help="write a migrated, seeded " + DBOperations.template_path + " that first starts copy into place, then exit")
+parser.add_argument("--check-upgrade", metavar="FILE",
+                    help="migrate a copy of the database FILE and check it against a newly created one, then exit")
+stress = parser.add_argument_group("stress test")
+stress.add_argument("--stress", action="store_true", help="run the concurrency stress harness on a generated database")
+stress.add_argument("--stress-db", default="stress.db", help="database file generated for the stress test")
+stress.add_argument("--stress-flights", type=int, default=10000, help="flights in the generated database")
+stress.add_argument("--readers", type=non_negative_int, default=4, help="reader workers")
+stress.add_argument("--writers", type=non_negative_int, default=1, help="writer workers")
+stress.add_argument("--async-readers", type=non_negative_int, default=0, metavar="N",
+                    help="asyncio reader tasks on one event loop, reading through read_async")
+stress.add_argument("--processes", action="store_true", help="run workers as processes instead of threads")
+stress.add_argument("--duration", type=float, default=10.0, help="seconds to run")
+stress.add_argument("--mix", help="operation weights, e.g. flight-number=5,set-status=1 (default: all operations)")
+stress.add_argument("--journal-mode", default="wal", choices=["wal", "delete", "truncate", "persist", "memory"],
+                    help="journal mode of the generated database")
+parser.add_argument("--budget", action="append", default=[], metavar="COMMAND=SECONDS,ROWS,BYTES",
+                    help="override a command's budgets, e.g. view_flight_all=5,1000,65536 (empty leaves a limit off)")
+arguments = parser.parse_args()
+for budget in arguments.budget:
+  command, _, limits = budget.partition("=")
+  limits = (limits.split(",") + ["", "", ""])[:3]
+  DBOperations.query_budgets[command.strip()] = (float(limits[0]) if limits[0] else None,
+                                                 int(limits[1]) if limits[1] else None,
+                                                 int(limits[2]) if limits[2] else None)
+if arguments.hot_tier and arguments.write_queue:
+  parser.error("--hot-tier writes through its own connection and cannot be combined with --write-queue")
+if arguments.snapshot and not arguments.hot_tier:
+  parser.error("--snapshot is only used by --hot-tier")
+if arguments.snapshot_replica and (arguments.hot_tier or arguments.write_queue):
+  parser.error("--snapshot-replica is read-only and cannot be combined with --hot-tier or --write-queue")
+if (arguments.replica_in_memory or arguments.replica_refresh) and not arguments.snapshot_replica:
+  parser.error("--replica-in-memory and --replica-refresh are only used by --snapshot-replica")
+if arguments.hot_tier:
+  db_ops = HotTierOperations(db_ops.db_path, arguments.snapshot)
+if arguments.snapshot_replica:
+  db_ops = SnapshotOperations(db_ops.db_path, arguments.replica_in_memory, arguments.replica_refresh)
+if (arguments.tenant or arguments.rebalance or arguments.shard_report) and not arguments.shards:
+  parser.error("--tenant, --rebalance and --shard-report need --shards")
+if arguments.shards:
+  if arguments.hot_tier or arguments.snapshot_replica:
+    parser.error("--shards cannot be combined with --hot-tier or --snapshot-replica")
+  if not (arguments.tenant or arguments.rebalance or arguments.shard_report):
+    parser.error("--shards needs --tenant, --rebalance or --shard-report")
+  items = [item.partition("=") for item in arguments.shards.split(",")]
+  if not all(name and path for name, _, path in items):
+    parser.error("--shards takes NAME=FILE pairs separated by commas")
+  router = ShardRouter({name: path for name, _, path in items}, arguments.shard_reference)
+  router.create_tables()
+  if arguments.rebalance:
+    prefix, _, target = arguments.rebalance.partition("=")
+    if target not in router.shard_paths:
+      parser.error("--rebalance: unknown shard " + repr(target))
+    moved = router.rebalance(prefix.strip().upper(), target)
+    print("Moved " + str(moved) + " flight(s) of " + prefix.strip().upper() + " to " + target)
+    exit(0)
+  if arguments.shard_report:
+    for name, row in router.view_flights():
+      print(name + " | " + " | ".join("" if value is None else str(value) for value in row))
+    for name, counts in router.airline_counts().items():
+      print(name + ": " + (", ".join(prefix + "=" + str(count) for prefix, count in sorted(counts.items())) or "no flights"))
+    exit(0)
+  db_ops = router.for_tenant(arguments.tenant)
+if arguments.coalesce and arguments.stress and arguments.processes:
+  parser.error("--coalesce shares reads between threads and cannot be combined with --processes")
+if arguments.coalesce:
+  db_ops.single_flight = SingleFlight(db_ops.db_path)
+if arguments.cache_entries > 0:
+  db_ops.result_cache = ResultCache(db_ops.db_path, arguments.cache_entries)
+if arguments.write_queue:
+  db_ops.write_queue = WriteQueue(db_ops.db_path, ack_on_commit=arguments.write_queue == "commit")
+db_ops.output_format = arguments.format
+db_ops.output_path = arguments.output
+if arguments.board:
+  db_ops.board = DepartureBoard(db_ops.db_path, arguments.board_poll)
+  db_ops.board.serve(arguments.board)
+  print("Serving departure boards on " + arguments.board, file=sys.stderr)
+if arguments.create_template:
+  db_ops.create_template()
+  exit(0)
+if arguments.load_fixture:
+  for path in arguments.load_fixture:
+    db_ops.load_fixture(path)
+  exit(0)
+if arguments.check_upgrade:
+  exit(0 if db_ops.check_upgrade(arguments.check_upgrade) else 1)
+if arguments.stress:
+  try:
+    harness = StressHarness(arguments.stress_db, arguments.stress_flights, arguments.readers, arguments.writers,
+                            arguments.processes, arguments.duration,
+                            StressHarness.parse_mix(arguments.mix) if arguments.mix else None,
+                            journal_mode=arguments.journal_mode, coalesce=arguments.coalesce,
+                            async_readers=arguments.async_readers)
+  except ValueError as e:
+    parser.error(str(e))
+  harness.generate()
+  harness.report(*harness.run())
+  exit(0)
+if arguments.maintenance_interval > 0:
+  db_ops.schedule_maintenance(arguments.maintenance_interval)
+if arguments.ingest:
+  ingestor = StatusIngestor(db_ops.db_path, arguments.ingest_window)
+  ingestor.board = db_ops.board
+  if arguments.ingest == "-":
+    ingestor.add_source(sys.stdin)
+  elif arguments.ingest.startswith("unix:"):
+    ingestor.add_source(unix_socket_lines(arguments.ingest[len("unix:"):]))
+  else:
+    ingestor.add_source(tail_file(arguments.ingest))
+  try:
+    ingestor.run()
+  except KeyboardInterrupt:
+    pass
+  exit(0)
+if arguments.batch:
+  if arguments.batch == "-":
+    ok = db_ops.run_batch(sys.stdin, arguments.commit_every)
+  else:
+    with open(arguments.batch) as script:
+      ok = db_ops.run_batch(script, arguments.commit_every)
+  if arguments.hot_tier:
+    db_ops.hot_tier.save_snapshot()
+  exit(0 if ok else 1)
 # Main menu loop
 while True:
   menu()# Display menu options
 
-  __choose_menu = int(input("Enter your choice: "))
+  __choose_menu = read_choice()
   if __choose_menu == 1:
     db_ops.insert_data()
   elif __choose_menu == 2:
@@ -1343,6 +5868,16 @@ while True:
   elif __choose_menu == 15:
     db_ops.delete_destination()
   elif __choose_menu == 16:
+    maintenance()
+  elif __choose_menu == 17:
+    schedules()
+  elif __choose_menu == 18:
+    if db_ops.write_queue is not None:
+      db_ops.write_queue.close()# Apply queued writes before leaving
+    if arguments.hot_tier:
+      db_ops.hot_tier.save_snapshot()# Leave a current snapshot for the next start
+    if arguments.snapshot_replica:
+      db_ops.close_snapshot()
     exit(0)# Exit the program
   else:
     print("Invalid Choice")
\ No newline at end of file
@@ -0,0 +1,33 @@
+import os
+import sys
+import types
+
+import pytest
+
+MAIN = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "main.py")
+
+
+@pytest.fixture(scope="session")
+def main():
+  """main.py's classes and functions, without opening the database or starting the menu."""
+  with open(MAIN) as f:
+    source = f.read().split("# Initialize database operations")[0]
+  module = types.ModuleType("main")
+  module.__file__ = MAIN
+  argv = sys.argv
+  sys.argv = [MAIN]
+  try:
+    exec(compile(source, MAIN, "exec"), module.__dict__)
+  finally:
+    sys.argv = argv
+  return module
+
+
+@pytest.fixture
+def seeded_db(main, tmp_path, monkeypatch):
+  """A DBOperations on a new, migrated and seeded database in a temporary directory."""
+  monkeypatch.chdir(tmp_path)
+  ops = main.DBOperations()
+  ops.create_table()
+  ops.insert_test_data()
+  return ops
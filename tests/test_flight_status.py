@@ -0,0 +1,58 @@
+import sqlite3
+
+import pytest
+
+
+@pytest.mark.parametrize("old, new, allowed", [
+  ("On Time", "Delayed", True),
+  ("On Time", "On Time", True),
+  ("Boarding", "in-Flight", True),
+  ("in-Flight", "Landed", True),
+  ("On Time", "Landed", False),# A skip, even one the state machine could reach
+  ("Boarding", "Closed", False),
+  ("Landed", "On Time", False),
+  ("Closed", "Delayed", False),
+  ("On Time", "Departed", False),# Not a status
+  (None, "Boarding", True),# A flight with no status may take any
+  (None, "Departed", False),
+])
+def test_allows(main, old, new, allowed):
+  assert main.FlightStatus.allows(old, new) is allowed
+
+
+def test_next_statuses(main):
+  assert main.FlightStatus.next_statuses("Boarding") == ["Delayed", "Cancelled", "Boarding", "in-Flight"]
+  assert main.FlightStatus.next_statuses("Closed") == ["Closed"]
+  assert main.FlightStatus.next_statuses(None) == list(main.FlightStatus.names)
+
+
+def test_check_bulk_matches_allows(main):
+  names = list(main.FlightStatus.names) + [None, "Departed"]
+  changes = [(i, old, new) for i, (old, new) in enumerate((old, new) for old in names for new in names)]
+  accepted, rejected = main.FlightStatus.check_bulk(changes)
+  assert len(accepted) + len(rejected) == len(changes)
+  assert accepted == [change for change in changes if main.FlightStatus.allows(change[1], change[2])]
+  assert rejected == [change for change in changes if not main.FlightStatus.allows(change[1], change[2])]
+
+
+def test_transition_table_matches_allows(seeded_db, main):
+  conn = sqlite3.connect(seeded_db.db_path)
+  try:
+    stored = set(conn.execute("SELECT FromCode, ToCode FROM FlightStatusTransition"))
+  finally:
+    conn.close()
+  codes = main.FlightStatus.codes
+  assert stored == {(codes[old], codes[new]) for old in codes for new in codes if main.FlightStatus.allows(old, new)}
+
+
+def test_trigger_rejects_a_skip(seeded_db, main):
+  conn = sqlite3.connect(seeded_db.db_path)
+  try:
+    assert conn.execute(seeded_db.sql_get_flight, ("BE123",)).fetchone()[0] == "On Time"
+    with pytest.raises(sqlite3.IntegrityError, match="Invalid status transition"):
+      conn.execute(seeded_db.sql_update_flight_status, ("Landed", "BE123"))
+    for status in ("Boarding", "in-Flight", "Landed"):
+      conn.execute(seeded_db.sql_update_flight_status, (status, "BE123"))
+    assert conn.execute(seeded_db.sql_get_flight, ("BE123",)).fetchone()[0] == "Landed"
+  finally:
+    conn.close()
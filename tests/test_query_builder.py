@@ -0,0 +1,93 @@
+import sqlite3
+
+import pytest
+
+
+@pytest.fixture
+def pilots():
+  """A Pilot table whose ExperienceYears has ties and NULLs, to page through."""
+  conn = sqlite3.connect(":memory:")
+  conn.execute("CREATE TABLE Pilot (PilotID INTEGER PRIMARY KEY, PilotName TEXT, LicenseNumber TEXT, ExperienceYears INTEGER)")
+  years = [5, None, 3, 5, None, 12, 3, 5, None, 1, 12]
+  conn.executemany("INSERT INTO Pilot VALUES (?, ?, ?, ?)",
+                   [(i + 1, "Pilot " + str(i + 1), "L" + str(i + 1), value) for i, value in enumerate(years)])
+  yield conn
+  conn.close()
+
+
+def page_through(main, conn, sort_column, descending, page_size):
+  """Return the PilotIDs of every page, in order, and the number of pages read."""
+  ids, cursor, pages = [], None, 0
+  while True:
+    builder = main.QueryBuilder("Pilot").order_by(sort_column, descending).limit(page_size).after(cursor)
+    sql, params = builder.build()
+    result = conn.execute(sql, params)
+    rows = result.fetchall()
+    pages += 1
+    ids.extend(row[0] for row in rows)
+    cursor = builder.next_cursor(rows, result.description)
+    if cursor is None:
+      return ids, pages
+
+
+def expected(conn, sort_column, descending):
+  direction = " DESC" if descending else ""
+  sql = "SELECT PilotID FROM Pilot ORDER BY " + sort_column + direction + ", PilotID" + direction
+  return [row[0] for row in conn.execute(sql)]
+
+
+@pytest.mark.parametrize("descending", [False, True])
+@pytest.mark.parametrize("page_size", [1, 2, 3, 11, 50])
+def test_pages_with_nulls_and_ties(main, pilots, descending, page_size):
+  ids, pages = page_through(main, pilots, "ExperienceYears", descending, page_size)
+  assert ids == expected(pilots, "ExperienceYears", descending)
+  assert pages == 11 // page_size + 1
+
+
+@pytest.mark.parametrize("descending", [False, True])
+def test_pages_on_key(main, pilots, descending):
+  ids, _ = page_through(main, pilots, "PilotID", descending, 4)
+  assert ids == expected(pilots, "PilotID", descending)
+
+
+def test_nulls_sort_first_ascending_and_last_descending(main, pilots):
+  ascending, _ = page_through(main, pilots, "ExperienceYears", False, 2)
+  descending, _ = page_through(main, pilots, "ExperienceYears", True, 2)
+  assert ascending[:3] == [2, 5, 9]
+  assert descending[-3:] == [9, 5, 2]
+
+
+def test_filters_are_parameters(main):
+  sql, params = (main.QueryBuilder("Flights").where("Status", "IN", ["Delayed", "Boarding"])
+                 .between("FlightID", 10, 20).limit(5).build())
+  assert sql == ("SELECT FlightID, FlightNumber, Status, OriginAirport, DestinationAirport FROM FlightView"
+                 " WHERE Status IN (?, ?) AND FlightID >= ? AND FlightID <= ? ORDER BY FlightID LIMIT ?")
+  assert params == ["Delayed", "Boarding", 10, 20, 5]
+
+
+def test_rejects_unknown_names(main):
+  with pytest.raises(ValueError):
+    main.QueryBuilder("Crew")
+  with pytest.raises(ValueError):
+    main.QueryBuilder("Pilot").where("PilotName; DROP TABLE Pilot", "=", "x")
+  with pytest.raises(ValueError):
+    main.QueryBuilder("Pilot").where("PilotName", "GLOB", "x")
+  with pytest.raises(ValueError):
+    main.QueryBuilder("Pilot").where("PilotName", "IN", "abc")
+  with pytest.raises(ValueError):
+    main.QueryBuilder("Flights").order_by("Status")
+  with pytest.raises(ValueError):
+    main.QueryBuilder("Pilot").limit(0)
+
+
+def test_sort_columns_are_indexed(seeded_db, main):
+  conn = sqlite3.connect(seeded_db.db_path)
+  try:
+    for table, (key, columns, sortable) in main.QueryBuilder.tables.items():
+      for column in sortable:
+        for descending in (False, True):
+          sql, params = main.QueryBuilder(table).order_by(column, descending).build()
+          plan = " ".join(row[-1] for row in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+          assert "TEMP B-TREE" not in plan, (table, column, plan)
+  finally:
+    conn.close()
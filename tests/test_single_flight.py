@@ -0,0 +1,168 @@
+import asyncio
+import sqlite3
+import threading
+import time
+
+import pytest
+
+KEY = ("SELECT 1", ())
+
+
+def wait_for(condition, timeout=5):
+  deadline = time.monotonic() + timeout
+  while not condition():
+    assert time.monotonic() < deadline, "timed out"
+    time.sleep(0.005)
+
+
+def waiters(flights, key=KEY):
+  with flights.lock:
+    flight = flights.flights.get(key)
+    return flight[1] if flight else 0
+
+
+def run_in_thread(flights, function, outcomes, key=KEY):
+  def target():
+    try:
+      outcomes.append(flights.run(key, function))
+    except BaseException as e:
+      outcomes.append(e)
+  thread = threading.Thread(target=target)
+  thread.start()
+  return thread
+
+
+def test_waiters_share_the_leaders_result(main):
+  flights = main.SingleFlight(":memory:")
+  release, calls, outcomes = threading.Event(), [], []
+  def read():
+    calls.append(1)
+    release.wait(5)
+    return [(1,)]
+  threads = [run_in_thread(flights, read, outcomes)]
+  wait_for(lambda: KEY in flights.flights)
+  threads += [run_in_thread(flights, read, outcomes) for _ in range(3)]
+  wait_for(lambda: waiters(flights) == 3)
+  release.set()
+  for thread in threads:
+    thread.join(5)
+  assert outcomes == [[(1,)]] * 4
+  assert len(calls) == 1
+  assert (flights.executions, flights.shared) == (1, 3)
+  assert flights.top() == [(KEY, 1, 3, 3, flights.wait)]
+
+
+def test_waiters_get_the_leaders_exception(main):
+  flights = main.SingleFlight(":memory:")
+  release, outcomes = threading.Event(), []
+  def read():
+    release.wait(5)
+    raise ValueError("boom")
+  leader = run_in_thread(flights, read, outcomes)
+  wait_for(lambda: KEY in flights.flights)
+  waiter = run_in_thread(flights, lambda: pytest.fail("a waiter must not run the read"), outcomes)
+  wait_for(lambda: waiters(flights) == 1)
+  release.set()
+  leader.join(5)
+  waiter.join(5)
+  assert len(outcomes) == 2 and all(isinstance(e, ValueError) and str(e) == "boom" for e in outcomes)
+  # The failed flight is gone, so the next caller runs the read again
+  assert KEY not in flights.flights
+  assert flights.run(KEY, lambda: "again") == "again"
+
+
+def test_a_thread_that_wrote_starts_its_own_flight(main):
+  flights = main.SingleFlight(":memory:")
+  release, outcomes = threading.Event(), []
+  leader = run_in_thread(flights, lambda: release.wait(5) and "old", outcomes)
+  wait_for(lambda: KEY in flights.flights)
+  flights.wrote()
+  assert flights.run(KEY, lambda: "fresh") == "fresh"
+  release.set()
+  leader.join(5)
+  assert outcomes == ["old"]
+
+
+def test_cancelled_async_leader_still_wakes_its_waiters(main):
+  flights = main.SingleFlight(":memory:")
+  release = threading.Event()
+  def read():
+    release.wait(5)
+    return "rows"
+  async def scenario():
+    leader = asyncio.ensure_future(flights.run_async(KEY, read))
+    await asyncio.sleep(0)
+    assert KEY in flights.flights
+    waiter = asyncio.ensure_future(flights.run_async(KEY, lambda: pytest.fail("a waiter must not run the read")))
+    await asyncio.sleep(0)
+    assert waiters(flights) == 1
+    leader.cancel()
+    with pytest.raises(asyncio.CancelledError):
+      await leader
+    release.set()
+    return await asyncio.wait_for(waiter, 5)
+  assert asyncio.run(scenario()) == "rows"
+  assert KEY not in flights.flights
+
+
+def test_cancelled_async_waiter_leaves_the_flight_running(main):
+  flights = main.SingleFlight(":memory:")
+  release = threading.Event()
+  async def scenario():
+    leader = asyncio.ensure_future(flights.run_async(KEY, lambda: release.wait(5) and "rows"))
+    await asyncio.sleep(0)
+    waiter = asyncio.ensure_future(flights.run_async(KEY, lambda: None))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+      await waiter
+    release.set()
+    return await asyncio.wait_for(leader, 5)
+  assert asyncio.run(scenario()) == "rows"
+
+
+class InterruptedCursor:
+  """Stands in for a cursor whose read is interrupted, like one stopped by its budget."""
+  def __init__(self, release):
+    self.release = release
+
+  def execute(self, sql, params=()):
+    self.release.wait(5)
+    raise sqlite3.OperationalError("interrupted")
+
+
+def test_coalescing_waiter_reruns_after_leader_is_interrupted(main):
+  flights = main.SingleFlight(":memory:")
+  release, outcomes = threading.Event(), []
+  conn = sqlite3.connect(":memory:", check_same_thread=False)
+  leader = main.CoalescingCursor(flights, conn, InterruptedCursor(release))
+  waiter = main.CoalescingCursor(flights, conn, conn.cursor())
+  def execute(cursor):
+    try:
+      outcomes.append(cursor.execute("SELECT 1").fetchall())
+    except sqlite3.OperationalError as e:
+      outcomes.append(e)
+  threads = [threading.Thread(target=execute, args=(leader,))]
+  threads[0].start()
+  wait_for(lambda: KEY in flights.flights)
+  threads.append(threading.Thread(target=execute, args=(waiter,)))
+  threads[1].start()
+  wait_for(lambda: waiters(flights) == 1)
+  release.set()
+  for thread in threads:
+    thread.join(5)
+  conn.close()
+  # The leader reports its own interrupt; the waiter ran the read itself
+  assert isinstance(outcomes[0], sqlite3.OperationalError) and outcomes[1] == [(1,)]
+
+
+def test_coalescing_cursor_does_not_share_reads_inside_a_transaction(main):
+  flights = main.SingleFlight(":memory:")
+  conn = sqlite3.connect(":memory:")
+  cursor = main.CoalescingCursor(flights, conn, conn.cursor())
+  cursor.execute("CREATE TABLE t (x)")
+  cursor.execute("INSERT INTO t VALUES (1)")
+  assert conn.in_transaction
+  assert cursor.execute("SELECT x FROM t").fetchall() == [(1,)]
+  conn.close()
+  assert flights.executions == 0